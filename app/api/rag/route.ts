@@ -5,6 +5,65 @@ import path from 'path';
 
 const execAsync = promisify(exec);
 
+async function queryRagServer(query: string, maxDocs: number, context: string) {
+  const serverUrl = process.env.RAG_SERVER_URL;
+  if (!serverUrl) {
+    return null;
+  }
+
+  try {
+    const response = await fetch(`${serverUrl}/query`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ query, maxDocs, context }),
+      signal: AbortSignal.timeout(90000)
+    });
+    return await response.json();
+  } catch (error) {
+    console.error('RAG server unavailable, falling back to one-shot script:', error);
+    return null;
+  }
+}
+
+async function runRagScript(query: string, maxDocs: number, context: string) {
+  // Path to the Python RAG script
+  const pythonScript = path.join(process.cwd(), 'rag-system', 'api_retriever.py');
+  
+  // Use chcp 65001 to set UTF-8 encoding on Windows
+  const pythonCommand = process.platform === 'win32' 
+    ? `chcp 65001 >nul && python "${pythonScript}" "${query}" ${maxDocs} "${context}"`
+    : `python "${pythonScript}" "${query}" ${maxDocs} "${context}"`;
+
+  console.log('Executing command:', pythonCommand);
+
+  // Execute Python script with UTF-8 encoding
+  const { stdout, stderr } = await execAsync(pythonCommand, {
+    cwd: process.cwd(),
+    timeout: 90000, // 1.5 minutes timeout for original retriever
+    encoding: 'utf8',
+    maxBuffer: 1024 * 1024 * 10, // 10MB buffer for large outputs
+    env: { 
+      ...process.env, 
+      PYTHONIOENCODING: 'utf-8',
+      PYTHONUTF8: '1'
+    }
+  });
+
+  console.log('Python stdout:', stdout);
+  if (stderr) {
+    console.log('Python stderr:', stderr);
+  }
+
+  // Parse the JSON response from Python script
+  try {
+    return JSON.parse(stdout);
+  } catch (parseError) {
+    console.error('JSON parse error:', parseError);
+    console.error('Raw stdout:', stdout);
+    return null;
+  }
+}
+
 // Configure runtime for longer execution
 export const runtime = 'nodejs';
 export const maxDuration = 180; // 3 minutes for Vercel Pro, 30s for hobby
@@ -20,45 +79,18 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    // Path to the Python RAG script
-    const pythonScript = path.join(process.cwd(), 'rag-system', 'api_retriever.py');
-    
-    // Use chcp 65001 to set UTF-8 encoding on Windows
-    const pythonCommand = process.platform === 'win32' 
-      ? `chcp 65001 >nul && python "${pythonScript}" "${query}" ${maxDocs} "${context}"`
-      : `python "${pythonScript}" "${query}" ${maxDocs} "${context}"`;
-
-    console.log('Executing command:', pythonCommand);
-
-    // Execute Python script with UTF-8 encoding
-    const { stdout, stderr } = await execAsync(pythonCommand, {
-      cwd: process.cwd(),
-      timeout: 90000, // 1.5 minutes timeout for original retriever
-      encoding: 'utf8',
-      maxBuffer: 1024 * 1024 * 10, // 10MB buffer for large outputs
-      env: { 
-        ...process.env, 
-        PYTHONIOENCODING: 'utf-8',
-        PYTHONUTF8: '1'
-      }
-    });
+    // Prefer the resident RAG server (python api_retriever.py --serve) when configured,
+    // so indexes stay loaded between requests
+    let result = await queryRagServer(query, maxDocs, context);
 
-    console.log('Python stdout:', stdout);
-    if (stderr) {
-      console.log('Python stderr:', stderr);
-    }
-
-    // Parse the JSON response from Python script
-    let result;
-    try {
-      result = JSON.parse(stdout);
-    } catch (parseError) {
-      console.error('JSON parse error:', parseError);
-      console.error('Raw stdout:', stdout);
-      return NextResponse.json(
-        { error: 'Invalid response format from Python script' },
-        { status: 500 }
-      );
+    if (!result) {
+      result = await runRagScript(query, maxDocs, context);
+      if (!result) {
+        return NextResponse.json(
+          { error: 'Invalid response format from Python script' },
+          { status: 500 }
+        );
+      }
     }
 
     // Check if there's an error in the result
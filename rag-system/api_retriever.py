@@ -5,18 +5,28 @@ Enhanced API Retriever for RAG System with Hybrid Search
 Script yang dipanggil dari Next.js API route untuk melakukan hybrid RAG query
 """
 
+import asyncio
 import json
 import sys
 import os
-import io
+import re
 import time
-import signal
+import copy
+import hashlib
+import functools
+import mmap
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from pathlib import Path
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Dict, Any, List, Tuple
 
-# Set UTF-8 encoding for stdout
-if sys.platform.startswith('win'):
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+import numpy as np
+import orjson
 
 # Add the parent directory to Python path to import our modules
 sys.path.append(str(Path(__file__).parent))
@@ -24,6 +34,7 @@ sys.path.append(str(Path(__file__).parent))
 # Import our modules
 try:
     from hybrid_search_engine import HybridSearchEngine
+    from bm25_search import BM25Search
     from retriever import RAGRetriever  # Fallback to original retriever
     HYBRID_AVAILABLE = True
 except ImportError as e:
@@ -31,21 +42,21 @@ except ImportError as e:
     from retriever import RAGRetriever
     HYBRID_AVAILABLE = False
 
-import google.generativeai as genai
-
-class TimeoutException(Exception):
-    """Custom exception for timeout handling"""
-    pass
+from document_loader import parse_data_file
 
-def timeout_handler(signum, frame):
-    """Signal handler for timeout"""
-    raise TimeoutException("Operation timed out")
+import google.generativeai as genai
 
 class EnhancedRAGRetriever:
     """Enhanced RAG Retriever with hybrid search capabilities"""
     
+    # Set once a search engine in this process has started Numba's thread pool;
+    # forking data loader workers after that hangs the process at exit
+    _engine_started = False
+    
     def __init__(self, gemini_api_key: str, data_folder_path: str, 
-                 use_hybrid: bool = True, timeout_seconds: int = 30):
+                 use_hybrid: bool = True, timeout_seconds: int = 30,
+                 cache_size: int = 256, cache_ttl_seconds: int = 300,
+                 prefetch_similarity: float = 0.95):
         """
         Initialize Enhanced RAG Retriever
         
@@ -54,15 +65,46 @@ class EnhancedRAGRetriever:
             data_folder_path: Path to data folder
             use_hybrid: Whether to use hybrid search (fallback to original if unavailable)
             timeout_seconds: Timeout for operations
+            cache_size: Maximum number of cached query results
+            cache_ttl_seconds: Lifetime of a cached query result
+            prefetch_similarity: Cosine similarity to a recent query above which
+                rag_query_async starts generating from that query's documents
+                while its own retrieval runs
         """
         self.gemini_api_key = gemini_api_key
         self.data_folder_path = data_folder_path
         self.use_hybrid = use_hybrid and HYBRID_AVAILABLE
         self.timeout_seconds = timeout_seconds
+        # Worker threads for queries, so a query can be abandoned after timeout_seconds
+        self._query_executor = ThreadPoolExecutor(thread_name_prefix='rag-query')
+        # Long-lived event loop for the async pipeline, started on first use; Gemini's
+        # async client stays bound to the loop it first ran on, so one loop serves every batch
+        self._event_loop = None
+        self._event_loop_lock = threading.Lock()
+        
+        # LRU caches for full RAG results and for retrieved documents alone,
+        # so different system prompts still share retrieval work
+        self.cache_size = cache_size
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self._query_cache = OrderedDict()
+        self._search_cache = OrderedDict()
+        self._cache_lock = threading.Lock()  # rag_query_async searches from worker threads
+        
+        # Embeddings of recent queries and their retrieved documents, for speculative generation
+        self.prefetch_similarity = prefetch_similarity
+        self._recent_embeddings = None
+        self._recent_queries = []
         
         # Setup Gemini API
         genai.configure(api_key=gemini_api_key)
         self.generation_model = "gemini-1.5-flash"
+        self._gen_model = genai.GenerativeModel(self.generation_model)
+        
+        # System prompt plus context header, built once per known prompt
+        self._prompt_prefixes = {
+            prompt: prompt + PROMPT_CONTEXT_HEADER
+            for prompt in (DEFAULT_SYSTEM_PROMPT, *SYSTEM_PROMPTS.values())
+        }
         
         # Initialize search engines
         if self.use_hybrid:
@@ -76,10 +118,22 @@ class EnhancedRAGRetriever:
             # Setup index paths
             index_dir = Path(self.data_folder_path) / 'indexes'
             vector_index_path = index_dir / 'faiss_index.bin'
-            vector_metadata_path = index_dir / 'faiss_metadata.pkl'
-            bm25_index_path = index_dir / 'bm25_index.pkl'
+            vector_metadata_path = index_dir / 'faiss_metadata.feather'
+            bm25_index_path = index_dir / 'bm25_index.npz'
             cache_info_path = index_dir / 'cache_info.json'
             
+            # Fingerprint before loading so edits made during the build invalidate the cache
+            fingerprint, entries = self._data_fingerprint()
+            cache_info = self._read_cache_info(cache_info_path, vector_index_path, vector_metadata_path, bm25_index_path, fingerprint, entries)
+            
+            # Parse the data files before the engine exists when the indexes need a rebuild:
+            # the loader workers are forked, and the engine starts Numba's thread pool and
+            # loads the embedding backend
+            loaded = None
+            if cache_info is None:
+                loaded = self._load_all_documents(use_workers=not EnhancedRAGRetriever._engine_started)
+            
+            EnhancedRAGRetriever._engine_started = True
             self.hybrid_engine = HybridSearchEngine(
                 vector_weight=0.6,
                 keyword_weight=0.4,
@@ -90,7 +144,9 @@ class EnhancedRAGRetriever:
             )
             
             # Check if we can use cached indexes
-            if self._is_cache_valid(cache_info_path, vector_index_path, vector_metadata_path, bm25_index_path):
+            if cache_info is not None and cache_info.get('settings') != self._index_settings():
+                print("Index settings changed since cache creation", file=sys.stderr)
+            elif cache_info is not None:
                 try:
                     print("Loading cached search indexes...", file=sys.stderr)
                     self.hybrid_engine.load_indexes(
@@ -105,95 +161,122 @@ class EnhancedRAGRetriever:
             
             # Build new indexes from data
             print("Cache invalid or missing, building new indexes...", file=sys.stderr)
-            self._build_hybrid_indexes()
+            self._build_hybrid_indexes(fingerprint, loaded)
             
         except Exception as e:
             print(f"Error initializing hybrid search: {e}", file=sys.stderr)
             self.use_hybrid = False
             self._init_original_search()
 
-    def _is_cache_valid(self, cache_info_path, vector_index_path, vector_metadata_path, bm25_index_path):
-        """Check if cached indexes are valid and up to date"""
+    def _read_cache_info(self, cache_info_path, vector_index_path, vector_metadata_path, bm25_index_path, fingerprint, entries):
+        """
+        Read the cache info of indexes built from the current data files
+        
+        Returns:
+            Cache info dict, or None when an index file is missing or the data changed
+        """
         try:
             # Check if all index files exist
-            if not all(p.exists() for p in [vector_index_path, vector_metadata_path, bm25_index_path]):
-                return False
+            bm25_files = BM25Search.index_files(bm25_index_path)
+            if not all(p.exists() for p in [vector_index_path, vector_metadata_path, *bm25_files]):
+                return None
             
             # Check cache info
             if not cache_info_path.exists():
-                return False
+                return None
             
             with open(cache_info_path, 'r') as f:
                 cache_info = json.load(f)
             
-            # Check if data files have been modified since cache was created
-            data_folder = Path(self.data_folder_path)
+            # Any added, removed, resized or touched data file changes the fingerprint
             cache_timestamp = cache_info.get('timestamp', 0)
             
-            for json_file in data_folder.glob('*.json'):
-                if json_file.name.startswith('.'):
-                    continue
-                if json_file.stat().st_mtime > cache_timestamp:
-                    print(f"Data file {json_file.name} modified since cache creation", file=sys.stderr)
-                    return False
+            if fingerprint != cache_info.get('fingerprint'):
+                for name, _, mtime_ns in entries:
+                    if mtime_ns / 1e9 > cache_timestamp:
+                        print(f"Data file {name} modified since cache creation", file=sys.stderr)
+                print("Data folder fingerprint changed since cache creation", file=sys.stderr)
+                return None
             
-            # Additional validation: check document count
             expected_doc_count = cache_info.get('document_count', 0)
-            current_doc_count = len(self._count_documents_quickly())
-            
-            if abs(current_doc_count - expected_doc_count) > 100:  # Allow some tolerance
-                print(f"Document count changed significantly: {expected_doc_count} -> {current_doc_count}", file=sys.stderr)
-                return False
-            
             print(f"Cache validation passed: {expected_doc_count} documents, cache age: {time.time() - cache_timestamp:.1f}s", file=sys.stderr)
-            return True
+            return cache_info
             
         except Exception as e:
             print(f"Cache validation error: {e}", file=sys.stderr)
-            return False
+            return None
 
-    def _count_documents_quickly(self):
-        """Quickly count documents without loading content"""
-        doc_count = 0
-        data_folder = Path(self.data_folder_path)
+    def _index_settings(self) -> dict:
+        """Settings that change what goes into the indexes"""
+        bm25 = self.hybrid_engine.bm25_search
+        vector_db = self.hybrid_engine.vector_db
+        return {
+            'embedding_model': vector_db.embedding_model,
+            'sentence_transformer_model': vector_db.sentence_transformer_model,
+            'embedding_backend': vector_db.embedding_backend,
+            'dimension': vector_db.dimension,
+            'bm25': {
+                'language': bm25.language,
+                'use_stemming': bm25.use_stemming,
+                'stemmer': bm25.stemmer_name,
+                'remove_stopwords': bm25.remove_stopwords,
+                'stopwords': hashlib.blake2b('\n'.join(sorted(bm25.stopwords)).encode('utf-8'), digest_size=8).hexdigest(),
+                'min_word_length': bm25.min_word_length,
+                'k1': bm25.k1,
+                'b': bm25.b
+            }
+        }
+    
+    def _data_fingerprint(self) -> tuple:
+        """
+        Fingerprint the data folder from directory metadata only
         
-        for json_file in data_folder.glob('*.json'):
-            if json_file.name.startswith('.'):
-                continue
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    file_data = json.load(f)
-                
-                if isinstance(file_data, list):
-                    doc_count += len([item for item in file_data if 'content' in item or 'title' in item])
-                elif isinstance(file_data, dict):
-                    if 'papers' in file_data:
-                        doc_count += len([p for p in file_data['papers'] if 'content' in p or 'title' in p])
-                    elif 'documents' in file_data:
-                        doc_count += len([d for d in file_data['documents'] if 'content' in d or 'title' in d])
-                    elif 'content' in file_data:
-                        doc_count += 1
-            except:
-                continue
-                
-        return doc_count
+        Returns:
+            Tuple of (hex digest, sorted list of (name, size, mtime_ns))
+        """
+        entries = []
+        with os.scandir(self.data_folder_path) as it:
+            for entry in it:
+                if entry.name.endswith('.json') and not entry.name.startswith('.') and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((entry.name, stat.st_size, stat.st_mtime_ns))
+        entries.sort()
+        
+        digest = hashlib.blake2b(digest_size=16)
+        for name, size, mtime_ns in entries:
+            digest.update(f"{name}\0{size}\0{mtime_ns}\n".encode('utf-8'))
+        return digest.hexdigest(), entries
+    
+    def _data_files(self) -> list:
+        """List the JSON data files that feed the indexes"""
+        data_folder = Path(self.data_folder_path)
+        return [f for f in data_folder.glob('*.json') if not f.name.startswith('.')]
     
-    def _build_hybrid_indexes(self):
-        """Build hybrid search indexes from data files with progress monitoring"""
+    def _build_hybrid_indexes(self, fingerprint, loaded=None):
+        """
+        Build hybrid search indexes from data files with progress monitoring
+        
+        Args:
+            fingerprint: Data folder fingerprint taken before the data files were read
+            loaded: (documents, load seconds) from _load_all_documents, or None to load here
+        """
         print("Building hybrid search indexes...", file=sys.stderr)
         
-        # Load documents with progress
-        start_time = time.time()
-        documents = self._load_all_documents()
-        load_time = time.time() - start_time
-        print(f"Document loading completed in {load_time:.2f}s", file=sys.stderr)
+        # The engine's threads are already running here, so files are parsed in this process
+        documents, load_time = loaded if loaded is not None else self._load_all_documents()
         
         if documents:
-            # Add documents to hybrid engine with smaller batches for better progress
+            # Let the embedding backend use every core for its matmuls
+            try:
+                import torch
+                torch.set_num_threads(os.cpu_count() or 1)
+            except ImportError:
+                pass
+            
             print(f"Indexing {len(documents)} documents...", file=sys.stderr)
             index_start = time.time()
             
-            self.hybrid_engine.add_documents(documents, batch_size=8)  # Smaller batch size
+            self.hybrid_engine.add_documents(documents, batch_size=64)
             
             index_time = time.time() - index_start
             print(f"Indexing completed in {index_time:.2f}s", file=sys.stderr)
@@ -206,14 +289,17 @@ class EnhancedRAGRetriever:
                 save_start = time.time()
                 self.hybrid_engine.save_indexes(
                     str(index_dir / 'faiss_index.bin'),
-                    str(index_dir / 'faiss_metadata.pkl'),
-                    str(index_dir / 'bm25_index.pkl')
+                    str(index_dir / 'faiss_metadata.feather'),
+                    str(index_dir / 'bm25_index.npz')
                 )
                 
                 # Save cache info
                 cache_info = {
                     'timestamp': time.time(),
                     'document_count': len(documents),
+                    'fingerprint': fingerprint,
+                    'settings': self._index_settings(),
+                    'index_type': self.hybrid_engine.vector_db.index_type,
                     'build_time': index_time,
                     'load_time': load_time
                 }
@@ -229,68 +315,62 @@ class EnhancedRAGRetriever:
         else:
             print("No documents found for indexing", file=sys.stderr)
     
-    def _load_all_documents(self) -> list:
-        """Load all documents from data folder with progress monitoring"""
+    def _load_all_documents(self, use_workers: bool = False) -> tuple:
+        """
+        Load all documents from data folder with progress monitoring
+        
+        Args:
+            use_workers: Parse the files on forked worker processes; only safe before
+                the search engine has started its threads. Without fork (Windows) the
+                files are always parsed in this process
+        
+        Returns:
+            Tuple of (documents, load seconds)
+        """
         documents = []
-        data_folder = Path(self.data_folder_path)
+        start_time = time.time()
         
         # Get list of JSON files first
-        json_files = [f for f in data_folder.glob('*.json') if not f.name.startswith('.')]
+        json_files = self._data_files()
         print(f"Found {len(json_files)} JSON files to process", file=sys.stderr)
         
-        # Load from JSON files with progress
-        for i, json_file in enumerate(json_files, 1):
-            try:
-                file_start = time.time()
-                
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    file_data = json.load(f)
-                
-                file_docs = []
-                
-                # Handle different JSON structures
-                if isinstance(file_data, list):
-                    for item in file_data:
-                        if self._is_valid_document(item):
-                            item['data_source'] = json_file.stem
-                            file_docs.append(item)
-                elif isinstance(file_data, dict):
-                    if 'papers' in file_data:
-                        for paper in file_data['papers']:
-                            if self._is_valid_document(paper):
-                                paper['data_source'] = json_file.stem
-                                file_docs.append(paper)
-                    elif 'documents' in file_data:
-                        for doc in file_data['documents']:
-                            if self._is_valid_document(doc):
-                                doc['data_source'] = json_file.stem
-                                file_docs.append(doc)
-                    elif self._is_valid_document(file_data):  # Single document
-                        file_data['data_source'] = json_file.stem
-                        file_docs.append(file_data)
-                
-                documents.extend(file_docs)
-                
-                load_time = time.time() - file_start
-                print(f"Progress: {i}/{len(json_files)} - {json_file.name}: {len(file_docs)} docs in {load_time:.2f}s", file=sys.stderr)
-                        
-            except Exception as e:
-                print(f"Error loading {json_file.name}: {e}", file=sys.stderr)
+        # Results are collected in file order so document positions stay stable between builds
+        file_results = [[] for _ in json_files]
+        executor = None
+        if use_workers and len(json_files) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            max_workers = min(os.cpu_count() or 1, len(json_files))
+            executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('fork'))
         
-        print(f"Loaded {len(documents)} total documents from data folder", file=sys.stderr)
-        return documents
-
-    def _is_valid_document(self, doc: dict) -> bool:
-        """Check if a document has required content"""
-        if not isinstance(doc, dict):
-            return False
+        try:
+            if executor is not None:
+                futures = {
+                    executor.submit(parse_data_file, json_file): i
+                    for i, json_file in enumerate(json_files)
+                }
+                completed_files = ((futures[future], future.result) for future in as_completed(futures))
+            else:
+                completed_files = ((i, functools.partial(parse_data_file, json_file)) for i, json_file in enumerate(json_files))
+            
+            for completed, (i, get_result) in enumerate(completed_files, 1):
+                json_file = json_files[i]
+                try:
+                    file_docs, file_time = get_result()
+                    file_results[i] = file_docs
+                    print(f"Progress: {completed}/{len(json_files)} - {json_file.name}: {len(file_docs)} docs in {file_time:.2f}s", file=sys.stderr)
+                except Exception as e:
+                    print(f"Error loading {json_file.name}: {e}", file=sys.stderr)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
         
-        # Must have either content or title
-        has_content = bool(doc.get('content', '').strip())
-        has_title = bool(doc.get('title', '').strip())
+        for file_docs in file_results:
+            documents.extend(file_docs)
         
-        return has_content or has_title
-    
+        load_time = time.time() - start_time
+        print(f"Loaded {len(documents)} total documents from data folder", file=sys.stderr)
+        print(f"Document loading completed in {load_time:.2f}s", file=sys.stderr)
+        return documents, load_time
+
     def _init_original_search(self):
         """Initialize original RAG retriever as fallback"""
         self.original_retriever = RAGRetriever(
@@ -298,32 +378,62 @@ class EnhancedRAGRetriever:
             data_folder_path=self.data_folder_path
         )
     
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        """Normalize query text for cache keys"""
+        query = re.sub(r'[^\w\s]', ' ', query.lower())
+        return re.sub(r'\s+', ' ', query).strip()
+    
+    def _cache_get(self, cache: OrderedDict, key):
+        """Get a cache entry, honouring TTL and LRU order"""
+        with self._cache_lock:
+            entry = cache.get(key)
+            if entry is None:
+                return None
+            
+            timestamp, value = entry
+            if time.time() - timestamp > self.cache_ttl_seconds:
+                del cache[key]
+                return None
+            
+            cache.move_to_end(key)
+            return value
+    
+    def _cache_put(self, cache: OrderedDict, key, value):
+        """Insert a cache entry, evicting the least recently used one"""
+        with self._cache_lock:
+            cache[key] = (time.time(), value)
+            cache.move_to_end(key)
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+    
     def search_documents(self, query: str, top_k: int = 5) -> list:
         """Search for relevant documents"""
+        cache_key = (self._normalize_query(query), top_k, self.use_hybrid)
+        cached_docs = self._cache_get(self._search_cache, cache_key)
+        if cached_docs is not None:
+            return list(cached_docs)
+        
         if self.use_hybrid:
-            return self.hybrid_engine.search(query, top_k)
+            docs = self.hybrid_engine.search(query, top_k)
         else:
-            return self.original_retriever.search_similar_documents(query, top_k)
-    
-    def generate_response(self, query: str, context_docs: list, 
-                         system_prompt: str = None) -> str:
-        """Generate response using Gemini with retrieved context"""
+            docs = self.original_retriever.search_similar_documents(query, top_k)
         
-        # Default system prompt for medical assistant
+        self._cache_put(self._search_cache, cache_key, docs)
+        return list(docs)
+    
+    def _build_prompt(self, query: str, context_docs: list, 
+                      system_prompt: str = None) -> str:
+        """Build the Gemini prompt from the query and retrieved context"""
         if system_prompt is None:
-            system_prompt = """Anda adalah asisten medis AI yang berpengetahuan luas dan berpengalaman dalam diagnosis dan anamnesis. 
-Tugas Anda adalah membantu dalam proses anamnesis dan memberikan rekomendasi diagnosis berdasarkan informasi yang tersedia.
-
-INSTRUKSI PENTING:
-1. Gunakan HANYA informasi dari konteks yang disediakan di bawah ini
-2. Jika informasi tidak cukup atau tidak relevan, nyatakan dengan jelas
-3. JANGAN mengarang atau membuat informasi medis
-4. Berikan penjelasan yang mudah dipahami namun tetap akurat
-5. Sertakan referensi ke sumber informasi jika memungkinkan
-6. Jika diperlukan pemeriksaan lebih lanjut, sebutkan dengan jelas"""
+            system_prompt = DEFAULT_SYSTEM_PROMPT
+        
+        prefix = self._prompt_prefixes.get(system_prompt)
+        if prefix is None:
+            prefix = system_prompt + PROMPT_CONTEXT_HEADER
         
         # Format context from retrieved documents
-        context_text = ""
+        parts = []
         references = []
         
         for i, doc in enumerate(context_docs, 1):
@@ -332,34 +442,277 @@ INSTRUKSI PENTING:
             reference = f"[{source_info}] {title}"
             references.append(reference)
             
-            content = doc.get('content', '')
-            context_text += f"\n--- Referensi {i}: {reference} ---\n"
-            context_text += f"{content}\n"
+            parts.append(f"\n--- Referensi {i}: {reference} ---\n")
+            parts.append(f"{doc.get('content', '')}\n")
         
-        # Create complete prompt
-        full_prompt = f"""{system_prompt}
-
-KONTEKS DARI SUMBER DATA:
-{context_text}
-
-REFERENSI YANG DIGUNAKAN:
-{'; '.join(references)}
-
-PERTANYAAN: {query}
-
-Berikan jawaban yang akurat berdasarkan konteks di atas. Pastikan untuk menyebutkan referensi yang relevan dalam jawaban Anda.
-"""
+        return "".join([
+            prefix, *parts,
+            PROMPT_REFERENCES_HEADER, "; ".join(references),
+            PROMPT_QUESTION_HEADER, query, PROMPT_SUFFIX
+        ])
+    
+    def generate_response(self, query: str, context_docs: list, 
+                         system_prompt: str = None) -> str:
+        """Generate response using Gemini with retrieved context"""
+        full_prompt = self._build_prompt(query, context_docs, system_prompt)
         
         try:
-            model = genai.GenerativeModel(self.generation_model)
-            response = model.generate_content(full_prompt)
+            response = self._gen_model.generate_content(full_prompt)
             return response.text
         except Exception as e:
             print(f"Error generating response: {e}", file=sys.stderr)
             return "Maaf, terjadi kesalahan saat memproses permintaan Anda. Silakan coba lagi."
     
+    async def generate_response_async(self, query: str, context_docs: list, 
+                                      system_prompt: str = None) -> str:
+        """Generate response with Gemini's async API"""
+        full_prompt = self._build_prompt(query, context_docs, system_prompt)
+        
+        try:
+            response = await self._gen_model.generate_content_async(full_prompt)
+            return response.text
+        except Exception as e:
+            print(f"Error generating response: {e}", file=sys.stderr)
+            return "Maaf, terjadi kesalahan saat memproses permintaan Anda. Silakan coba lagi."
+    
+    @staticmethod
+    def _format_doc(doc: dict, search_method: str = None) -> Dict[str, Any]:
+        """
+        Format a retrieved document for the API response
+        
+        Args:
+            doc: Retrieved document
+            search_method: Override for the search method; when given the
+                reference is rebuilt from source and title
+        """
+        content = doc.get('content', '') or ''
+        source = doc.get('data_source', 'unknown')
+        reference = f"{source}:{doc.get('title', 'untitled')}"
+        
+        if search_method is None:
+            search_method = doc.get('search_method', 'unknown')
+            reference = doc.get('reference', reference)
+        
+        return {
+            'title': doc.get('title', doc.get('file_name', 'Untitled')),
+            'source': source,
+            'content_preview': content[:200] + "..." if len(content) > 200 else content,
+            'similarity_score': doc.get('similarity_score', doc.get('combined_score', 0.0)),
+            'search_method': search_method,
+            'reference': reference
+        }
+    
+    def _build_result(self, query: str, response: str, retrieved_docs: list,
+                      search_time: float, generation_time: float, total_time: float,
+                      fallback: bool = False) -> Dict[str, Any]:
+        """Assemble the API result for a completed RAG query"""
+        metadata = {
+            'num_retrieved_docs': len(retrieved_docs),
+            'data_sources': list({doc.get('data_source', 'unknown') for doc in retrieved_docs}),
+        }
+        
+        if fallback:
+            metadata['search_engine'] = 'original_fallback'
+        else:
+            metadata['total_documents_available'] = len(self.hybrid_engine.vector_db.documents) if self.use_hybrid else len(getattr(self.original_retriever, 'documents', []))
+            metadata['top_similarity_score'] = retrieved_docs[0].get('similarity_score', retrieved_docs[0].get('combined_score', 0.0)) if retrieved_docs else 0.0
+            metadata['search_engine'] = 'hybrid' if self.use_hybrid else 'original'
+        
+        metadata['performance'] = {
+            'search_time_seconds': search_time,
+            'generation_time_seconds': generation_time,
+            'total_time_seconds': total_time
+        }
+        
+        return {
+            'query': query,
+            'response': response,
+            'retrieved_documents': [
+                self._format_doc(doc, search_method='original_fallback' if fallback else None)
+                for doc in retrieved_docs
+            ],
+            'metadata': metadata
+        }
+    
+    def _query_cache_key(self, query: str, top_k: int, system_prompt: str = None) -> tuple:
+        """Cache key for a full RAG result"""
+        prompt_hash = hashlib.blake2b((system_prompt or '').encode('utf-8'), digest_size=8).hexdigest()
+        return (self._normalize_query(query), top_k, prompt_hash)
+    
+    def _cached_result(self, cache_key: tuple, query: str) -> Dict[str, Any]:
+        """Return a copy of a cached RAG result for this query, if any"""
+        cached_result = self._cache_get(self._query_cache, cache_key)
+        if cached_result is None:
+            return None
+        
+        result = copy.deepcopy(cached_result)
+        result['query'] = query
+        result['metadata']['cache_hit'] = True
+        return result
+    
+    def _store_result(self, cache_key: tuple, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Cache a successful RAG result and mark it as a cache miss"""
+        if 'error' not in result:
+            self._cache_put(self._query_cache, cache_key, copy.deepcopy(result))
+        
+        result['metadata']['cache_hit'] = False
+        return result
+    
     def rag_query(self, query: str, top_k: int = 5, 
                   system_prompt: str = None) -> Dict[str, Any]:
+        """Complete RAG pipeline with query result caching"""
+        cache_key = self._query_cache_key(query, top_k, system_prompt)
+        
+        cached_result = self._cached_result(cache_key, query)
+        if cached_result is not None:
+            return cached_result
+        
+        return self._store_result(cache_key, self._rag_query_uncached(query, top_k, system_prompt))
+    
+    def _similar_recent_docs(self, query_embedding: np.ndarray, top_k: int) -> list:
+        """Documents retrieved for a recent, near-identical query, if any"""
+        if self._recent_embeddings is None:
+            return None
+        
+        similarities = self._recent_embeddings @ query_embedding
+        best = int(np.argmax(similarities))
+        recent_top_k, recent_docs = self._recent_queries[best]
+        if similarities[best] >= self.prefetch_similarity and recent_top_k == top_k:
+            return recent_docs
+        return None
+    
+    def _remember_query(self, query_embedding: np.ndarray, top_k: int, docs: list):
+        """Record a query embedding and its documents, keeping the newest cache_size"""
+        row = query_embedding.reshape(1, -1).astype(np.float32)
+        if self._recent_embeddings is None:
+            self._recent_embeddings = row
+        else:
+            self._recent_embeddings = np.vstack([self._recent_embeddings, row])[-self.cache_size:]
+        self._recent_queries = (self._recent_queries + [(top_k, docs)])[-self.cache_size:]
+    
+    @staticmethod
+    def _same_documents(docs_a: list, docs_b: list) -> bool:
+        """Whether two retrievals returned the same documents, ignoring order"""
+        def keys(docs):
+            return {(doc.get('data_source'), doc.get('id'), doc.get('title')) for doc in docs}
+        return keys(docs_a) == keys(docs_b)
+    
+    async def _retrieve_and_generate(self, query: str, top_k: int,
+                                     system_prompt: str) -> Tuple[list, str, float, float]:
+        """
+        Retrieve documents and generate the answer
+        
+        When a recent query had a near-identical embedding, generation starts
+        right away from its documents while retrieval runs; that answer is kept
+        only if retrieval returns the same documents, otherwise it is cancelled.
+        
+        Returns:
+            Tuple of (retrieved documents, response, search time, generation time)
+        """
+        loop = asyncio.get_running_loop()
+        start_time = time.time()
+        search_task = loop.run_in_executor(self._query_executor, self.search_documents, query, top_k)
+        
+        query_embedding = None
+        speculative = None
+        if self.use_hybrid and self.hybrid_engine.vector_db.embedding_model == "sentence-transformers":
+            # Shares the engine's query embedding cache with the search running alongside
+            try:
+                query_embedding = await loop.run_in_executor(
+                    self._query_executor, self.hybrid_engine.query_embedding, query)
+            except ValueError:
+                query_embedding = None
+            prefetched_docs = self._similar_recent_docs(query_embedding, top_k) if query_embedding is not None else None
+            if prefetched_docs is not None:
+                speculative = asyncio.ensure_future(
+                    self.generate_response_async(query, prefetched_docs, system_prompt))
+        
+        try:
+            retrieved_docs = await search_task
+        except BaseException:
+            if speculative is not None:
+                speculative.cancel()
+            raise
+        search_time = time.time() - start_time
+        
+        if query_embedding is not None:
+            self._remember_query(query_embedding, top_k, retrieved_docs)
+        
+        response_start = time.time()
+        if speculative is not None and self._same_documents(retrieved_docs, prefetched_docs):
+            response = await speculative
+        else:
+            if speculative is not None:
+                speculative.cancel()
+            response = await self.generate_response_async(query, retrieved_docs, system_prompt)
+        generation_time = time.time() - response_start
+        
+        return retrieved_docs, response, search_time, generation_time
+    
+    async def rag_query_async(self, query: str, top_k: int = 5, 
+                              system_prompt: str = None) -> Dict[str, Any]:
+        """
+        Async RAG pipeline for running several queries concurrently
+        
+        Retrieval runs in the query thread pool and generation uses Gemini's
+        async API, so the network wait of one query overlaps with the others.
+        """
+        cache_key = self._query_cache_key(query, top_k, system_prompt)
+        
+        cached_result = self._cached_result(cache_key, query)
+        if cached_result is not None:
+            return cached_result
+        
+        loop = asyncio.get_running_loop()
+        fallback = not self.use_hybrid and hasattr(self, 'original_retriever')
+        
+        try:
+            start_time = time.time()
+            
+            retrieved_docs, response, search_time, generation_time = await asyncio.wait_for(
+                self._retrieve_and_generate(query, top_k, system_prompt), self.timeout_seconds)
+            
+            result = self._build_result(query, response, retrieved_docs, search_time,
+                                        generation_time, time.time() - start_time, fallback)
+        except asyncio.TimeoutError as e:
+            if fallback:
+                result = _error_result(e, query)
+                result['metadata']['fallback_used'] = True
+            else:
+                print("Hybrid search timed out, falling back to original retriever", file=sys.stderr)
+                result = await loop.run_in_executor(self._query_executor, self._rag_query_after_failure, query, top_k, system_prompt, e)
+        except Exception as e:
+            if fallback:
+                result = _error_result(e, query)
+                result['metadata']['fallback_used'] = True
+            else:
+                print(f"Error in hybrid search: {e}, falling back to original retriever", file=sys.stderr)
+                result = await loop.run_in_executor(self._query_executor, self._rag_query_after_failure, query, top_k, system_prompt, e)
+        
+        return self._store_result(cache_key, result)
+    
+    async def rag_query_many(self, queries: List[str], top_k: int = 5, 
+                             system_prompt: str = None) -> List[Dict[str, Any]]:
+        """Run several RAG queries concurrently, returning results in query order"""
+        return await asyncio.gather(*[
+            self.rag_query_async(query, top_k, system_prompt) for query in queries
+        ])
+    
+    def rag_query_batch(self, queries: List[str], top_k: int = 5,
+                        system_prompt: str = None) -> List[Dict[str, Any]]:
+        """Run rag_query_many from synchronous code on the retriever's event loop"""
+        with self._event_loop_lock:
+            if self._event_loop is None:
+                self._event_loop = asyncio.new_event_loop()
+                threading.Thread(target=self._event_loop.run_forever,
+                                 name='rag-event-loop', daemon=True).start()
+        
+        future = asyncio.run_coroutine_threadsafe(
+            self.rag_query_many(queries, top_k, system_prompt), self._event_loop)
+        return future.result()
+    
+    def _rag_query_uncached(self, query: str, top_k: int = 5, 
+                            system_prompt: str = None) -> Dict[str, Any]:
         """Complete RAG pipeline with timeout handling"""
         
         # Check if we can use hybrid search or need fallback
@@ -367,58 +720,21 @@ Berikan jawaban yang akurat berdasarkan konteks di atas. Pastikan untuk menyebut
             # Use original retriever as fallback
             return self._rag_query_fallback(query, top_k, system_prompt)
         
-        # Set up timeout for hybrid search
-        if hasattr(signal, 'SIGALRM'):  # Unix systems
-            signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(self.timeout_seconds)
-        
         try:
             start_time = time.time()
             
-            # Retrieve similar documents
-            retrieved_docs = self.search_documents(query, top_k)
-            search_time = time.time() - start_time
-            
-            # Generate response
-            response_start = time.time()
-            response = self.generate_response(query, retrieved_docs, system_prompt)
-            generation_time = time.time() - response_start
+            # Retrieve and generate on a worker thread so the wait can time out
+            future = self._query_executor.submit(self._search_and_generate, query, top_k, system_prompt)
+            retrieved_docs, response, search_time, generation_time = future.result(timeout=self.timeout_seconds)
             
             total_time = time.time() - start_time
             
             # Prepare result with enhanced metadata
-            result = {
-                'query': query,
-                'response': response,
-                'retrieved_documents': [
-                    {
-                        'title': doc.get('title', doc.get('file_name', 'Untitled')),
-                        'source': doc.get('data_source', 'unknown'),
-                        'content_preview': doc.get('content', '')[:200] + "..." if len(doc.get('content', '')) > 200 else doc.get('content', ''),
-                        'similarity_score': doc.get('similarity_score', doc.get('combined_score', 0.0)),
-                        'search_method': doc.get('search_method', 'unknown'),
-                        'reference': doc.get('reference', f"{doc.get('data_source', 'unknown')}:{doc.get('title', 'untitled')}")
-                    }
-                    for doc in retrieved_docs
-                ],
-                'metadata': {
-                    'num_retrieved_docs': len(retrieved_docs),
-                    'data_sources': list(set([doc.get('data_source', 'unknown') for doc in retrieved_docs])),
-                    'total_documents_available': getattr(self.hybrid_engine, 'vector_db', {}).get('total_documents', 0) if self.use_hybrid else len(getattr(self.original_retriever, 'documents', [])),
-                    'top_similarity_score': retrieved_docs[0].get('similarity_score', retrieved_docs[0].get('combined_score', 0.0)) if retrieved_docs else 0.0,
-                    'search_engine': 'hybrid' if self.use_hybrid else 'original',
-                    'performance': {
-                        'search_time_seconds': search_time,
-                        'generation_time_seconds': generation_time,
-                        'total_time_seconds': total_time
-                    }
-                }
-            }
+            return self._build_result(query, response, retrieved_docs,
+                                      search_time, generation_time, total_time)
             
-            return result
-            
-        except TimeoutException:
-            # Fallback to original retriever on timeout
+        except FuturesTimeoutError:
+            # Fallback to original retriever on timeout; the abandoned worker finishes in the background
             print("Hybrid search timed out, falling back to original retriever", file=sys.stderr)
             self.use_hybrid = False
             self._init_original_search()
@@ -426,23 +742,44 @@ Berikan jawaban yang akurat berdasarkan konteks di atas. Pastikan untuk menyebut
             
         except Exception as e:
             print(f"Error in hybrid search: {e}, falling back to original retriever", file=sys.stderr)
-            # Try fallback
-            try:
-                self.use_hybrid = False
-                self._init_original_search()
-                return self._rag_query_fallback(query, top_k, system_prompt)
-            except Exception as fallback_error:
-                return {
-                    'error': f"Both hybrid and fallback failed: {str(e)}, {str(fallback_error)}",
-                    'query': query,
-                    'response': 'Maaf, terjadi kesalahan saat memproses permintaan Anda.',
-                    'retrieved_documents': [],
-                    'metadata': {'error': True, 'hybrid_failed': True, 'fallback_failed': True}
-                }
-        finally:
-            # Cancel timeout
-            if hasattr(signal, 'SIGALRM'):
-                signal.alarm(0)
+            return self._rag_query_after_failure(query, top_k, system_prompt, e)
+    
+    def _search_and_generate(self, query: str, top_k: int,
+                             system_prompt: str) -> Tuple[list, str, float, float]:
+        """
+        Retrieve documents and generate the answer synchronously
+        
+        Returns:
+            Tuple of (retrieved documents, response, search time, generation time)
+        """
+        start_time = time.time()
+        
+        # Retrieve similar documents
+        retrieved_docs = self.search_documents(query, top_k)
+        search_time = time.time() - start_time
+        
+        # Generate response
+        response_start = time.time()
+        response = self.generate_response(query, retrieved_docs, system_prompt)
+        generation_time = time.time() - response_start
+        
+        return retrieved_docs, response, search_time, generation_time
+    
+    def _rag_query_after_failure(self, query: str, top_k: int, system_prompt: str,
+                                 error: Exception) -> Dict[str, Any]:
+        """Switch to the original retriever after a hybrid failure and retry"""
+        try:
+            self.use_hybrid = False
+            self._init_original_search()
+            return self._rag_query_fallback(query, top_k, system_prompt)
+        except Exception as fallback_error:
+            return {
+                'error': f"Both hybrid and fallback failed: {str(error)}, {str(fallback_error)}",
+                'query': query,
+                'response': 'Maaf, terjadi kesalahan saat memproses permintaan Anda.',
+                'retrieved_documents': [],
+                'metadata': {'error': True, 'hybrid_failed': True, 'fallback_failed': True}
+            }
 
     def _rag_query_fallback(self, query: str, top_k: int = 5, 
                            system_prompt: str = None) -> Dict[str, Any]:
@@ -451,7 +788,7 @@ Berikan jawaban yang akurat berdasarkan konteks di atas. Pastikan untuk menyebut
             start_time = time.time()
             
             # Use original retriever
-            retrieved_docs = self.original_retriever.search_similar_documents(query, top_k)
+            retrieved_docs = self.search_documents(query, top_k)
             search_time = time.time() - start_time
             
             # Generate response
@@ -461,31 +798,8 @@ Berikan jawaban yang akurat berdasarkan konteks di atas. Pastikan untuk menyebut
             
             total_time = time.time() - start_time
             
-            return {
-                'query': query,
-                'response': response,
-                'retrieved_documents': [
-                    {
-                        'title': doc.get('title', doc.get('file_name', 'Untitled')),
-                        'source': doc.get('data_source', 'unknown'),
-                        'content_preview': doc.get('content', '')[:200] + "..." if len(doc.get('content', '')) > 200 else doc.get('content', ''),
-                        'similarity_score': doc.get('similarity_score', 0.0),
-                        'search_method': 'original_fallback',
-                        'reference': f"{doc.get('data_source', 'unknown')}:{doc.get('title', 'untitled')}"
-                    }
-                    for doc in retrieved_docs
-                ],
-                'metadata': {
-                    'num_retrieved_docs': len(retrieved_docs),
-                    'data_sources': list(set([doc.get('data_source', 'unknown') for doc in retrieved_docs])),
-                    'search_engine': 'original_fallback',
-                    'performance': {
-                        'search_time_seconds': search_time,
-                        'generation_time_seconds': generation_time,
-                        'total_time_seconds': total_time
-                    }
-                }
-            }
+            return self._build_result(query, response, retrieved_docs, search_time,
+                                      generation_time, total_time, fallback=True)
             
         except Exception as e:
             return {
@@ -497,50 +811,48 @@ Berikan jawaban yang akurat berdasarkan konteks di atas. Pastikan untuk menyebut
             }
 
 
-def main():
-    """Main function untuk API call"""
-    try:
-        # Get command line arguments
-        if len(sys.argv) < 2:
-            raise ValueError("Query parameter is required")
-        
-        query = sys.argv[1]
-        max_docs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
-        context = sys.argv[3] if len(sys.argv) > 3 else 'anamnesis'
-        use_hybrid = sys.argv[4].lower() == 'true' if len(sys.argv) > 4 else True
-        
-        # Setup paths
-        current_dir = Path(__file__).parent
-        env_file = current_dir.parent / '.env.local'
-        data_folder_path = current_dir / 'data'
-        
-        # Load environment variables manually
-        gemini_api_key = None
-        if env_file.exists():
-            with open(env_file, 'r') as f:
-                for line in f:
-                    if line.startswith('GOOGLE_API_KEY='):
-                        gemini_api_key = line.split('=', 1)[1].strip()
-                        break
-        
-        if not gemini_api_key:
-            raise ValueError("GOOGLE_API_KEY not found in .env.local")
-        
-        # Check if data folder exists
-        if not data_folder_path.exists():
-            raise FileNotFoundError(f"Data folder not found at {data_folder_path}")
-        
-        # Initialize enhanced RAG retriever with disabled hybrid search for now
-        retriever = EnhancedRAGRetriever(
-            gemini_api_key=gemini_api_key,
-            data_folder_path=str(data_folder_path),
-            use_hybrid=False,  
-            timeout_seconds=60  
-        )
-        
-        # Customize system prompt based on context
-        system_prompts = {
-            'anamnesis': """Anda adalah asisten medis AI yang membantu dalam proses anamnesis (wawancara medis). 
+DEFAULT_SERVER_HOST = os.environ.get('RAG_SERVER_HOST', '127.0.0.1')
+DEFAULT_SERVER_PORT = int(os.environ.get('RAG_SERVER_PORT', '8765'))
+
+
+def load_api_key(env_file: Path) -> str:
+    """Get GOOGLE_API_KEY from the environment, falling back to .env.local"""
+    return os.environ.get('GOOGLE_API_KEY') or _read_env_api_key(Path(env_file))
+
+
+@functools.lru_cache(maxsize=None)
+def _read_env_api_key(env_file: Path) -> str:
+    """Read GOOGLE_API_KEY from an env file with a single regex scan, once per path"""
+    if not env_file.exists() or env_file.stat().st_size == 0:
+        return None
+    
+    with open(env_file, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            match = re.search(rb'^GOOGLE_API_KEY=(.*)$', data, re.M)
+            return match.group(1).decode('utf-8').strip() if match else None
+
+
+# Default system prompt for medical assistant
+DEFAULT_SYSTEM_PROMPT = """Anda adalah asisten medis AI yang berpengetahuan luas dan berpengalaman dalam diagnosis dan anamnesis. 
+Tugas Anda adalah membantu dalam proses anamnesis dan memberikan rekomendasi diagnosis berdasarkan informasi yang tersedia.
+
+INSTRUKSI PENTING:
+1. Gunakan HANYA informasi dari konteks yang disediakan di bawah ini
+2. Jika informasi tidak cukup atau tidak relevan, nyatakan dengan jelas
+3. JANGAN mengarang atau membuat informasi medis
+4. Berikan penjelasan yang mudah dipahami namun tetap akurat
+5. Sertakan referensi ke sumber informasi jika memungkinkan
+6. Jika diperlukan pemeriksaan lebih lanjut, sebutkan dengan jelas"""
+
+# Fixed parts of the Gemini prompt around the retrieved context
+PROMPT_CONTEXT_HEADER = "\n\nKONTEKS DARI SUMBER DATA:\n"
+PROMPT_REFERENCES_HEADER = "\n\nREFERENSI YANG DIGUNAKAN:\n"
+PROMPT_QUESTION_HEADER = "\n\nPERTANYAAN: "
+PROMPT_SUFFIX = "\n\nBerikan jawaban yang akurat berdasarkan konteks di atas. Pastikan untuk menyebutkan referensi yang relevan dalam jawaban Anda.\n"
+
+# System prompts per consultation context, shared by the CLI and the server
+SYSTEM_PROMPTS = MappingProxyType({
+    sys.intern('anamnesis'): """Anda adalah asisten medis AI yang membantu dalam proses anamnesis (wawancara medis). 
 Tugas Anda adalah membantu dokter dan pasien dalam mengumpulkan informasi medis yang relevan.
 
 INSTRUKSI:
@@ -549,8 +861,8 @@ INSTRUKSI:
 3. Berikan penjelasan yang mudah dipahami pasien
 4. Fokus pada gejala, riwayat medis, dan faktor risiko
 5. Jika informasi tidak cukup, minta klarifikasi""",
-            
-            'diagnosis': """Anda adalah asisten medis AI yang membantu dalam proses diagnosis. 
+    
+    sys.intern('diagnosis'): """Anda adalah asisten medis AI yang membantu dalam proses diagnosis. 
 Tugas Anda adalah memberikan rekomendasi diagnosis berdasarkan informasi yang tersedia.
 
 INSTRUKSI:
@@ -559,8 +871,8 @@ INSTRUKSI:
 3. Sertakan tingkat keyakinan diagnosis
 4. Rekomendasikan pemeriksaan penunjang jika diperlukan
 5. JANGAN memberikan diagnosis pasti tanpa pemeriksaan langsung""",
-            
-            'general': """Anda adalah asisten medis AI yang berpengetahuan luas. 
+    
+    sys.intern('general'): """Anda adalah asisten medis AI yang berpengetahuan luas. 
 Berikan informasi medis yang akurat berdasarkan konteks yang disediakan.
 
 INSTRUKSI:
@@ -568,27 +880,182 @@ INSTRUKSI:
 2. Berikan penjelasan yang akurat dan mudah dipahami
 3. Jika informasi tidak mencukupi, nyatakan dengan jelas
 4. Hindari memberikan saran medis spesifik tanpa konsultasi dokter"""
-        }
+})
+
+
+def _create_retriever() -> EnhancedRAGRetriever:
+    """Create the retriever used by both the one-shot CLI and the server"""
+    current_dir = Path(__file__).parent
+    env_file = current_dir.parent / '.env.local'
+    data_folder_path = current_dir / 'data'
+    
+    gemini_api_key = load_api_key(env_file)
+    if not gemini_api_key:
+        raise ValueError("GOOGLE_API_KEY not found in the environment or .env.local")
+    
+    # Check if data folder exists
+    if not data_folder_path.exists():
+        raise FileNotFoundError(f"Data folder not found at {data_folder_path}")
+    
+    # Initialize enhanced RAG retriever with disabled hybrid search for now
+    return EnhancedRAGRetriever(
+        gemini_api_key=gemini_api_key,
+        data_folder_path=str(data_folder_path),
+        use_hybrid=False,  
+        timeout_seconds=60  
+    )
+
+
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _dump_json(payload: Dict[str, Any], pretty: bool = False) -> bytes:
+    """Serialize a response payload to UTF-8 JSON bytes"""
+    options = JSON_OPTIONS | orjson.OPT_INDENT_2 if pretty else JSON_OPTIONS
+    return orjson.dumps(payload, option=options)
+
+
+def _write_json(payload: Dict[str, Any], pretty: bool = False):
+    """Write a response payload to stdout as raw UTF-8 bytes"""
+    sys.stdout.buffer.write(_dump_json(payload, pretty))
+    sys.stdout.buffer.write(b"\n")
+    sys.stdout.flush()
+
+
+def _error_result(error: Exception, query: str) -> Dict[str, Any]:
+    """Build the error payload returned to the Next.js route"""
+    return {
+        'error': str(error),
+        'query': query,
+        'response': 'Maaf, terjadi kesalahan saat memproses permintaan Anda.',
+        'retrieved_documents': [],
+        'metadata': {'error': True}
+    }
+
+
+class RAGRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler that serves RAG queries from a resident retriever"""
+    
+    retriever: EnhancedRAGRetriever = None
+    
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        body = _dump_json(payload)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': 'Not found'})
+    
+    def do_POST(self):
+        if self.path == '/query/batch':
+            self._handle_batch()
+            return
+        if self.path != '/query':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        
+        query = ''
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            query = payload.get('query', '')
+            if not query:
+                raise ValueError("Query parameter is required")
+            
+            max_docs = int(payload.get('maxDocs', 5))
+            system_prompt = SYSTEM_PROMPTS.get(
+                payload.get('context', 'anamnesis'), SYSTEM_PROMPTS['general'])
+            
+            result = self.retriever.rag_query(query, max_docs, system_prompt)
+            self._send_json(200, result)
+        except Exception as e:
+            self._send_json(500, _error_result(e, query))
+    
+    def _handle_batch(self):
+        """Answer several queries from one conversation turn concurrently"""
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            queries = payload.get('queries') or []
+            if not queries:
+                raise ValueError("Queries parameter is required")
+            
+            max_docs = int(payload.get('maxDocs', 5))
+            system_prompt = SYSTEM_PROMPTS.get(
+                payload.get('context', 'anamnesis'), SYSTEM_PROMPTS['general'])
+            
+            results = self.retriever.rag_query_batch(queries, max_docs, system_prompt)
+            self._send_json(200, {'results': results})
+        except Exception as e:
+            self._send_json(500, _error_result(e, ''))
+    
+    def log_message(self, format, *args):
+        # Keep stdout clean; access logs go to stderr
+        print(f"{self.address_string()} - {format % args}", file=sys.stderr)
+
+
+def serve(host: str = DEFAULT_SERVER_HOST, port: int = DEFAULT_SERVER_PORT):
+    """
+    Run a long-lived RAG server so indexes and Gemini setup are loaded once.
+    
+    Requests are handled one at a time; each query still runs under the
+    retriever's thread-based timeout.
+    """
+    RAGRequestHandler.retriever = _create_retriever()
+    
+    server = HTTPServer((host, port), RAGRequestHandler)
+    print(f"RAG server listening on http://{host}:{port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    """Main function untuk API call"""
+    flags = {arg for arg in sys.argv[1:] if arg.startswith('--')}
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    pretty = '--pretty' in flags
+    
+    if '--serve' in flags:
+        serve()
+        return
+    
+    # Default (or --oneshot): answer a single query and exit
+    try:
+        # Get command line arguments
+        if len(args) < 1:
+            raise ValueError("Query parameter is required")
         
-        system_prompt = system_prompts.get(context, system_prompts['general'])
+        query = args[0]
+        max_docs = int(args[1]) if len(args) > 1 else 5
+        context = args[2] if len(args) > 2 else 'anamnesis'
+        use_hybrid = args[3].lower() == 'true' if len(args) > 3 else True
+        
+        retriever = _create_retriever()
+        
+        # Customize system prompt based on context
+        system_prompt = SYSTEM_PROMPTS.get(context, SYSTEM_PROMPTS['general'])
         
    
         result = retriever.rag_query(query, max_docs, system_prompt)
         
    
-        print(json.dumps(result, ensure_ascii=False, indent=2))
+        _write_json(result, pretty)
         
     except Exception as e:
         # Output error as JSON
-        error_result = {
-            'error': str(e),
-            'query': sys.argv[1] if len(sys.argv) > 1 else '',
-            'response': 'Maaf, terjadi kesalahan saat memproses permintaan Anda.',
-            'retrieved_documents': [],
-            'metadata': {'error': True}
-        }
-        print(json.dumps(error_result, ensure_ascii=False, indent=2))
+        error_result = _error_result(e, args[0] if args else '')
+        _write_json(error_result, pretty)
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
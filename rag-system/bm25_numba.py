@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Numba Kernels for BM25 Search
+Loop scoring BM25 di atas postings CSC yang dikompilasi JIT (opsional, butuh numba)
+"""
+
+import logging
+import numpy as np
+from numba import njit, prange
+
+logger = logging.getLogger(__name__)
+
+# Postings handled per inner loop; fixed-size blocks let LLVM unroll and vectorize them
+POSTINGS_CHUNK = 256
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def score_query(term_ids, data, indices, indptr, out):
+    """
+    Add the precomputed BM25 contributions of each query term into out
+
+    Postings of one term never repeat a document, so each term's postings
+    are split into chunks across threads without write conflicts. Terms
+    with at most one chunk of postings are scored serially, since starting
+    the thread pool costs more than the work.
+    """
+    for i in range(term_ids.shape[0]):
+        term_id = term_ids[i]
+        start = indptr[term_id]
+        end = indptr[term_id + 1]
+        if end - start <= POSTINGS_CHUNK:
+            for p in range(start, end):
+                out[indices[p]] += data[p]
+            continue
+
+        num_chunks = (end - start + POSTINGS_CHUNK - 1) // POSTINGS_CHUNK
+        for c in prange(num_chunks):
+            chunk_start = start + c * POSTINGS_CHUNK
+            chunk_end = min(chunk_start + POSTINGS_CHUNK, end)
+            for p in range(chunk_start, chunk_end):
+                out[indices[p]] += data[p]
+
+
+def warm_up():
+    """Compile the scoring kernel ahead of the first query"""
+    indptr = np.array([0, 1], dtype=np.int32)
+    indices = np.array([0], dtype=np.int32)
+    data = np.ones(1, dtype=np.float32)
+    score_query(np.zeros(1, dtype=np.int64), data, indices, indptr, np.zeros(1, dtype=np.float32))
+    logger.debug("Compiled BM25 score_query kernel")
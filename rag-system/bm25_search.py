@@ -6,22 +6,215 @@ Provides keyword-based search using BM25 algorithm with Indonesian text preproce
 
 import os
 import re
+import functools
 import json
 import logging
-import pickle
-from typing import List, Dict, Any, Set
+import multiprocessing
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Set, Tuple
 from pathlib import Path
 import numpy as np
-from rank_bm25 import BM25Okapi
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import PorterStemmer
+from scipy import sparse
+
+from document_store import read_documents, write_documents
+
+# Optional Indonesian stemmer (Nazief-Adriani based)
+try:
+    from Sastrawi.Stemmer.StemmerFactory import StemmerFactory
+    SASTRAWI_AVAILABLE = True
+except ImportError:
+    SASTRAWI_AVAILABLE = False
+
+# Optional JIT-compiled scoring loop
+try:
+    import bm25_numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Lowercased alphanumeric runs; everything else separates words
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# NLTK's Indonesian stopword list (Tala, 2003), embedded so NLTK is only needed for other languages
+INDONESIAN_STOPWORDS = frozenset({
+    'ada', 'adalah', 'adanya', 'adapun', 'agak', 'agaknya', 'agar', 'akan', 'akankah',
+    'akhir', 'akhiri', 'akhirnya', 'aku', 'akulah', 'amat', 'amatlah', 'anda', 'andalah',
+    'antar', 'antara', 'antaranya', 'apa', 'apaan', 'apabila', 'apakah', 'apalagi',
+    'apatah', 'artinya', 'asal', 'asalkan', 'atas', 'atau', 'ataukah', 'ataupun', 'awal',
+    'awalnya', 'bagai', 'bagaikan', 'bagaimana', 'bagaimanakah', 'bagaimanapun', 'bagi',
+    'bagian', 'bahkan', 'bahwa', 'bahwasanya', 'baik', 'bakal', 'bakalan', 'balik',
+    'banyak', 'bapak', 'baru', 'bawah', 'beberapa', 'begini', 'beginian', 'beginikah',
+    'beginilah', 'begitu', 'begitukah', 'begitulah', 'begitupun', 'bekerja', 'belakang',
+    'belakangan', 'belum', 'belumlah', 'benar', 'benarkah', 'benarlah', 'berada',
+    'berakhir', 'berakhirlah', 'berakhirnya', 'berapa', 'berapakah', 'berapalah',
+    'berapapun', 'berarti', 'berawal', 'berbagai', 'berdatangan', 'beri', 'berikan',
+    'berikut', 'berikutnya', 'berjumlah', 'berkali-kali', 'berkata', 'berkehendak',
+    'berkeinginan', 'berkenaan', 'berlainan', 'berlalu', 'berlangsung', 'berlebihan',
+    'bermacam', 'bermacam-macam', 'bermaksud', 'bermula', 'bersama', 'bersama-sama',
+    'bersiap', 'bersiap-siap', 'bertanya', 'bertanya-tanya', 'berturut', 'berturut-turut',
+    'bertutur', 'berujar', 'berupa', 'besar', 'betul', 'betulkah', 'biasa', 'biasanya',
+    'bila', 'bilakah', 'bisa', 'bisakah', 'boleh', 'bolehkah', 'bolehlah', 'buat', 'bukan',
+    'bukankah', 'bukanlah', 'bukannya', 'bulan', 'bung', 'cara', 'caranya', 'cukup',
+    'cukupkah', 'cukuplah', 'cuma', 'dahulu', 'dalam', 'dan', 'dapat', 'dari', 'daripada',
+    'datang', 'dekat', 'demi', 'demikian', 'demikianlah', 'dengan', 'depan', 'di', 'dia',
+    'diakhiri', 'diakhirinya', 'dialah', 'diantara', 'diantaranya', 'diberi', 'diberikan',
+    'diberikannya', 'dibuat', 'dibuatnya', 'didapat', 'didatangkan', 'digunakan',
+    'diibaratkan', 'diibaratkannya', 'diingat', 'diingatkan', 'diinginkan', 'dijawab',
+    'dijelaskan', 'dijelaskannya', 'dikarenakan', 'dikatakan', 'dikatakannya', 'dikerjakan',
+    'diketahui', 'diketahuinya', 'dikira', 'dilakukan', 'dilalui', 'dilihat', 'dimaksud',
+    'dimaksudkan', 'dimaksudkannya', 'dimaksudnya', 'diminta', 'dimintai', 'dimisalkan',
+    'dimulai', 'dimulailah', 'dimulainya', 'dimungkinkan', 'dini', 'dipastikan',
+    'diperbuat', 'diperbuatnya', 'dipergunakan', 'diperkirakan', 'diperlihatkan',
+    'diperlukan', 'diperlukannya', 'dipersoalkan', 'dipertanyakan', 'dipunyai', 'diri',
+    'dirinya', 'disampaikan', 'disebut', 'disebutkan', 'disebutkannya', 'disini',
+    'disinilah', 'ditambahkan', 'ditandaskan', 'ditanya', 'ditanyai', 'ditanyakan',
+    'ditegaskan', 'ditujukan', 'ditunjuk', 'ditunjuki', 'ditunjukkan', 'ditunjukkannya',
+    'ditunjuknya', 'dituturkan', 'dituturkannya', 'diucapkan', 'diucapkannya',
+    'diungkapkan', 'dong', 'dua', 'dulu', 'empat', 'enggak', 'enggaknya', 'entah',
+    'entahlah', 'guna', 'gunakan', 'hal', 'hampir', 'hanya', 'hanyalah', 'hari', 'harus',
+    'haruslah', 'harusnya', 'hendak', 'hendaklah', 'hendaknya', 'hingga', 'ia', 'ialah',
+    'ibarat', 'ibaratkan', 'ibaratnya', 'ibu', 'ikut', 'ingat', 'ingat-ingat', 'ingin',
+    'inginkah', 'inginkan', 'ini', 'inikah', 'inilah', 'itu', 'itukah', 'itulah', 'jadi',
+    'jadilah', 'jadinya', 'jangan', 'jangankan', 'janganlah', 'jauh', 'jawab', 'jawaban',
+    'jawabnya', 'jelas', 'jelaskan', 'jelaslah', 'jelasnya', 'jika', 'jikalau', 'juga',
+    'jumlah', 'jumlahnya', 'justru', 'kala', 'kalau', 'kalaulah', 'kalaupun', 'kalian',
+    'kami', 'kamilah', 'kamu', 'kamulah', 'kan', 'kapan', 'kapankah', 'kapanpun', 'karena',
+    'karenanya', 'kasus', 'kata', 'katakan', 'katakanlah', 'katanya', 'ke', 'keadaan',
+    'kebetulan', 'kecil', 'kedua', 'keduanya', 'keinginan', 'kelamaan', 'kelihatan',
+    'kelihatannya', 'kelima', 'keluar', 'kembali', 'kemudian', 'kemungkinan',
+    'kemungkinannya', 'kenapa', 'kepada', 'kepadanya', 'kesampaian', 'keseluruhan',
+    'keseluruhannya', 'keterlaluan', 'ketika', 'khususnya', 'kini', 'kinilah', 'kira',
+    'kira-kira', 'kiranya', 'kita', 'kitalah', 'kok', 'kurang', 'lagi', 'lagian', 'lah',
+    'lain', 'lainnya', 'lalu', 'lama', 'lamanya', 'lanjut', 'lanjutnya', 'lebih', 'lewat',
+    'lima', 'luar', 'macam', 'maka', 'makanya', 'makin', 'malah', 'malahan', 'mampu',
+    'mampukah', 'mana', 'manakala', 'manalagi', 'masa', 'masalah', 'masalahnya', 'masih',
+    'masihkah', 'masing', 'masing-masing', 'mau', 'maupun', 'melainkan', 'melakukan',
+    'melalui', 'melihat', 'melihatnya', 'memang', 'memastikan', 'memberi', 'memberikan',
+    'membuat', 'memerlukan', 'memihak', 'meminta', 'memintakan', 'memisalkan', 'memperbuat',
+    'mempergunakan', 'memperkirakan', 'memperlihatkan', 'mempersiapkan', 'mempersoalkan',
+    'mempertanyakan', 'mempunyai', 'memulai', 'memungkinkan', 'menaiki', 'menambahkan',
+    'menandaskan', 'menanti', 'menanti-nanti', 'menantikan', 'menanya', 'menanyai',
+    'menanyakan', 'mendapat', 'mendapatkan', 'mendatang', 'mendatangi', 'mendatangkan',
+    'menegaskan', 'mengakhiri', 'mengapa', 'mengatakan', 'mengatakannya', 'mengenai',
+    'mengerjakan', 'mengetahui', 'menggunakan', 'menghendaki', 'mengibaratkan',
+    'mengibaratkannya', 'mengingat', 'mengingatkan', 'menginginkan', 'mengira',
+    'mengucapkan', 'mengucapkannya', 'mengungkapkan', 'menjadi', 'menjawab', 'menjelaskan',
+    'menuju', 'menunjuk', 'menunjuki', 'menunjukkan', 'menunjuknya', 'menurut',
+    'menuturkan', 'menyampaikan', 'menyangkut', 'menyatakan', 'menyebutkan', 'menyeluruh',
+    'menyiapkan', 'merasa', 'mereka', 'merekalah', 'merupakan', 'meski', 'meskipun',
+    'meyakini', 'meyakinkan', 'minta', 'mirip', 'misal', 'misalkan', 'misalnya', 'mula',
+    'mulai', 'mulailah', 'mulanya', 'mungkin', 'mungkinkah', 'nah', 'naik', 'namun',
+    'nanti', 'nantinya', 'nyaris', 'nyatanya', 'oleh', 'olehnya', 'pada', 'padahal',
+    'padanya', 'pak', 'paling', 'panjang', 'pantas', 'para', 'pasti', 'pastilah', 'penting',
+    'pentingnya', 'per', 'percuma', 'perlu', 'perlukah', 'perlunya', 'pernah', 'persoalan',
+    'pertama', 'pertama-tama', 'pertanyaan', 'pertanyakan', 'pihak', 'pihaknya', 'pukul',
+    'pula', 'pun', 'punya', 'rasa', 'rasanya', 'rata', 'rupanya', 'saat', 'saatnya', 'saja',
+    'sajalah', 'saling', 'sama', 'sama-sama', 'sambil', 'sampai', 'sampai-sampai',
+    'sampaikan', 'sana', 'sangat', 'sangatlah', 'satu', 'saya', 'sayalah', 'se', 'sebab',
+    'sebabnya', 'sebagai', 'sebagaimana', 'sebagainya', 'sebagian', 'sebaik',
+    'sebaik-baiknya', 'sebaiknya', 'sebaliknya', 'sebanyak', 'sebegini', 'sebegitu',
+    'sebelum', 'sebelumnya', 'sebenarnya', 'seberapa', 'sebesar', 'sebetulnya', 'sebisanya',
+    'sebuah', 'sebut', 'sebutlah', 'sebutnya', 'secara', 'secukupnya', 'sedang',
+    'sedangkan', 'sedemikian', 'sedikit', 'sedikitnya', 'seenaknya', 'segala', 'segalanya',
+    'segera', 'seharusnya', 'sehingga', 'seingat', 'sejak', 'sejauh', 'sejenak', 'sejumlah',
+    'sekadar', 'sekadarnya', 'sekali', 'sekali-kali', 'sekalian', 'sekaligus', 'sekalipun',
+    'sekarang', 'sekecil', 'seketika', 'sekiranya', 'sekitar', 'sekitarnya',
+    'sekurang-kurangnya', 'sekurangnya', 'sela', 'selain', 'selaku', 'selalu', 'selama',
+    'selama-lamanya', 'selamanya', 'selanjutnya', 'seluruh', 'seluruhnya', 'semacam',
+    'semakin', 'semampu', 'semampunya', 'semasa', 'semasih', 'semata', 'semata-mata',
+    'semaunya', 'sementara', 'semisal', 'semisalnya', 'sempat', 'semua', 'semuanya',
+    'semula', 'sendiri', 'sendirian', 'sendirinya', 'seolah', 'seolah-olah', 'seorang',
+    'sepanjang', 'sepantasnya', 'sepantasnyalah', 'seperlunya', 'seperti', 'sepertinya',
+    'sepihak', 'sering', 'seringnya', 'serta', 'serupa', 'sesaat', 'sesama', 'sesampai',
+    'sesegera', 'sesekali', 'seseorang', 'sesuatu', 'sesuatunya', 'sesudah', 'sesudahnya',
+    'setelah', 'setempat', 'setengah', 'seterusnya', 'setiap', 'setiba', 'setibanya',
+    'setidak-tidaknya', 'setidaknya', 'setinggi', 'seusai', 'sewaktu', 'siap', 'siapa',
+    'siapakah', 'siapapun', 'sini', 'sinilah', 'soal', 'soalnya', 'suatu', 'sudah',
+    'sudahkah', 'sudahlah', 'supaya', 'tadi', 'tadinya', 'tahu', 'tahun', 'tak', 'tambah',
+    'tambahnya', 'tampak', 'tampaknya', 'tandas', 'tandasnya', 'tanpa', 'tanya', 'tanyakan',
+    'tanyanya', 'tapi', 'tegas', 'tegasnya', 'telah', 'tempat', 'tengah', 'tentang',
+    'tentu', 'tentulah', 'tentunya', 'tepat', 'terakhir', 'terasa', 'terbanyak',
+    'terdahulu', 'terdapat', 'terdiri', 'terhadap', 'terhadapnya', 'teringat',
+    'teringat-ingat', 'terjadi', 'terjadilah', 'terjadinya', 'terkira', 'terlalu',
+    'terlebih', 'terlihat', 'termasuk', 'ternyata', 'tersampaikan', 'tersebut',
+    'tersebutlah', 'tertentu', 'tertuju', 'terus', 'terutama', 'tetap', 'tetapi', 'tiap',
+    'tiba', 'tiba-tiba', 'tidak', 'tidakkah', 'tidaklah', 'tiga', 'tinggi', 'toh', 'tunjuk',
+    'turut', 'tutur', 'tuturnya', 'ucap', 'ucapnya', 'ujar', 'ujarnya', 'umum', 'umumnya',
+    'ungkap', 'ungkapnya', 'untuk', 'usah', 'usai', 'waduh', 'wah', 'wahai', 'waktu',
+    'waktunya', 'walau', 'walaupun', 'wong', 'yaitu', 'yakin', 'yakni', 'yang'
+})
+
+# Queries whose postings cover less than this fraction of the corpus are scored sparsely
+SPARSE_SCORING_MAX_FRACTION = 0.125
+
+# Below this many documents, worker start-up costs more than parallel preprocessing saves
+PARALLEL_PREPROCESS_MIN_DOCS = 2000
+
+# Arrays of a saved index, each stored in its own .npy file
+INDEX_ARRAYS = ('score_data', 'score_indices', 'score_indptr', 'idf', 'max_score_per_term', 'token_ids', 'token_indptr')
+
+# Preprocessing settings of a worker process, set by _init_preprocess_worker
+_worker_settings = None
+
+
+def _create_stemmer(name: str):
+    """Create the named stemmer ('sastrawi' or 'porter')"""
+    if name == 'sastrawi':
+        return StemmerFactory().create_stemmer()
+    from nltk.stem import PorterStemmer
+    return PorterStemmer()
+
+
+def _tokenize(text: str, min_word_length: int, stopwords: frozenset, stem=None) -> Tuple[str, ...]:
+    """Tokenize, filter and optionally stem text"""
+    # Lowercase and tokenize in a single regex scan
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    kept = [token for token in tokens if len(token) >= min_word_length and token not in stopwords]
+    if stem is None:
+        return tuple(kept)
+    return tuple([stem(token) for token in kept])
+
+
+def _init_preprocess_worker(min_word_length: int, stopwords: frozenset, stemmer_name: str):
+    """Set up preprocessing in a worker process"""
+    global _worker_settings
+    stem = None
+    if stemmer_name:
+        stem = functools.lru_cache(maxsize=200_000)(_create_stemmer(stemmer_name).stem)
+    _worker_settings = (min_word_length, stopwords, stem)
+
+
+def _preprocess_in_worker(text: str) -> Tuple[str, ...]:
+    """Preprocess one text with the worker's settings"""
+    return _tokenize(text, *_worker_settings)
+
+
+@dataclass(slots=True)
+class BM25Result:
+    """A BM25 hit that references its document instead of copying it"""
+    doc_id: str
+    title: str
+    bm25_score: float
+    rank: int
+    matched_tokens: List[str]
+    document: Dict[str, Any] = field(repr=False)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Document fields plus the BM25 result fields, in the older dict format"""
+        return {
+            **self.document,
+            'bm25_score': self.bm25_score,
+            'rank': self.rank,
+            'search_method': 'bm25_keyword',
+            'matched_tokens': self.matched_tokens
+        }
+
+
 class BM25Search:
     """
     BM25 keyword-based search with Indonesian text preprocessing
@@ -34,7 +227,8 @@ class BM25Search:
                  remove_stopwords: bool = True,
                  min_word_length: int = 2,
                  k1: float = 1.2,
-                 b: float = 0.75):
+                 b: float = 0.75,
+                 n_threads: int = None):
         """
         Initialize BM25 Search
         
@@ -45,6 +239,7 @@ class BM25Search:
             min_word_length: Minimum word length to include
             k1: BM25 parameter controlling term frequency scaling
             b: BM25 parameter controlling document length normalization
+            n_threads: Worker threads for search_batch (default: min(8, CPU count))
         """
         self.language = language
         self.use_stemming = use_stemming
@@ -52,49 +247,68 @@ class BM25Search:
         self.min_word_length = min_word_length
         self.k1 = k1
         self.b = b
-        
-        # Initialize NLTK components
-        self._download_nltk_data()
+        self.n_threads = n_threads or min(8, os.cpu_count() or 1)
         
         # Initialize text processing components
+        self.stemmer_name = None
         if self.use_stemming:
-            self.stemmer = PorterStemmer()  # For English; could add Indonesian stemmer
+            if language == "indonesian" and SASTRAWI_AVAILABLE:
+                self._set_stemmer('sastrawi')
+            else:
+                if language == "indonesian":
+                    logger.warning("Sastrawi not installed, falling back to Porter stemmer")
+                self._set_stemmer('porter')
         
         if self.remove_stopwords:
-            try:
-                self.stopwords = set(stopwords.words(language))
-            except:
-                logger.warning(f"Stopwords for {language} not available, using English")
-                self.stopwords = set(stopwords.words('english'))
-                
-                # Add common Indonesian stopwords manually
-                indonesian_stopwords = {
-                    'yang', 'dan', 'di', 'ke', 'dari', 'untuk', 'pada', 'dengan', 'dalam', 
-                    'adalah', 'ini', 'itu', 'atau', 'jika', 'dapat', 'akan', 'tidak', 
-                    'ada', 'bila', 'oleh', 'satu', 'dua', 'tiga', 'juga', 'sudah', 
-                    'telah', 'masih', 'hanya', 'sama', 'bisa', 'maka', 'agar', 'supaya',
-                    'ia', 'dia', 'kita', 'kami', 'mereka', 'saya', 'anda', 'nya'
-                }
-                self.stopwords.update(indonesian_stopwords)
+            self.stopwords = self._load_stopwords(language)
         else:
-            self.stopwords = set()
+            self.stopwords = frozenset()
+        self._filter_enabled = self.remove_stopwords and bool(self.stopwords)
         
         # Initialize BM25 components
-        self.bm25 = None
+        self.vocab: Dict[str, int] = {}
+        self.terms: List[str] = []  # Term of each vocabulary id
+        self.idf = None
+        self.score_matrix = None  # CSC (documents x terms) of precomputed BM25 term scores
+        self.max_score_per_term = None  # Upper bound of each term's contribution, for MaxScore
         self.documents = []
-        self.tokenized_docs = []
+        # int32 vocabulary ids of all documents' tokens, document i owning
+        # token_ids[token_indptr[i]:token_indptr[i + 1]]
+        self.token_ids = np.empty(0, dtype=np.int32)
+        self.token_indptr = np.zeros(1, dtype=np.int64)
         self.doc_ids = []
         
+        # Per-instance cache, so it follows this instance's stopwords and stemmer
+        self._preprocess_cached = functools.lru_cache(maxsize=8192)(self._preprocess)
+        
+        if NUMBA_AVAILABLE:
+            bm25_numba.warm_up()
+        
         logger.info(f"Initialized BM25Search for {language} language")
     
+    def _set_stemmer(self, name: str):
+        """Use the named stemmer ('sastrawi' or 'porter')"""
+        self.stemmer = _create_stemmer(name)
+        self.stemmer_name = name
+        # Token frequencies are Zipfian, so most stem calls are repeats
+        self._stem = functools.lru_cache(maxsize=200_000)(self.stemmer.stem)
+    
+    def _load_stopwords(self, language: str) -> frozenset:
+        """Stopwords for the language; only non-Indonesian languages touch NLTK"""
+        if language == "indonesian":
+            return INDONESIAN_STOPWORDS
+        
+        self._download_nltk_data()
+        from nltk.corpus import stopwords
+        try:
+            return frozenset(stopwords.words(language))
+        except:
+            logger.warning(f"Stopwords for {language} not available, using English")
+            return frozenset(stopwords.words('english')) | INDONESIAN_STOPWORDS
+    
     def _download_nltk_data(self):
         """Download required NLTK data"""
-        try:
-            nltk.data.find('tokenizers/punkt')
-        except LookupError:
-            logger.info("Downloading NLTK punkt tokenizer...")
-            nltk.download('punkt', quiet=True)
-        
+        import nltk
         try:
             nltk.data.find('corpora/stopwords')
         except LookupError:
@@ -113,79 +327,140 @@ class BM25Search:
         """
         if not text:
             return []
-        
-        # Convert to lowercase
-        text = text.lower()
-        
-        # Remove non-alphanumeric characters but keep spaces
-        text = re.sub(r'[^a-zA-Z0-9\s]', ' ', text)
-        
-        # Tokenize
-        try:
-            tokens = word_tokenize(text)
-        except:
-            # Fallback to simple split if NLTK tokenizer fails
-            tokens = text.split()
-        
-        # Filter tokens
-        processed_tokens = []
-        for token in tokens:
-            # Skip short tokens
-            if len(token) < self.min_word_length:
-                continue
-            
-            # Skip stopwords
-            if self.remove_stopwords and token in self.stopwords:
-                continue
-            
-            # Apply stemming
-            if self.use_stemming:
-                token = self.stemmer.stem(token)
-            
-            processed_tokens.append(token)
-        
-        return processed_tokens
+        return list(self._preprocess_cached(text))
+    
+    def clear_preprocess_cache(self):
+        """Drop cached preprocessing results"""
+        self._preprocess_cached.cache_clear()
     
-    def add_documents(self, documents: List[Dict[str, Any]]):
+    def _preprocess(self, text: str) -> Tuple[str, ...]:
+        """Tokenize, filter and stem text; results are cached by preprocess_text"""
+        stopwords = self.stopwords if self._filter_enabled else frozenset()
+        return _tokenize(text, self.min_word_length, stopwords, self._stem if self.use_stemming else None)
+    
+    def add_documents(self, documents: List[Dict[str, Any]], n_jobs: int = None):
         """
         Add documents to BM25 index
         
         Args:
             documents: List of document dictionaries with 'content' field
+            n_jobs: Processes used to preprocess the documents (default: all
+                CPUs for large batches, otherwise 1)
         """
         if not documents:
             logger.warning("No documents to add")
             return
         
         logger.info(f"Adding {len(documents)} documents to BM25 index")
+        self.clear_preprocess_cache()
+        
+        # A loaded index keeps its documents in a read-only table
+        if not isinstance(self.documents, list):
+            self.documents = list(self.documents)
         
-        # Process documents
+        # Combine title and content for better matching
+        valid_docs = []
+        full_texts = []
         for doc in documents:
             content = doc.get('content', '')
             if not content:
                 logger.warning(f"Document {doc.get('id', 'unknown')} has no content")
                 continue
-            
-            # Combine title and content for better matching
-            title = doc.get('title', '')
-            full_text = f"{title} {content}".strip()
-            
-            # Preprocess text
-            tokens = self.preprocess_text(full_text)
-            
+            valid_docs.append(doc)
+            full_texts.append(f"{doc.get('title', '')} {content}".strip())
+        
+        # Preprocess text
+        if n_jobs is None:
+            n_jobs = (os.cpu_count() or 1) if len(full_texts) >= PARALLEL_PREPROCESS_MIN_DOCS else 1
+        if n_jobs > 1:
+            stopwords = self.stopwords if self._filter_enabled else frozenset()
+            stemmer_name = self.stemmer_name if self.use_stemming else None
+            # Spawned, not forked: Numba's TBB thread pool does not survive a fork
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_preprocess_worker,
+                                     initargs=(self.min_word_length, stopwords, stemmer_name)) as executor:
+                tokenized = list(executor.map(_preprocess_in_worker, full_texts, chunksize=64))
+        else:
+            tokenized = [self.preprocess_text(text) for text in full_texts]
+        
+        new_term_ids = []
+        for doc, tokens in zip(valid_docs, tokenized):
             if tokens:
                 self.documents.append(doc)
-                self.tokenized_docs.append(tokens)
+                new_term_ids.append(self._encode_tokens(tokens))
                 self.doc_ids.append(doc.get('id', f'doc_{len(self.documents)}'))
         
+        if new_term_ids:
+            new_lengths = np.fromiter((len(ids) for ids in new_term_ids), dtype=np.int64, count=len(new_term_ids))
+            self.token_ids = np.concatenate((self.token_ids, *new_term_ids))
+            self.token_indptr = np.concatenate((self.token_indptr, self.token_indptr[-1] + np.cumsum(new_lengths)))
+        
         # Build BM25 index
-        if self.tokenized_docs:
-            self.bm25 = BM25Okapi(self.tokenized_docs, k1=self.k1, b=self.b)
-            logger.info(f"Built BM25 index with {len(self.tokenized_docs)} documents")
+        if len(self.documents):
+            self._build_index()
+            logger.info(f"Built BM25 index with {len(self.documents)} documents")
         else:
             logger.error("No valid documents for BM25 indexing")
     
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def _build_index(self):
+        """
+        Build a sparse BM25 index with every (document, term) score precomputed
+        
+        Scoring a query then reduces to summing the matrix columns of its terms.
+        """
+        num_docs = len(self.token_indptr) - 1
+        doc_len = np.diff(self.token_indptr)
+        
+        # Duplicate (document, term) entries are summed into term frequencies
+        rows = np.repeat(np.arange(num_docs, dtype=np.int32), doc_len)
+        cols = self.token_ids
+        tf = sparse.csc_matrix(
+            (np.ones(len(cols), dtype=np.float64), (rows, cols)),
+            shape=(num_docs, len(self.terms))
+        )
+        tf.sum_duplicates()
+        
+        # K_d = k1 * (1 - b + b * |d| / avgdl), computed once per document
+        length_norm = self.k1 * (1 - self.b + self.b * doc_len / doc_len.mean())
+        
+        doc_freq = np.diff(tf.indptr)
+        idf = np.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        
+        # Column j of a CSC matrix holds the postings of term j. Each posting
+        # stores the whole term score idf * tf * (k1 + 1) / (tf + K_d), so a
+        # query does a single add per posting
+        term_idf = np.repeat(idf, doc_freq)
+        term_scores = term_idf * tf.data * (self.k1 + 1) / (tf.data + length_norm[tf.indices])
+        
+        # Postings as contiguous float32 scores / int32 doc ids: half the bytes per posting
+        tf.data = np.ascontiguousarray(term_scores, dtype=np.float32)
+        tf.indices = np.ascontiguousarray(tf.indices, dtype=np.int32)
+        tf.sort_indices()
+        
+        self.idf = idf
+        self.score_matrix = tf
+        self.max_score_per_term = self._compute_max_scores(tf)
+    
+    def _encode_tokens(self, tokens: List[str]) -> np.ndarray:
+        """Map tokens to int32 vocabulary ids, adding new terms to the vocabulary"""
+        vocab = self.vocab
+        terms = self.terms
+        ids = np.empty(len(tokens), dtype=np.int32)
+        for i, token in enumerate(tokens):
+            term_id = vocab.get(token)
+            if term_id is None:
+                term_id = vocab[token] = len(terms)
+                terms.append(token)
+            ids[i] = term_id
+        return ids
+    
+    @staticmethod
+    def _compute_max_scores(score_matrix) -> np.ndarray:
+        """Highest BM25 contribution of each term over all documents"""
+        # Every vocabulary term occurs in at least one document, so no column is empty
+        return np.maximum.reduceat(score_matrix.data, score_matrix.indptr[:-1])
+    
+    def search(self, query: str, top_k: int = 5) -> List[BM25Result]:
         """
         Search documents using BM25 keyword matching
         
@@ -194,9 +469,10 @@ class BM25Search:
             top_k: Number of top results to return
             
         Returns:
-            List of matching documents with BM25 scores
+            List of matching documents with BM25 scores; use
+            BM25Result.to_dict() for a standalone dict
         """
-        if self.bm25 is None or len(self.documents) == 0:
+        if self.score_matrix is None or len(self.documents) == 0:
             logger.warning("No documents in BM25 index")
             return []
         
@@ -206,91 +482,387 @@ class BM25Search:
             logger.warning("No valid tokens in query after preprocessing")
             return []
         
-        # Get BM25 scores
-        scores = self.bm25.get_scores(query_tokens)
+        # Repeated query terms count once per occurrence
+        term_ids = [self.vocab[token] for token in query_tokens if token in self.vocab]
+        if not term_ids:
+            return []
+        top_hits = self._maxscore_top_k(term_ids, min(top_k, len(self.documents)))
         
-        # Get top-k results
-        top_indices = np.argsort(scores)[::-1][:min(top_k, len(self.documents))]
+        return self._build_results(query_tokens, top_hits)
+    
+    def search_batch(self, queries: List[str], top_k: int = 5) -> List[List[BM25Result]]:
+        """
+        Search several queries at once
+        
+        All queries are scored with sparse products of a (queries x terms)
+        count matrix and the precomputed score matrix, so the per-query Python
+        overhead is paid once per block; row blocks run on n_threads threads.
+        
+        Args:
+            queries: Search query texts
+            top_k: Number of top results to return per query
+            
+        Returns:
+            One result list per query, in the same format as search
+        """
+        if self.score_matrix is None or len(self.documents) == 0:
+            logger.warning("No documents in BM25 index")
+            return [[] for _ in queries]
+        
+        query_tokens = [self.preprocess_text(query) for query in queries]
         
+        rows, cols = [], []
+        for row, tokens in enumerate(query_tokens):
+            for token in tokens:
+                term_id = self.vocab.get(token)
+                if term_id is not None:
+                    rows.append(row)
+                    cols.append(term_id)
+        
+        # Duplicate (query, term) entries are summed, so repeated terms count per occurrence
+        query_matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=self.score_matrix.dtype), (rows, cols)),
+            shape=(len(queries), len(self.vocab))
+        )
+        k = min(top_k, len(self.documents))
+        
+        # SciPy's sparse product releases the GIL, so row blocks score in parallel
+        n_blocks = max(1, min(self.n_threads, len(queries)))
+        bounds = np.linspace(0, len(queries), n_blocks + 1).astype(int)
+        blocks = [query_matrix[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+        if n_blocks == 1:
+            block_hits = [self._score_query_block(blocks[0], k)]
+        else:
+            with ThreadPoolExecutor(max_workers=n_blocks) as executor:
+                block_hits = list(executor.map(lambda block: self._score_query_block(block, k), blocks))
+        
+        top_hits = [hits for block in block_hits for hits in block]
+        return [self._build_results(tokens, hits) for tokens, hits in zip(query_tokens, top_hits)]
+    
+    def _score_query_block(self, query_matrix: sparse.csr_matrix, k: int) -> List[List[Tuple[float, int]]]:
+        """Score a block of query rows and return each row's top-k (score, document index) pairs"""
+        batch_scores = (query_matrix @ self.score_matrix.T).tocsr()
+        
+        top_hits = []
+        for row in range(batch_scores.shape[0]):
+            start, end = batch_scores.indptr[row], batch_scores.indptr[row + 1]
+            top_hits.append(self._select_top_k(batch_scores.data[start:end], batch_scores.indices[start:end], k))
+        
+        return top_hits
+    
+    def _build_results(self, query_tokens: List[str], top_hits: List[Tuple[float, int]]) -> List[BM25Result]:
+        """Turn (score, document index) pairs into results"""
+        matched = self._get_matched_tokens(query_tokens, [idx for _, idx in top_hits])
         results = []
-        for i, idx in enumerate(top_indices):
-            if scores[idx] <= 0:  # Skip documents with zero score
+        for i, (score, idx) in enumerate(top_hits):
+            if score <= 0:  # Skip documents with zero score
                 continue
-                
-            doc = self.documents[idx].copy()
-            doc['bm25_score'] = float(scores[idx])
-            doc['rank'] = i + 1
-            doc['search_method'] = 'bm25_keyword'
-            doc['matched_tokens'] = self._get_matched_tokens(query_tokens, self.tokenized_docs[idx])
             
-            results.append(doc)
+            doc = self.documents[idx]
+            results.append(BM25Result(
+                doc_id=self.doc_ids[idx],
+                title=doc.get('title', ''),
+                bm25_score=score,
+                rank=i + 1,
+                matched_tokens=matched[i],
+                document=doc
+            ))
         
         return results
     
-    def _get_matched_tokens(self, query_tokens: List[str], doc_tokens: List[str]) -> List[str]:
-        """Get tokens that matched between query and document"""
-        doc_token_set = set(doc_tokens)
-        matched = [token for token in query_tokens if token in doc_token_set]
-        return matched
+    def _maxscore_top_k(self, term_ids: List[int], top_k: int) -> List[Tuple[float, int]]:
+        """
+        Find the top-k documents with MaxScore pruning
+        
+        Terms are visited by decreasing upper bound. Once the k-th best score
+        reaches the summed bounds of the terms left, no unseen document can
+        enter the top-k, so the remaining (non-essential) terms are only looked
+        up for documents that are already candidates.
+        
+        Returns:
+            List of (score, document index) pairs, best first
+        """
+        terms, counts = np.unique(np.asarray(term_ids, dtype=np.int64), return_counts=True)
+        upper = self.max_score_per_term[terms] * counts
+        order = np.argsort(-upper, kind='stable')
+        terms, counts, upper = terms[order], counts[order], upper[order]
+        # remaining[j] bounds what terms j.. can still add to any document
+        remaining = np.append(np.cumsum(upper[::-1])[::-1], 0.0)
+        
+        indptr = self.score_matrix.indptr
+        indices = self.score_matrix.indices
+        data = self.score_matrix.data
+        
+        num_postings = int((indptr[terms + 1] - indptr[terms]).sum())
+        if num_postings < SPARSE_SCORING_MAX_FRACTION * self.score_matrix.shape[0]:
+            candidates, candidate_scores, essential, threshold = self._score_essential_sparse(
+                terms, counts, remaining, top_k)
+        else:
+            candidates, candidate_scores, essential, threshold = self._score_essential_dense(
+                terms, counts, remaining, top_k)
+        
+        for j in range(essential, len(terms)):
+            start, end = indptr[terms[j]], indptr[terms[j] + 1]
+            postings = indices[start:end]
+            # Postings are sorted by document id, so candidates are found by binary search
+            pos = np.minimum(np.searchsorted(postings, candidates), len(postings) - 1)
+            hit = postings[pos] == candidates
+            candidate_scores[hit] += data[start + pos[hit]] * counts[j]
+            
+            keep = candidate_scores + remaining[j + 1] >= threshold
+            candidates, candidate_scores = candidates[keep], candidate_scores[keep]
+        
+        return self._select_top_k(candidate_scores, candidates, top_k)
+    
+    def _score_essential_dense(self, terms: np.ndarray, counts: np.ndarray, remaining: np.ndarray,
+                               top_k: int) -> Tuple[np.ndarray, np.ndarray, int, float]:
+        """
+        Score the essential MaxScore terms into a dense vector over all documents
+        
+        Returns:
+            Tuple of (sorted candidate documents, their scores, number of
+            essential terms, k-th best score)
+        """
+        scores = np.zeros(self.score_matrix.shape[0], dtype=self.score_matrix.data.dtype)
+        threshold = 0.0
+        essential = 0
+        while essential < len(terms) and (essential == 0 or threshold <= remaining[essential]):
+            self._score_terms(np.repeat(terms[essential], counts[essential]), scores)
+            essential += 1
+            if top_k < len(scores):
+                threshold = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+        
+        candidates = np.nonzero((scores > 0) & (scores + remaining[essential] >= threshold))[0]
+        return candidates, scores[candidates], essential, threshold
+    
+    def _score_essential_sparse(self, terms: np.ndarray, counts: np.ndarray, remaining: np.ndarray,
+                                top_k: int) -> Tuple[np.ndarray, np.ndarray, int, float]:
+        """
+        Score the essential MaxScore terms over the documents they touch only
+        
+        Rare terms reach a small part of the corpus, so scores are merged over
+        the union of their postings instead of a vector as long as the corpus.
+        Same return value as _score_essential_dense.
+        """
+        indptr = self.score_matrix.indptr
+        indices = self.score_matrix.indices
+        data = self.score_matrix.data
+        
+        candidates = np.empty(0, dtype=indices.dtype)
+        candidate_scores = np.empty(0, dtype=data.dtype)
+        threshold = 0.0
+        essential = 0
+        while essential < len(terms) and (essential == 0 or threshold <= remaining[essential]):
+            start, end = indptr[terms[essential]], indptr[terms[essential] + 1]
+            doc_indices = np.concatenate((candidates, indices[start:end]))
+            contributions = np.concatenate((candidate_scores, data[start:end] * counts[essential]))
+            candidates, inverse = np.unique(doc_indices, return_inverse=True)
+            candidate_scores = np.bincount(inverse, weights=contributions).astype(data.dtype)
+            essential += 1
+            kth = len(candidate_scores) - top_k
+            if kth > 0:
+                threshold = np.partition(candidate_scores, kth)[kth]
+        
+        keep = candidate_scores + remaining[essential] >= threshold
+        return candidates[keep], candidate_scores[keep], essential, threshold
+    
+    @staticmethod
+    def _select_top_k(scores: np.ndarray, doc_indices: np.ndarray, k: int) -> List[Tuple[float, int]]:
+        """
+        Pick the k best (score, document index) pairs, best first
+        
+        A linear-time partition finds the k-th best score; everything above it
+        is kept and the remaining slots are filled from the documents tied at
+        it by descending document index, so the pick does not depend on the
+        order of the candidates. Winners are sorted the same way.
+        """
+        if len(scores) > k:
+            threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+            above = np.flatnonzero(scores > threshold)
+            ties = np.flatnonzero(scores == threshold)
+            ties = ties[np.argsort(-doc_indices[ties], kind='stable')][:k - len(above)]
+            top = np.concatenate((above, ties))
+            scores, doc_indices = scores[top], doc_indices[top]
+        order = np.lexsort((-doc_indices, -scores))
+        return list(zip(scores[order].tolist(), doc_indices[order].tolist()))
+    
+    def _score_terms(self, term_ids: List[int], scores: np.ndarray = None) -> np.ndarray:
+        """
+        Score every document for the given query term ids
+        
+        Walks each term's postings (one CSC column) and adds its precomputed
+        BM25 contributions into a dense score vector, a new one unless scores
+        is given.
+        """
+        indptr = self.score_matrix.indptr
+        indices = self.score_matrix.indices
+        data = self.score_matrix.data
+        
+        if scores is None:
+            scores = np.zeros(self.score_matrix.shape[0], dtype=data.dtype)
+        if NUMBA_AVAILABLE:
+            bm25_numba.score_query(np.asarray(term_ids, dtype=np.int64), data, indices, indptr, scores)
+            return scores
+        
+        for term_id in term_ids:
+            start, end = indptr[term_id], indptr[term_id + 1]
+            # Document ids are unique within a column, so a fancy-index add is safe
+            scores[indices[start:end]] += data[start:end]
+        return scores
+    
+    def _get_matched_tokens(self, query_tokens: List[str], doc_indices: List[int]) -> List[List[str]]:
+        """
+        Get the query tokens that occur in each of the given documents
+        
+        Membership is read from the sorted postings of each distinct query
+        term, one binary search for all documents at once, so no per-document
+        token set has to be built or kept.
+        """
+        docs = np.asarray(doc_indices, dtype=self.score_matrix.indices.dtype)
+        indptr = self.score_matrix.indptr
+        indices = self.score_matrix.indices
+        
+        present = {}
+        for token in set(query_tokens):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            postings = indices[indptr[term_id]:indptr[term_id + 1]]
+            pos = np.minimum(np.searchsorted(postings, docs), len(postings) - 1)
+            present[token] = (postings[pos] == docs).tolist()
+        
+        return [
+            [token for token in query_tokens if token in present and present[token][i]]
+            for i in range(len(docs))
+        ]
     
     def get_document_tokens(self, doc_index: int) -> List[str]:
         """Get processed tokens for a specific document"""
-        if 0 <= doc_index < len(self.tokenized_docs):
-            return self.tokenized_docs[doc_index]
+        if 0 <= doc_index < len(self.token_indptr) - 1:
+            start, end = self.token_indptr[doc_index], self.token_indptr[doc_index + 1]
+            return [self.terms[term_id] for term_id in self.token_ids[start:end].tolist()]
         return []
     
+    @staticmethod
+    def _index_files(index_path: str) -> Tuple[Dict[str, Path], Path, Path]:
+        """Array files, JSON sidecar and document table that make up a saved index"""
+        base = Path(index_path).with_suffix('')
+        arrays = {name: base.with_name(f"{base.name}_{name}.npy") for name in INDEX_ARRAYS}
+        return arrays, base.with_suffix('.json'), base.with_suffix('.feather')
+    
+    @classmethod
+    def index_files(cls, index_path: str) -> List[Path]:
+        """All files written by save_index for index_path"""
+        arrays, meta_path, documents_path = cls._index_files(index_path)
+        return [*arrays.values(), meta_path, documents_path]
+    
     def save_index(self, index_path: str):
-        """Save BM25 index to disk"""
+        """
+        Save BM25 index to disk
+        
+        Postings, idf and token ids go to one .npy file each, memory-mapped
+        on load, the vocabulary, document ids and settings to a .json sidecar,
+        and the documents to an Arrow table read back lazily.
+        """
+        if self.score_matrix is None:
+            logger.warning("No BM25 index to save")
+            return
+        
         try:
-            index_data = {
-                'bm25': self.bm25,
-                'documents': self.documents,
-                'tokenized_docs': self.tokenized_docs,
-                'doc_ids': self.doc_ids,
+            array_paths, meta_path, documents_path = self._index_files(index_path)
+            arrays = {
+                'score_data': self.score_matrix.data,
+                'score_indices': self.score_matrix.indices,
+                'score_indptr': self.score_matrix.indptr,
+                'idf': self.idf,
+                'max_score_per_term': self.max_score_per_term,
+                'token_ids': self.token_ids,
+                'token_indptr': self.token_indptr
+            }
+            
+            # Written aside and renamed into place, so an index memory-mapped
+            # from the old files keeps reading them
+            for name, path in array_paths.items():
+                tmp_path = path.with_suffix('.tmp')
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, arrays[name], allow_pickle=False)
+                os.replace(tmp_path, path)
+            
+            metadata = {
                 'config': {
                     'language': self.language,
                     'use_stemming': self.use_stemming,
                     'remove_stopwords': self.remove_stopwords,
                     'min_word_length': self.min_word_length,
+                    'stemmer': self.stemmer_name,
                     'k1': self.k1,
                     'b': self.b
-                }
+                },
+                'vocab': self.terms,
+                'doc_ids': self.doc_ids
             }
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, ensure_ascii=False)
             
-            with open(index_path, 'wb') as f:
-                pickle.dump(index_data, f)
+            write_documents(str(documents_path), self.documents)
             
-            logger.info(f"Saved BM25 index to {index_path}")
+            logger.info(f"Saved BM25 index to {meta_path.with_suffix('')}")
         except Exception as e:
             logger.error(f"Error saving BM25 index: {e}")
     
     def load_index(self, index_path: str):
         """Load BM25 index from disk"""
         try:
-            with open(index_path, 'rb') as f:
-                index_data = pickle.load(f)
+            array_paths, meta_path, documents_path = self._index_files(index_path)
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
             
-            self.bm25 = index_data['bm25']
-            self.documents = index_data['documents']
-            self.tokenized_docs = index_data['tokenized_docs']
-            self.doc_ids = index_data['doc_ids']
+            self._apply_config(metadata.get('config', {}))
+            self.terms = metadata['vocab']
+            self.vocab = {term: term_id for term_id, term in enumerate(self.terms)}
+            self.doc_ids = metadata['doc_ids']
+            self.documents, _ = read_documents(str(documents_path))
             
-            # Load configuration
-            config = index_data.get('config', {})
-            self.language = config.get('language', self.language)
-            self.use_stemming = config.get('use_stemming', self.use_stemming)
-            self.remove_stopwords = config.get('remove_stopwords', self.remove_stopwords)
-            self.min_word_length = config.get('min_word_length', self.min_word_length)
-            self.k1 = config.get('k1', self.k1)
-            self.b = config.get('b', self.b)
+            # Plain arrays only, so nothing is unpickled; pages are read as queries touch them
+            arrays = {
+                name: np.load(path, mmap_mode='r', allow_pickle=False)
+                for name, path in array_paths.items()
+            }
+            self.score_matrix = sparse.csc_matrix(
+                (arrays['score_data'], arrays['score_indices'], arrays['score_indptr']),
+                shape=(len(self.documents), len(self.terms))
+            )
+            self.idf = arrays['idf']
+            self.max_score_per_term = arrays['max_score_per_term']
+            self.token_ids = arrays['token_ids']
+            self.token_indptr = arrays['token_indptr']
             
-            logger.info(f"Loaded BM25 index from {index_path} with {len(self.documents)} documents")
+            logger.info(f"Loaded BM25 index from {meta_path.with_suffix('')} with {len(self.documents)} documents")
         except Exception as e:
             logger.error(f"Error loading BM25 index: {e}")
     
+    def _apply_config(self, config: Dict[str, Any]):
+        """Restore settings saved with an index"""
+        self.language = config.get('language', self.language)
+        self.use_stemming = config.get('use_stemming', self.use_stemming)
+        self.remove_stopwords = config.get('remove_stopwords', self.remove_stopwords)
+        self.min_word_length = config.get('min_word_length', self.min_word_length)
+        self.k1 = config.get('k1', self.k1)
+        self.b = config.get('b', self.b)
+        
+        # Queries must be stemmed like the saved documents; older indexes used Porter
+        stemmer_name = config.get('stemmer', 'porter') if self.use_stemming else None
+        if stemmer_name != self.stemmer_name and stemmer_name is not None:
+            if stemmer_name == 'sastrawi' and not SASTRAWI_AVAILABLE:
+                logger.warning("Index was stemmed with Sastrawi, which is not installed")
+            else:
+                self._set_stemmer(stemmer_name)
+        self._filter_enabled = self.remove_stopwords and bool(self.stopwords)
+        self.clear_preprocess_cache()
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about the BM25 index"""
-        avg_doc_length = np.mean([len(doc) for doc in self.tokenized_docs]) if self.tokenized_docs else 0
+        avg_doc_length = np.diff(self.token_indptr).mean() if len(self.token_indptr) > 1 else 0
         
         return {
             'total_documents': len(self.documents),
@@ -300,7 +872,7 @@ class BM25Search:
             'min_word_length': self.min_word_length,
             'avg_document_length': float(avg_doc_length),
             'bm25_params': {'k1': self.k1, 'b': self.b},
-            'vocabulary_size': len(set([token for doc in self.tokenized_docs for token in doc])) if self.tokenized_docs else 0
+            'vocabulary_size': len(self.terms)
         }
 
 
@@ -347,7 +919,7 @@ def main():
         results = bm25_search.search(query, top_k=3)
         
         for result in results:
-            print(f"- {result['title']}: BM25={result['bm25_score']:.3f}, Matched={result['matched_tokens']}")
+            print(f"- {result.title}: BM25={result.bm25_score:.3f}, Matched={result.matched_tokens}")
     
     # Print stats
     print("\nBM25 Index Stats:")
@@ -14,7 +14,7 @@ from pathlib import Path
 # Add the current directory to Python path
 sys.path.append(str(Path(__file__).parent))
 
-from api_retriever import EnhancedRAGRetriever
+from api_retriever import EnhancedRAGRetriever, load_api_key
 
 def build_indexes():
     """Build RAG indexes manually"""
@@ -28,16 +28,10 @@ def build_indexes():
         data_folder_path = current_dir / 'data'
         
         # Load environment variables
-        gemini_api_key = None
-        if env_file.exists():
-            with open(env_file, 'r') as f:
-                for line in f:
-                    if line.startswith('GOOGLE_API_KEY='):
-                        gemini_api_key = line.split('=', 1)[1].strip()
-                        break
+        gemini_api_key = load_api_key(env_file)
         
         if not gemini_api_key:
-            print("❌ Error: GOOGLE_API_KEY not found in .env.local")
+            print("❌ Error: GOOGLE_API_KEY not found in the environment or .env.local")
             return False
         
         # Check if data folder exists
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Document Loader for RAG System
+Parsing file data JSON yang ringan sehingga aman dijalankan di worker process
+"""
+
+import mmap
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Tuple
+
+import orjson
+
+
+def read_json_file(json_file: Path):
+    """Parse a JSON data file with orjson directly from a read-only memory map"""
+    with open(json_file, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                return orjson.loads(view)
+
+
+def is_valid_document(doc: dict) -> bool:
+    """Check if a document has required content"""
+    if not isinstance(doc, dict):
+        return False
+    
+    # Must have either content or title
+    has_content = bool(doc.get('content', '').strip())
+    has_title = bool(doc.get('title', '').strip())
+    
+    return has_content or has_title
+
+
+def parse_data_file(json_file: Path) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Load the valid documents from one data file
+    
+    Args:
+        json_file: Path to a JSON data file
+        
+    Returns:
+        Tuple of (documents tagged with data_source, load time in seconds)
+    """
+    file_start = time.time()
+    file_data = read_json_file(json_file)
+    
+    # Handle different JSON structures
+    if isinstance(file_data, list):
+        items = file_data
+    elif isinstance(file_data, dict):
+        if 'papers' in file_data:
+            items = file_data['papers']
+        elif 'documents' in file_data:
+            items = file_data['documents']
+        else:
+            items = [file_data]  # Single document
+    else:
+        items = []
+    
+    file_docs = []
+    for item in items:
+        if is_valid_document(item):
+            item['data_source'] = json_file.stem
+            file_docs.append(item)
+    
+    return file_docs, time.time() - file_start
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Columnar Document Store for RAG System
+Menyimpan metadata dokumen sebagai file Arrow yang di-memory-map sehingga index dimuat tanpa unpickle
+"""
+
+import json
+import os
+from collections.abc import Sequence
+from typing import List, Dict, Any, Tuple
+
+import orjson
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Fields read on every result get their own string columns; the rest is kept as JSON
+STRING_COLUMNS = ('id', 'title', 'content', 'data_source', 'reference')
+DICTIONARY_COLUMNS = ('data_source',)
+EXTRA_COLUMN = '_extra'
+CONFIG_KEY = b'config'
+
+
+class DocumentTable(Sequence):
+    """
+    Read-only document list backed by an Arrow table
+    Rows are only turned into dicts when they are accessed, e.g. for top-k results
+    """
+
+    def __init__(self, table: pa.Table):
+        self.table = table.combine_chunks()
+        self._columns = [(name, self.table.column(name)) for name in self.table.column_names]
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("document index out of range")
+
+        doc = {}
+        extra = None
+        for name, column in self._columns:
+            value = column[idx].as_py()
+            if value is None:
+                continue
+            if name == EXTRA_COLUMN:
+                extra = value
+            else:
+                doc[name] = value
+
+        if extra:
+            doc.update(orjson.loads(extra))
+        return doc
+
+    def filter(self, mask: Sequence[bool]) -> 'DocumentTable':
+        """Table with only the rows where mask is true"""
+        return DocumentTable(self.table.filter(pa.array(mask, type=pa.bool_())))
+
+    def take(self, indices: Sequence[int]) -> List[Dict[str, Any]]:
+        """Materialize several rows with one gather over the columns"""
+        docs = []
+        for row in self.table.take(pa.array(indices, type=pa.int64())).to_pylist():
+            extra = row.pop(EXTRA_COLUMN, None)
+            doc = {name: value for name, value in row.items() if value is not None}
+            if extra:
+                doc.update(orjson.loads(extra))
+            docs.append(doc)
+        return docs
+
+
+def documents_to_table(documents: List[Dict[str, Any]], config: Dict[str, Any] = None,
+                       exclude: Tuple[str, ...] = ('embedding',)) -> pa.Table:
+    """
+    Convert document dicts to an Arrow table
+
+    Args:
+        documents: Documents to store
+        config: JSON-serializable settings stored in the schema metadata
+        exclude: Fields that are not stored (embeddings already live in the index)
+
+    Returns:
+        Arrow table with one row per document
+    """
+    columns = {name: [] for name in STRING_COLUMNS}
+    extras = []
+
+    for doc in documents:
+        rest = {}
+        for name in STRING_COLUMNS:
+            value = doc.get(name)
+            if isinstance(value, str):
+                columns[name].append(value)
+            else:
+                columns[name].append(None)
+                if value is not None:
+                    rest[name] = value
+
+        for key, value in doc.items():
+            if key not in columns and key not in exclude:
+                rest[key] = value
+
+        extras.append(orjson.dumps(rest, option=orjson.OPT_SERIALIZE_NUMPY, default=str) if rest else None)
+
+    arrays = {}
+    for name, values in columns.items():
+        array = pa.array(values, type=pa.string())
+        arrays[name] = array.dictionary_encode() if name in DICTIONARY_COLUMNS else array
+    arrays[EXTRA_COLUMN] = pa.array(extras, type=pa.binary())
+
+    table = pa.table(arrays)
+    return table.replace_schema_metadata({CONFIG_KEY: json.dumps(config or {})})
+
+
+def append_documents(documents: Sequence[Dict[str, Any]], new_documents: List[Dict[str, Any]]) -> DocumentTable:
+    """
+    Return a document table holding documents followed by new_documents
+
+    Existing DocumentTables are concatenated column-wise without turning rows into dicts.
+    """
+    if not isinstance(documents, DocumentTable):
+        return DocumentTable(documents_to_table(list(documents) + list(new_documents)))
+
+    tables = [documents.table, documents_to_table(new_documents)]
+    return DocumentTable(pa.concat_tables([table.replace_schema_metadata(None) for table in tables]))
+
+
+def write_documents(path: str, documents: Sequence[Dict[str, Any]], config: Dict[str, Any] = None):
+    """
+    Write documents and their index settings to an Arrow (Feather V2) file
+
+    The file is left uncompressed so readers can map it without copying and
+    processes reading the same file share its pages. It is written next to
+    the target and renamed over it, so readers that still map the old file
+    keep a consistent copy.
+    """
+    if isinstance(documents, DocumentTable):
+        table = documents.table.replace_schema_metadata({CONFIG_KEY: json.dumps(config or {})})
+    else:
+        table = documents_to_table(documents, config)
+    tmp_path = f"{path}.tmp"
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+
+def read_documents(path: str) -> Tuple[DocumentTable, Dict[str, Any]]:
+    """
+    Read documents written by write_documents
+
+    Returns:
+        Tuple of (lazy document table, config stored with it)
+    """
+    # Buffers point into the mapping, which stays open as long as the table is alive
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    metadata = table.schema.metadata or {}
+    config = json.loads(metadata.get(CONFIG_KEY, b'{}'))
+    return DocumentTable(table), config
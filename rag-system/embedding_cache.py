@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Embedding Cache for RAG System
+Menyimpan embedding per hash (model, teks) di SQLite sebagai float16 sehingga teks yang sama tidak di-encode ulang
+"""
+
+import base64
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters in one statement
+MAX_KEYS_PER_QUERY = 500
+
+
+def embedding_key(namespace: str, text: str) -> bytes:
+    """Hash of the model namespace and text identifying one embedding"""
+    data = f"{namespace}\0{text}".encode('utf-8')
+    if BLAKE3_AVAILABLE:
+        return blake3.blake3(data).digest()
+    return hashlib.sha256(data).digest()
+
+
+def encode_embedding(embedding: Sequence[float]) -> str:
+    """Pack an embedding as base64 float16 bytes for JSON data files (about 8x smaller than a float list)"""
+    return base64.b64encode(np.asarray(embedding, dtype='<f2').tobytes()).decode('ascii')
+
+
+def decode_embedding(value: Union[str, Sequence[float]]) -> np.ndarray:
+    """Unpack an embedding stored by encode_embedding; plain float lists from older files are accepted too"""
+    if isinstance(value, str):
+        return np.frombuffer(base64.b64decode(value), dtype='<f2').astype(np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+class EmbeddingCache:
+    """
+    Persistent key-value store of embeddings keyed by content hash
+    Vectors are stored as float16 and returned as float32
+    """
+
+    def __init__(self, path: str, namespace: str):
+        """
+        Open (or create) the cache database
+
+        Args:
+            path: SQLite file holding the cache
+            namespace: Embedding model identifier mixed into every key
+        """
+        self.path = Path(path)
+        self.namespace = namespace
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                vector BLOB NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    def _keys(self, texts: Sequence[str], task: str) -> List[bytes]:
+        namespace = f"{self.namespace}:{task}"
+        return [embedding_key(namespace, text) for text in texts]
+
+    def get_many(self, texts: Sequence[str], task: str = 'document') -> List[Optional[np.ndarray]]:
+        """
+        Look up cached embeddings
+
+        Returns:
+            One float32 vector per text, or None where the text is not cached
+        """
+        keys = self._keys(texts, task)
+        found = {}
+        try:
+            with self._lock:
+                for start in range(0, len(keys), MAX_KEYS_PER_QUERY):
+                    chunk = keys[start:start + MAX_KEYS_PER_QUERY]
+                    placeholders = ','.join('?' * len(chunk))
+                    rows = self.conn.execute(
+                        f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', chunk
+                    )
+                    found.update(rows)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache lookup failed: {e}")
+            return [None] * len(keys)
+
+        return [
+            np.frombuffer(found[key], dtype=np.float16).astype(np.float32) if key in found else None
+            for key in keys
+        ]
+
+    def put_many(self, texts: Sequence[str], embeddings: np.ndarray, task: str = 'document'):
+        """Store embeddings for texts, skipping rows that are all zeros (failed encodings)"""
+        rows = [
+            (key, np.asarray(embedding, dtype=np.float16).tobytes())
+            for key, embedding in zip(self._keys(texts, task), embeddings)
+            if np.any(embedding)
+        ]
+        if not rows:
+            return
+
+        try:
+            with self._lock:
+                self.conn.executemany('INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)', rows)
+                self.conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self.conn.close()
@@ -6,19 +6,77 @@ Provides high-performance vector similarity search using FAISS
 
 import os
 import json
-import pickle
+import asyncio
+import hashlib
 import logging
 import numpy as np
+from dataclasses import dataclass
 from typing import List, Dict, Any, Tuple, Optional
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import faiss
 from sentence_transformers import SentenceTransformer
 import google.generativeai as genai
 
+from document_store import append_documents, read_documents, write_documents
+from embedding_cache import EmbeddingCache, decode_embedding
+from gemini_embedding import GEMINI_MAX_BATCH_SIZE, embed_batch as gemini_embed_batch
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Default location for exported ONNX sentence-transformer models
+DEFAULT_MODEL_CACHE_DIR = Path(__file__).parent / 'data' / 'models'
+QUANTIZED_ONNX_FILE = 'onnx/model_qint8_avx512_vnni.onnx'
+DEFAULT_EMBEDDING_CACHE_PATH = Path(__file__).parent / 'data' / 'embedding_cache.sqlite'
+
+# "auto" index selection: exact SQ8 search below this corpus size, HNSW above
+AUTO_INDEX_THRESHOLD = 50_000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVFPQ_M = 16
+IVFPQ_NBITS = 8
+IVF_NPROBE = 16
+MAX_TRAINING_VECTORS = 100_000
+IVF_INDEX_TYPES = ("IVF", "IVFSQ", "IVFPQ", "OPQ_IVFPQ")
+# index_factory codes for Flat/IVF/HNSW vector storage below float32
+STORAGE_CODES = {"fp16": "SQfp16", "int8": "SQ8"}
+# k-means needs ~39 points per centroid; the floor covers PQ codebooks (39 * 256 codes)
+IVF_TRAINING_POINTS_PER_CENTROID = 39
+MIN_IVF_TRAINING_VECTORS = 10_000
+
+# Gemini embedding requests in flight
+GEMINI_MAX_CONCURRENT_REQUESTS = 8
+# Sentence-transformer batches in flight on a GPU: the next one is tokenized during the current forward pass
+GPU_ENCODE_PIPELINE_DEPTH = 2
+
+
+def _cpu_supports_avx512_vnni() -> bool:
+    """Check whether the CPU exposes AVX512-VNNI int8 dot-product instructions"""
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            return 'avx512_vnni' in f.read()
+    except OSError:
+        return False
+
+
+@dataclass(slots=True)
+class VectorHit:
+    """A vector search hit that references its document by position instead of copying it"""
+    doc_index: int
+    doc_id: Any
+    similarity_score: float
+    rank: int
+
+
+def _faiss_id(doc_id: Any, salt: int = 0) -> int:
+    """Stable non-negative int64 id for a document id (FAISS reserves -1)"""
+    digest = hashlib.blake2b(f"{doc_id}\0{salt}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') & 0x7FFF_FFFF_FFFF_FFFF
+
+
 class FaissVectorDB:
     """
     High-performance vector database using FAISS for similarity search
@@ -29,113 +87,345 @@ class FaissVectorDB:
                  dimension: int = 768,
                  index_type: str = "IVF",
                  nlist: int = 100,
+                 nprobe: int = None,
                  use_gpu: bool = False,
+                 use_cuvs: bool = False,
                  embedding_model: str = "sentence-transformers",
                  sentence_transformer_model: str = "all-MiniLM-L6-v2",
-                 gemini_api_key: str = None):
+                 gemini_api_key: str = None,
+                 use_onnx: bool = True,
+                 model_cache_dir: str = None,
+                 pq_m: int = IVFPQ_M,
+                 pq_nbits: int = IVFPQ_NBITS,
+                 ef_construction: int = HNSW_EF_CONSTRUCTION,
+                 ef_search: int = HNSW_EF_SEARCH,
+                 storage_dtype: str = "fp32",
+                 use_embedding_cache: bool = True,
+                 embedding_cache_path: str = None,
+                 max_concurrent_searches: int = None,
+                 auto_index_threshold: int = AUTO_INDEX_THRESHOLD):
         """
         Initialize FAISS Vector Database
         
         Args:
             dimension: Vector dimension (768 for sentence-transformers, 768 for Gemini)
-            index_type: FAISS index type ('Flat', 'IVF', 'HNSW')
+            index_type: FAISS index type ('Flat', 'SQ8', 'IVF', 'IVFSQ', 'IVFPQ', 'OPQ_IVFPQ', 'HNSW',
+                'HNSW_SQ', 'CAGRA', or 'auto' to pick SQ8/HNSW from the corpus size)
             nlist: Number of clusters for IVF index
+            nprobe: IVF clusters scanned per query (default 10 for IVF, 16 for the other IVF types)
             use_gpu: Whether to use GPU acceleration
+            use_cuvs: Build IVF/CAGRA indexes directly on the GPU with NVIDIA cuVS
+                (needs the conda rapidsai::faiss-gpu build)
             embedding_model: 'sentence-transformers' or 'gemini'
             sentence_transformer_model: Model name for sentence transformers
             gemini_api_key: API key for Gemini embedding model
+            use_onnx: Run sentence transformers on ONNX Runtime (int8 on AVX512-VNNI CPUs)
+            model_cache_dir: Directory for exported ONNX models
+            pq_m: Sub-quantizers per vector for (OPQ_)IVFPQ (must divide the dimension)
+            pq_nbits: Bits per sub-quantizer code for (OPQ_)IVFPQ
+            ef_construction: HNSW candidate list size while building the graph
+            ef_search: HNSW candidate list size per query (higher = better recall, slower)
+            storage_dtype: Vector storage of Flat/IVF/HNSW indexes ('fp32', 'fp16' or 'int8');
+                vectors are still passed as float32 and quantized inside the index
+            use_embedding_cache: Reuse embeddings of previously encoded texts across runs
+            embedding_cache_path: SQLite file for the embedding cache
+            max_concurrent_searches: Expected number of searches running at once; FAISS is then
+                limited to cpu_count // max_concurrent_searches OpenMP threads (process-wide)
+            auto_index_threshold: Corpus size at which an 'auto' index switches from exact SQ8
+                search to HNSW; later additions that cross it rebuild the index as HNSW
         """
         self.dimension = dimension
         self.index_type = index_type
+        self.auto_index = index_type == "auto"
+        self.auto_index_threshold = auto_index_threshold
         self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_nbits = pq_nbits
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        if storage_dtype != "fp32" and storage_dtype not in STORAGE_CODES:
+            raise ValueError("storage_dtype must be 'fp32', 'fp16' or 'int8'")
+        self.storage_dtype = storage_dtype
         self.use_gpu = use_gpu
+        self.use_cuvs = use_cuvs
+        self.gpu_resources = None
         self.embedding_model = embedding_model
+        self.sentence_transformer_model = sentence_transformer_model
+        self.use_onnx = use_onnx
+        self.model_cache_dir = Path(model_cache_dir) if model_cache_dir else DEFAULT_MODEL_CACHE_DIR
         
         # Initialize embedding model
         if embedding_model == "sentence-transformers":
-            self.st_model = SentenceTransformer(sentence_transformer_model)
+            self.st_model = self._load_sentence_transformer(sentence_transformer_model)
             self.dimension = self.st_model.get_sentence_embedding_dimension()
+            # int8, fp32 ONNX and PyTorch embeddings differ slightly, so each backend has its own entries
+            cache_namespace = f"{embedding_model}:{sentence_transformer_model}:{self.embedding_backend}"
         elif embedding_model == "gemini":
             if not gemini_api_key:
                 raise ValueError("Gemini API key required for Gemini embedding model")
             genai.configure(api_key=gemini_api_key)
             self.gemini_embedding_model = "models/text-embedding-004"
+            self.embedding_backend = "api"
             self.dimension = 768  # Gemini embedding dimension
+            cache_namespace = f"{embedding_model}:{self.gemini_embedding_model}"
         else:
             raise ValueError("embedding_model must be 'sentence-transformers' or 'gemini'")
         
+        self.embedding_cache = None
+        if use_embedding_cache:
+            cache_path = embedding_cache_path or DEFAULT_EMBEDDING_CACHE_PATH
+            try:
+                self.embedding_cache = EmbeddingCache(cache_path, cache_namespace)
+            except Exception as e:
+                logger.warning(f"Embedding cache unavailable ({e}), embeddings will not be cached")
+        
         # Initialize FAISS index
         self.index = None
         self.documents = []
         self.doc_ids = []
         self.is_trained = False
+        self._mmap_index_path = None  # Set while the index is a read-only memory map
+        
+        # FAISS id of each document row; indexes built without external ids use row positions
+        self.external_ids = True
+        self.faiss_ids = np.empty(0, dtype=np.int64)
+        self._id_order = None  # argsort of faiss_ids, rebuilt lazily after changes
+        
+        # Queries waiting to be searched together, per event loop (see asearch)
+        self._pending_queries = {}
+        if max_concurrent_searches:
+            faiss.omp_set_num_threads(max(1, (os.cpu_count() or 1) // max_concurrent_searches))
         
         logger.info(f"Initialized FaissVectorDB with dimension={self.dimension}, model={embedding_model}")
     
-    def _create_index(self) -> faiss.Index:
-        """Create FAISS index based on configuration"""
-        if self.index_type == "Flat":
+    def _load_sentence_transformer(self, model_name: str) -> SentenceTransformer:
+        """
+        Load the sentence transformer, preferring a cached ONNX export.
+        
+        The model is exported once to model_cache_dir. On CPUs with AVX512-VNNI
+        a dynamically quantized int8 model is used; otherwise the FP32 ONNX model.
+        Falls back to the PyTorch backend if ONNX Runtime/optimum are unavailable.
+        Sets embedding_backend to 'onnx-int8', 'onnx-fp32' or 'torch'.
+        """
+        self.embedding_backend = "torch"
+        if not self.use_onnx:
+            return SentenceTransformer(model_name)
+        
+        try:
+            onnx_dir = self.model_cache_dir / f"{model_name.replace('/', '_')}-onnx"
+            
+            if not onnx_dir.exists():
+                logger.info(f"Exporting {model_name} to ONNX at {onnx_dir}...")
+                model = SentenceTransformer(model_name, backend="onnx")
+                model.save(str(onnx_dir))
+                
+                if _cpu_supports_avx512_vnni():
+                    from sentence_transformers import export_dynamic_quantized_onnx_model
+                    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+                    
+                    quantization_config = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+                    export_dynamic_quantized_onnx_model(
+                        model, quantization_config, str(onnx_dir), file_suffix="qint8_avx512_vnni"
+                    )
+            
+            if _cpu_supports_avx512_vnni() and (onnx_dir / QUANTIZED_ONNX_FILE).exists():
+                logger.info("Using int8 quantized ONNX sentence transformer")
+                model = SentenceTransformer(
+                    str(onnx_dir), backend="onnx", model_kwargs={"file_name": QUANTIZED_ONNX_FILE}
+                )
+                self.embedding_backend = "onnx-int8"
+                return model
+            
+            logger.info("Using FP32 ONNX sentence transformer")
+            model = SentenceTransformer(str(onnx_dir), backend="onnx")
+            self.embedding_backend = "onnx-fp32"
+            return model
+        except Exception as e:
+            logger.warning(f"ONNX backend unavailable ({e}), using PyTorch sentence transformer")
+            return SentenceTransformer(model_name)
+    
+    def _create_index(self, num_vectors: int = 0) -> faiss.Index:
+        """Create FAISS index based on configuration and corpus size"""
+        if self.index_type == "auto":
+            self.index_type = "SQ8" if num_vectors < self.auto_index_threshold else "HNSW"
+            logger.info(f"Selected {self.index_type} index for {num_vectors} vectors")
+        
+        if self.use_gpu and self.use_cuvs and faiss.get_num_gpus() > 0 and self.index_type in ("IVF", "CAGRA"):
+            return self._create_cuvs_index()
+        
+        storage_code = STORAGE_CODES.get(self.storage_dtype)
+        
+        if self.index_type == "CAGRA":
+            raise ValueError("CAGRA index requires use_gpu=True, use_cuvs=True and a cuVS-enabled FAISS GPU build")
+        elif storage_code and self.index_type in ("Flat", "IVF", "HNSW"):
+            # Same structure with scalar-quantized vectors: 2x (fp16) or 4x (int8) fewer bytes scanned
+            description = {
+                "Flat": storage_code,
+                "IVF": f"IVF{self.nlist},{storage_code}",
+                "HNSW": f"HNSW{HNSW_M},{storage_code}",
+            }[self.index_type]
+            index = faiss.index_factory(self.dimension, description, faiss.METRIC_INNER_PRODUCT)
+            if self.index_type == "HNSW":
+                index.hnsw.efConstruction = self.ef_construction
+        elif self.index_type == "Flat":
             index = faiss.IndexFlatIP(self.dimension)  # Inner Product (cosine similarity)
+        elif self.index_type == "SQ8":
+            # Exact search over int8 scalar-quantized vectors: 4x smaller than Flat,
+            # per-dimension scale/offset are learned in train() and stored in the index
+            index = faiss.IndexScalarQuantizer(
+                self.dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            )
         elif self.index_type == "IVF":
             quantizer = faiss.IndexFlatIP(self.dimension)
             index = faiss.IndexIVFFlat(quantizer, self.dimension, self.nlist)
+        elif self.index_type == "IVFSQ":
+            # IVF over fp16 vectors: half the memory of IVF-Flat, distances use fp16 SIMD kernels
+            quantizer = faiss.IndexFlatIP(self.dimension)
+            index = faiss.IndexIVFScalarQuantizer(quantizer, self.dimension, self.nlist,
+                                                  faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+        elif self.index_type in ("IVFPQ", "OPQ_IVFPQ"):
+            # Compressed IVF for large corpora: nlist ~ 4*sqrt(N), pq_m*pq_nbits/8 bytes per vector.
+            # OPQ learns a rotation that balances variance across the PQ sub-vectors; it is
+            # trained together with the codebooks and applied inside the encoder
+            if self.dimension % self.pq_m:
+                raise ValueError(f"pq_m={self.pq_m} must divide the dimension {self.dimension}")
+            self.nlist = max(1, int(4 * np.sqrt(max(num_vectors, 1))))
+            description = f"IVF{self.nlist},PQ{self.pq_m}x{self.pq_nbits}"
+            if self.index_type == "OPQ_IVFPQ":
+                description = f"OPQ{self.pq_m},{description}"
+            index = faiss.index_factory(self.dimension, description, faiss.METRIC_INNER_PRODUCT)
         elif self.index_type == "HNSW":
-            index = faiss.IndexHNSWFlat(self.dimension, 32)  # 32 connections per node
+            index = faiss.IndexHNSWFlat(self.dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = self.ef_construction
+        elif self.index_type == "HNSW_SQ":
+            # Same graph over fp16 vectors: half the bytes fetched per hop
+            index = faiss.index_factory(self.dimension, f"HNSW{HNSW_M},SQfp16", faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = self.ef_construction
         else:
             raise ValueError(f"Unsupported index type: {self.index_type}")
         
+        # IVF indexes store external ids in their inverted lists; the others get an id map
+        self.external_ids = True
+        if self.index_type not in IVF_INDEX_TYPES:
+            index = faiss.IndexIDMap2(index)
+        
         if self.use_gpu and faiss.get_num_gpus() > 0:
-            res = faiss.StandardGpuResources()
-            index = faiss.index_cpu_to_gpu(res, 0, index)
+            self.gpu_resources = faiss.StandardGpuResources()
+            index = faiss.index_cpu_to_gpu(self.gpu_resources, 0, index)
             logger.info("Using GPU acceleration for FAISS")
         
         return index
     
+    def _create_cuvs_index(self) -> faiss.Index:
+        """Create a GPU index backed by NVIDIA cuVS (CAGRA graph or IVF-Flat)"""
+        self.gpu_resources = faiss.StandardGpuResources()
+        
+        if self.index_type == "CAGRA":
+            config = faiss.GpuIndexCagraConfig()
+            config.device = 0
+            index = faiss.GpuIndexCagra(self.gpu_resources, self.dimension, faiss.METRIC_INNER_PRODUCT, config)
+        else:
+            config = faiss.GpuIndexIVFFlatConfig()
+            config.device = 0
+            config.use_cuvs = True
+            index = faiss.GpuIndexIVFFlat(self.gpu_resources, self.dimension, self.nlist,
+                                          faiss.METRIC_INNER_PRODUCT, config)
+        
+        # CAGRA builds its graph in train() and numbers vectors by position
+        self.external_ids = self.index_type != "CAGRA"
+        logger.info(f"Using cuVS {self.index_type} index on GPU")
+        return index
+    
     def create_embedding(self, text: str) -> np.ndarray:
         """Create embedding for text using configured embedding model"""
-        try:
-            if self.embedding_model == "sentence-transformers":
-                embedding = self.st_model.encode(text, convert_to_numpy=True)
-                # Normalize for cosine similarity
-                embedding = embedding / np.linalg.norm(embedding)
-                return embedding
-            
-            elif self.embedding_model == "gemini":
-                # Limit text length for Gemini API
-                text_truncated = text[:8000] if len(text) > 8000 else text
-                result = genai.embed_content(
-                    model=self.gemini_embedding_model,
-                    content=text_truncated,
-                    task_type="retrieval_document"
-                )
-                embedding = np.array(result['embedding'], dtype=np.float32)
-                # Normalize for cosine similarity
-                embedding = embedding / np.linalg.norm(embedding)
-                return embedding
-        except Exception as e:
-            logger.error(f"Error creating embedding: {e}")
-            return np.zeros(self.dimension, dtype=np.float32)
+        return self._embed([text], "document")[0]
     
     def create_query_embedding(self, query: str) -> np.ndarray:
         """Create embedding for query text"""
+        return self._embed([query], "query")[0]
+    
+    def _embed(self, texts: List[str], task: str, batch_size: int = None) -> np.ndarray:
+        """
+        Create normalized embeddings, encoding only texts missing from the embedding cache
+        
+        Args:
+            texts: Texts to embed
+            task: 'document' or 'query'
+            batch_size: Number of texts encoded per model call (all at once if None)
+            
+        Returns:
+            Array of shape (len(texts), dimension); rows that failed are zeros
+        """
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        cached = self.embedding_cache.get_many(texts, task) if self.embedding_cache else [None] * len(texts)
+        
+        misses = []
+        for pos, embedding in enumerate(cached):
+            if embedding is None:
+                misses.append(pos)
+            else:
+                embeddings[pos] = embedding
+        
+        if len(misses) < len(texts):
+            logger.debug(f"Embedding cache hits: {len(texts) - len(misses)}/{len(texts)}")
+        
+        # Sorting by length keeps texts of similar size together so little of each batch is padding
+        misses.sort(key=lambda pos: len(texts[pos]))
+        batch_size = batch_size or max(len(misses), 1)
+        if self.embedding_model == "gemini":
+            batch_size = min(batch_size, GEMINI_MAX_BATCH_SIZE)
+        batches = [misses[i:i + batch_size] for i in range(0, len(misses), batch_size)]
+        batch_texts = [[texts[pos] for pos in positions] for positions in batches]
+        
+        if self.embedding_model == "gemini":
+            workers = GEMINI_MAX_CONCURRENT_REQUESTS  # Requests are network-bound
+        elif str(getattr(self.st_model, 'device', 'cpu')).startswith('cuda'):
+            workers = GPU_ENCODE_PIPELINE_DEPTH
+        else:
+            workers = 1  # On CPU the forward pass already uses every core
+        
+        if workers > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                batch_embeddings = list(executor.map(lambda t: self._encode_batch(t, task), batch_texts))
+        else:
+            batch_embeddings = [self._encode_batch(t, task) for t in batch_texts]
+        
+        for positions, texts_in_batch, encoded in zip(batches, batch_texts, batch_embeddings):
+            embeddings[positions] = encoded
+            if self.embedding_cache:
+                self.embedding_cache.put_many(texts_in_batch, encoded, task)
+        
+        return embeddings
+    
+    def _encode_batch(self, texts: List[str], task: str = "document") -> np.ndarray:
+        """
+        Create normalized embeddings for several texts in one model call
+        
+        Rows whose embedding could not be created are left as zeros.
+        """
         try:
             if self.embedding_model == "sentence-transformers":
-                embedding = self.st_model.encode(query, convert_to_numpy=True)
-                embedding = embedding / np.linalg.norm(embedding)
-                return embedding
+                embeddings = self.st_model.encode(
+                    texts,
+                    batch_size=len(texts),
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False
+                )
+                return np.asarray(embeddings, dtype=np.float32)
             
             elif self.embedding_model == "gemini":
-                result = genai.embed_content(
-                    model=self.gemini_embedding_model,
-                    content=query,
-                    task_type="retrieval_query"
-                )
-                embedding = np.array(result['embedding'], dtype=np.float32)
-                embedding = embedding / np.linalg.norm(embedding)
-                return embedding
+                embeddings = gemini_embed_batch(self.gemini_embedding_model, texts, f"retrieval_{task}")
+                # Gemini already returns unit-norm vectors; skip normalization
+                if logger.isEnabledFor(logging.DEBUG):
+                    norms = np.linalg.norm(embeddings, axis=1)
+                    if not np.allclose(norms, 1.0, atol=1e-3):
+                        logger.warning(f"Gemini returned embeddings with norms {norms.min():.4f}..{norms.max():.4f}")
+                return embeddings
         except Exception as e:
-            logger.error(f"Error creating query embedding: {e}")
-            return np.zeros(self.dimension, dtype=np.float32)
+            logger.error(f"Error creating embeddings: {e}")
+        return np.zeros((len(texts), self.dimension), dtype=np.float32)
     
     def add_documents(self, documents: List[Dict[str, Any]], batch_size: int = 32):
         """
@@ -143,7 +433,7 @@ class FaissVectorDB:
         
         Args:
             documents: List of document dictionaries with 'content' field
-            batch_size: Batch size for embedding creation
+            batch_size: Number of texts encoded per model call
         """
         if not documents:
             logger.warning("No documents to add")
@@ -151,66 +441,193 @@ class FaissVectorDB:
         
         logger.info(f"Adding {len(documents)} documents to vector database")
         
-        # Create index if not exists
-        if self.index is None:
-            self.index = self._create_index()
-        
-        embeddings = []
         valid_docs = []
+        precomputed = []  # Positions of documents that bring their own embedding
         
-        # Process documents in batches for efficiency
-        for i in range(0, len(documents), batch_size):
-            batch = documents[i:i + batch_size]
-            batch_embeddings = []
-            
-            for doc in batch:
-                content = doc.get('content', '')
-                if not content:
-                    logger.warning(f"Document {doc.get('id', 'unknown')} has no content")
-                    continue
-                
-                # Use existing embedding if available, otherwise create new one
-                if 'embedding' in doc and doc['embedding']:
-                    embedding = np.array(doc['embedding'], dtype=np.float32)
-                    # Ensure embedding is normalized
-                    if np.linalg.norm(embedding) > 0:
-                        embedding = embedding / np.linalg.norm(embedding)
-                    else:
-                        embedding = self.create_embedding(content)
-                else:
-                    embedding = self.create_embedding(content)
-                
-                if embedding is not None and np.any(embedding):
-                    batch_embeddings.append(embedding)
-                    valid_docs.append(doc)
+        for doc in documents:
+            content = doc.get('content', '')
+            if not content:
+                logger.warning(f"Document {doc.get('id', 'unknown')} has no content")
+                continue
             
-            embeddings.extend(batch_embeddings)
-            logger.info(f"Processed batch {i//batch_size + 1}/{(len(documents)-1)//batch_size + 1}")
+            if 'embedding' in doc and doc['embedding']:
+                precomputed.append(len(valid_docs))
+            valid_docs.append(doc)
+        
+        # Every vector is written straight into one preallocated array
+        embeddings_array = np.empty((len(valid_docs), self.dimension), dtype=np.float32)
+        valid_mask = np.zeros(len(valid_docs), dtype=bool)
+        
+        # Normalize existing embeddings in one pass; zero vectors are encoded below instead
+        if precomputed:
+            given = np.stack([decode_embedding(valid_docs[pos]['embedding']) for pos in precomputed])
+            faiss.normalize_L2(given)
+            embeddings_array[precomputed] = given
+            valid_mask[precomputed] = np.any(given, axis=1)
+        
+        # Encode the remaining contents, reusing cached embeddings of texts seen before
+        pending = np.flatnonzero(~valid_mask)
+        if len(pending):
+            contents = [valid_docs[pos]['content'] for pos in pending]
+            embeddings_array[pending] = self._embed(contents, "document", batch_size)
+            valid_mask[pending] = np.any(embeddings_array[pending], axis=1)
+            logger.info(f"Created embeddings for {len(pending)} documents")
+        
+        # Drop documents whose embedding could not be created
+        if not valid_mask.all():
+            valid_docs = [doc for doc, is_valid in zip(valid_docs, valid_mask) if is_valid]
+            embeddings_array = embeddings_array[valid_mask]
         
-        if not embeddings:
+        if not valid_docs:
             logger.error("No valid embeddings created")
             return
         
-        # Convert to numpy array
-        embeddings_array = np.array(embeddings, dtype=np.float32)
+        # Create index if not exists, sized for the first batch of vectors
+        if self.index is None:
+            self.index = self._create_index(len(embeddings_array))
+            self._apply_search_params()
+        
+        self._ensure_writable()
         
-        # Train index if needed (for IVF)
-        if self.index_type == "IVF" and not self.is_trained:
-            logger.info("Training IVF index...")
+        if self.index_type == "CAGRA":
+            # CAGRA builds its graph from the whole dataset in train() and cannot be extended
+            if self.index.ntotal:
+                raise ValueError("CAGRA index cannot be extended; rebuild it with all documents")
+            logger.info(f"Building CAGRA graph over {len(embeddings_array)} vectors...")
             self.index.train(embeddings_array)
             self.is_trained = True
+        elif not self.index.is_trained:
+            # Train index if needed (IVF centroids, PQ codebooks, SQ8 quantizer ranges)
+            self._train_index(embeddings_array)
+        
+        # Documents without an id fall back to their title, as in the hybrid merge
+        offset = len(self.doc_ids)
+        new_doc_ids = [doc.get('id', doc.get('title', f'doc_{offset + i}')) for i, doc in enumerate(valid_docs)]
         
         # Add vectors to index
-        self.index.add(embeddings_array)
+        if self.external_ids:
+            new_faiss_ids = self._new_faiss_ids(new_doc_ids)
+            self.index.add_with_ids(embeddings_array, new_faiss_ids)
+        else:
+            new_faiss_ids = np.arange(offset, offset + len(valid_docs), dtype=np.int64)
+            if self.index_type != "CAGRA":
+                self.index.add(embeddings_array)
+        
+        # Store documents and IDs; documents live in an Arrow table and become dicts only when retrieved
+        self.documents = append_documents(self.documents, valid_docs)
+        self.doc_ids.extend(new_doc_ids)
+        self.faiss_ids = np.concatenate([self.faiss_ids, new_faiss_ids])
+        self._id_order = None
         
-        # Store documents and IDs
-        self.documents.extend(valid_docs)
-        self.doc_ids.extend([doc.get('id', f'doc_{i}') for i, doc in enumerate(valid_docs)])
+        if self.auto_index and self.index_type == "SQ8" and self.index.ntotal >= self.auto_index_threshold:
+            self._promote_to_hnsw()
         
         logger.info(f"Successfully added {len(valid_docs)} documents to FAISS index")
         logger.info(f"Total documents in index: {len(self.documents)}")
     
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def _promote_to_hnsw(self):
+        """
+        Rebuild an 'auto' SQ8 index as HNSW once the corpus outgrows exact search
+        
+        The vectors are decoded from the SQ8 codes instead of re-embedding the
+        corpus; the int8 rounding error is far below HNSW's own approximation.
+        HNSW trades a few percent of recall for a large cut in query latency.
+        """
+        logger.info(f"Corpus reached {self.index.ntotal} vectors, rebuilding SQ8 index as HNSW")
+        vectors = self.index.reconstruct_batch(self.faiss_ids)
+        self.index_type = "HNSW"
+        self.index = self._create_index(len(vectors))
+        if not self.index.is_trained:
+            self._train_index(vectors)  # Quantized HNSW storage learns its ranges first
+        self.index.add_with_ids(vectors, self.faiss_ids)
+        self._apply_search_params()
+    
+    def _ensure_writable(self):
+        """A memory-mapped index is read-only; load a private copy before modifying it"""
+        if self._mmap_index_path:
+            self.index = faiss.read_index(self._mmap_index_path)
+            self._mmap_index_path = None
+            self._apply_search_params()
+    
+    def _new_faiss_ids(self, doc_ids: List[Any]) -> np.ndarray:
+        """Hash document ids to FAISS ids, re-salting the rare ones that are already taken"""
+        ids = np.array([_faiss_id(doc_id) for doc_id in doc_ids], dtype=np.int64)
+        taken = set(self.faiss_ids.tolist()) if len(self.faiss_ids) else set()
+        for i, doc_id in enumerate(doc_ids):
+            salt = 0
+            while int(ids[i]) in taken:
+                salt += 1
+                ids[i] = _faiss_id(doc_id, salt)
+            taken.add(int(ids[i]))
+        return ids
+    
+    def _rows_for_ids(self, ids: np.ndarray) -> np.ndarray:
+        """Document rows of FAISS ids returned by a search"""
+        if not self.external_ids:
+            return ids
+        if self._id_order is None:
+            self._id_order = np.argsort(self.faiss_ids, kind='stable')
+        sorted_ids = self.faiss_ids[self._id_order]
+        return self._id_order[np.searchsorted(sorted_ids, ids)]
+    
+    def remove_documents(self, doc_ids: List[Any]) -> int:
+        """
+        Remove documents and their vectors from the index
+        
+        Args:
+            doc_ids: Ids of the documents to remove
+            
+        Returns:
+            Number of documents removed
+        """
+        if self.index is None or not len(self.doc_ids):
+            return 0
+        if not self.external_ids:
+            raise ValueError("Index was built without external ids; rebuild it to remove documents")
+        
+        targets = set(doc_ids)
+        remove = np.fromiter((doc_id in targets for doc_id in self.doc_ids), dtype=bool, count=len(self.doc_ids))
+        if not remove.any():
+            return 0
+        
+        self._ensure_writable()
+        try:
+            self.index.remove_ids(self.faiss_ids[remove])
+        except RuntimeError as e:
+            raise ValueError(f"{self.index_type} index does not support removing vectors") from e
+        
+        keep = ~remove
+        self.documents = self.documents.filter(keep)
+        self.doc_ids = [doc_id for doc_id, kept in zip(self.doc_ids, keep) if kept]
+        self.faiss_ids = self.faiss_ids[keep]
+        self._id_order = None
+        
+        removed = int(remove.sum())
+        logger.info(f"Removed {removed} documents from FAISS index")
+        return removed
+    
+    def _train_index(self, embeddings_array: np.ndarray):
+        """Train the index on a random subsample, running IVF k-means on a GPU when one is available"""
+        if self.index_type in IVF_INDEX_TYPES:
+            max_training_vectors = max(IVF_TRAINING_POINTS_PER_CENTROID * self.nlist, MIN_IVF_TRAINING_VECTORS)
+        else:
+            max_training_vectors = MAX_TRAINING_VECTORS
+        
+        training_vectors = embeddings_array
+        if len(training_vectors) > max_training_vectors:
+            sample = np.random.default_rng(0).choice(len(training_vectors), max_training_vectors, replace=False)
+            training_vectors = training_vectors[sample]
+        
+        if self.index_type in IVF_INDEX_TYPES and not self.use_gpu and faiss.get_num_gpus() > 0:
+            # Only the clustering runs on the GPU; the trained index stays on the CPU
+            index_ivf = faiss.extract_index_ivf(self.index)
+            index_ivf.clustering_index = faiss.index_cpu_to_all_gpus(faiss.IndexFlatL2(self.dimension))
+        
+        logger.info(f"Training {self.index_type} index on {len(training_vectors)} vectors...")
+        self.index.train(training_vectors)
+        self.is_trained = True
+    
+    def search(self, query: str, top_k: int = 5) -> List[VectorHit]:
         """
         Search for similar documents using FAISS
         
@@ -219,97 +636,229 @@ class FaissVectorDB:
             top_k: Number of top results to return
             
         Returns:
-            List of similar documents with similarity scores
+            List of hits ordered by similarity; see get_documents for their documents
+        """
+        return self.search_batch([query], top_k)[0]
+    
+    def search_batch(self, queries: List[str], top_k: int = 5) -> List[List[VectorHit]]:
+        """
+        Search for several queries with one embedding call and one FAISS search
+        
+        Args:
+            queries: Search query texts
+            top_k: Number of top results to return per query
+            
+        Returns:
+            One list of hits per query, in query order
         """
         if self.index is None or len(self.documents) == 0:
             logger.warning("No documents in vector database")
-            return []
+            return [[] for _ in queries]
         
-        # Create query embedding
-        query_embedding = self.create_query_embedding(query)
-        if query_embedding is None or not np.any(query_embedding):
-            logger.error("Failed to create query embedding")
-            return []
+        # Create query embeddings
+        query_vectors = self._embed(list(queries), "query")
+        valid = np.any(query_vectors, axis=1)
+        if not valid.all():
+            logger.error(f"Failed to create {np.count_nonzero(~valid)} query embedding(s)")
         
-        # Search using FAISS
-        query_vector = query_embedding.reshape(1, -1).astype(np.float32)
+        return self.search_by_vectors(query_vectors, top_k)
+    
+    def search_by_vectors(self, query_vectors: np.ndarray, top_k: int = 5) -> List[List[VectorHit]]:
+        """
+        Search with precomputed, normalized query embeddings
         
-        # Set search parameters for IVF
-        if self.index_type == "IVF":
-            self.index.nprobe = min(10, self.nlist)  # Search 10 clusters
+        Args:
+            query_vectors: Array of shape (num_queries, dimension); all-zero rows get no hits
+            top_k: Number of top results to return per query
+            
+        Returns:
+            One list of hits per query vector, in order
+        """
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32).reshape(-1, self.dimension)
+        results = [[] for _ in range(len(query_vectors))]
+        if self.index is None or len(self.documents) == 0:
+            logger.warning("No documents in vector database")
+            return results
         
         # Perform search
-        scores, indices = self.index.search(query_vector, min(top_k, len(self.documents)))
+        valid = np.any(query_vectors, axis=1)
+        if not valid.any():
+            return results
+        scores, indices = self.index.search(query_vectors[valid], min(top_k, len(self.documents)))
         
-        # Prepare results
-        results = []
-        for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-            if idx == -1:  # FAISS returns -1 for invalid indices
-                continue
-                
-            doc = self.documents[idx].copy()
-            doc['similarity_score'] = float(score)
-            doc['rank'] = i + 1
-            doc['search_method'] = 'faiss_vector'
-            
-            results.append(doc)
+        # FAISS returns -1 for missing neighbours
+        found = indices != -1
+        rows = np.full_like(indices, -1)
+        rows[found] = self._rows_for_ids(indices[found])
+        
+        for row, query_pos in enumerate(np.flatnonzero(valid)):
+            results[query_pos] = [
+                VectorHit(idx, self.doc_ids[idx], score, rank)
+                for rank, (idx, score) in enumerate(
+                    zip(rows[row][found[row]].tolist(), scores[row][found[row]].tolist()), start=1)
+            ]
         
         return results
     
+    async def asearch(self, query: str, top_k: int = 5) -> List[VectorHit]:
+        """
+        Search without blocking the event loop
+        
+        Queries submitted in the same event loop iteration are coalesced into
+        one search_batch call that runs in a worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending_queries.setdefault(loop, [])
+        pending.append((query, top_k, future))
+        if len(pending) == 1:
+            loop.call_soon(self._flush_pending_queries, loop)
+        return await future
+    
+    def _flush_pending_queries(self, loop: asyncio.AbstractEventLoop):
+        """Start one batched search for the queries collected by asearch"""
+        batch = self._pending_queries.pop(loop, [])
+        if batch:
+            loop.create_task(self._search_pending(batch))
+    
+    async def _search_pending(self, batch: List[Tuple[str, int, asyncio.Future]]):
+        queries = [query for query, _, _ in batch]
+        try:
+            results = await asyncio.to_thread(self.search_batch, queries, max(k for _, k, _ in batch))
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, top_k, future), hits in zip(batch, results):
+            if not future.done():
+                future.set_result(hits[:top_k])
+    
+    def set_search_params(self, nprobe: int = None, ef_search: int = None):
+        """Change the IVF nprobe and/or HNSW efSearch used by later searches"""
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+        self._apply_search_params()
+    
+    def _apply_search_params(self):
+        """Set search parameters on the index once, instead of on every query"""
+        if self.index is None:
+            return
+        if self.index_type in IVF_INDEX_TYPES:
+            default_nprobe = 10 if self.index_type == "IVF" else IVF_NPROBE
+            # OPQ wraps the IVF index in a pre-transform; GPU IVF indexes are not extractable
+            index_ivf = faiss.try_extract_index_ivf(self.index) or self.index
+            index_ivf.nprobe = min(self.nprobe or default_nprobe, self.nlist)
+        elif self.index_type in ("HNSW", "HNSW_SQ"):
+            self._base_index().hnsw.efSearch = self.ef_search
+    
+    def _base_index(self) -> faiss.Index:
+        """The index holding the vectors, unwrapped from its id map"""
+        if isinstance(self.index, faiss.IndexIDMap):
+            return faiss.downcast_index(self.index.index)
+        return self.index
+    
+    def get_documents(self, hits: List[VectorHit]) -> List[Dict[str, Any]]:
+        """Documents of the hits with their similarity fields, fetched in one gather"""
+        docs = self.documents.take([hit.doc_index for hit in hits]) if hits else []
+        for doc, hit in zip(docs, hits):
+            doc['similarity_score'] = hit.similarity_score
+            doc['rank'] = hit.rank
+            doc['search_method'] = 'faiss_vector'
+        return docs
+    
     def save_index(self, index_path: str, metadata_path: str):
         """Save FAISS index and metadata to disk"""
         try:
-            # Save FAISS index
+            # Save FAISS index; renaming a finished file over the old one never
+            # changes pages under processes that have the old index mapped
+            tmp_index_path = f"{index_path}.tmp"
             if self.use_gpu:
                 # Convert GPU index to CPU before saving
                 cpu_index = faiss.index_gpu_to_cpu(self.index)
-                faiss.write_index(cpu_index, index_path)
+                faiss.write_index(cpu_index, tmp_index_path)
             else:
-                faiss.write_index(self.index, index_path)
+                faiss.write_index(self.index, tmp_index_path)
+            os.replace(tmp_index_path, index_path)
             
-            # Save metadata
+            # Save documents as an Arrow table with the index settings in its metadata
             metadata = {
-                'documents': self.documents,
                 'doc_ids': self.doc_ids,
                 'dimension': self.dimension,
                 'index_type': self.index_type,
+                'auto_index': self.auto_index,
                 'nlist': self.nlist,
+                'nprobe': self.nprobe,
+                'pq_m': self.pq_m,
+                'pq_nbits': self.pq_nbits,
+                'ef_search': self.ef_search,
                 'is_trained': self.is_trained,
-                'embedding_model': self.embedding_model
+                'embedding_model': self.embedding_model,
+                'external_ids': self.external_ids,
+                'faiss_ids': self.faiss_ids.tolist()
             }
-            
-            with open(metadata_path, 'wb') as f:
-                pickle.dump(metadata, f)
+            write_documents(metadata_path, self.documents, metadata)
             
             logger.info(f"Saved FAISS index to {index_path} and metadata to {metadata_path}")
         except Exception as e:
             logger.error(f"Error saving index: {e}")
     
-    def load_index(self, index_path: str, metadata_path: str):
-        """Load FAISS index and metadata from disk"""
+    def load_index(self, index_path: str, metadata_path: str, use_mmap: bool = True):
+        """
+        Load FAISS index and metadata from disk
+        
+        With use_mmap the index and document table are memory-mapped read-only,
+        so several worker processes serving the same files share one copy in the
+        page cache. save_index replaces the files by renaming, so running workers
+        keep serving their mapped copy until they reload.
+        """
         try:
             # Load FAISS index
-            self.index = faiss.read_index(index_path)
-            
             if self.use_gpu and faiss.get_num_gpus() > 0:
-                res = faiss.StandardGpuResources()
-                self.index = faiss.index_cpu_to_gpu(res, 0, self.index)
-            
-            # Load metadata
-            with open(metadata_path, 'rb') as f:
-                metadata = pickle.load(f)
+                self.index = faiss.read_index(index_path)
+                self.gpu_resources = faiss.StandardGpuResources()
+                self.index = faiss.index_cpu_to_gpu(self.gpu_resources, 0, self.index)
+            elif use_mmap:
+                self.index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                self._mmap_index_path = index_path
+            else:
+                self.index = faiss.read_index(index_path)
             
-            self.documents = metadata['documents']
+            # Load metadata; document rows are materialized only when retrieved
+            self.documents, metadata = read_documents(metadata_path)
             self.doc_ids = metadata['doc_ids']
             self.dimension = metadata['dimension']
             self.index_type = metadata['index_type']
+            self.auto_index = metadata.get('auto_index', False)
             self.nlist = metadata['nlist']
+            self.nprobe = metadata.get('nprobe', self.nprobe)
+            self.pq_m = metadata.get('pq_m', self.pq_m)
+            self.pq_nbits = metadata.get('pq_nbits', self.pq_nbits)
+            self.ef_search = metadata.get('ef_search', self.ef_search)
             self.is_trained = metadata['is_trained']
+            # Indexes saved before external ids were introduced are numbered by row
+            self.external_ids = metadata.get('external_ids', False)
+            self.faiss_ids = np.array(metadata.get('faiss_ids', range(len(self.doc_ids))), dtype=np.int64)
+            self._id_order = None
+            self._apply_search_params()
             
             logger.info(f"Loaded FAISS index from {index_path} with {len(self.documents)} documents")
         except Exception as e:
             logger.error(f"Error loading index: {e}")
     
+    def _bytes_per_vector(self) -> int:
+        """Storage size of one encoded vector in the index"""
+        index = self._base_index()
+        if hasattr(index, 'hnsw'):
+            index = faiss.downcast_index(index.storage)  # HNSW keeps its vectors in a storage index
+        try:
+            return index.sa_code_size()
+        except RuntimeError:
+            return self.dimension * 4  # float32 storage
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about the vector database"""
         return {
@@ -319,7 +868,9 @@ class FaissVectorDB:
             'is_trained': self.is_trained,
             'embedding_model': self.embedding_model,
             'use_gpu': self.use_gpu and faiss.get_num_gpus() > 0,
-            'index_size_bytes': self.index.ntotal * self.dimension * 4 if self.index else 0  # 4 bytes per float32
+            'storage_dtype': self.storage_dtype,
+            'code_size': self._bytes_per_vector() if self.index else 0,
+            'index_size_bytes': self.index.ntotal * self._bytes_per_vector() if self.index else 0
         }
 
 
@@ -351,7 +902,7 @@ def main():
     vdb.add_documents(sample_docs)
     
     # Test search
-    results = vdb.search("penyakit gula darah tinggi", top_k=2)
+    results = vdb.get_documents(vdb.search("penyakit gula darah tinggi", top_k=2))
     
     print("Search Results:")
     for result in results:
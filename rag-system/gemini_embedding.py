@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Gemini Embedding Requests for RAG System
+Memanggil embed_content Gemini per batch dengan backoff saat terkena rate limit
+"""
+
+import logging
+import time
+from typing import List
+
+import numpy as np
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+# Texts per embed_content call (API limit) and retries of rate-limited (429) requests
+GEMINI_MAX_BATCH_SIZE = 100
+GEMINI_MAX_RETRIES = 5
+# Longer texts are cut to this many characters before embedding
+GEMINI_MAX_TEXT_LENGTH = 8000
+
+
+def embed_batch(model: str, texts: List[str], task_type: str) -> np.ndarray:
+    """
+    Embed up to GEMINI_MAX_BATCH_SIZE texts in one request, backing off when rate limited
+
+    Args:
+        model: Gemini embedding model name
+        texts: Texts to embed
+        task_type: Gemini task type, e.g. 'retrieval_document'
+
+    Returns:
+        float32 array with one embedding per text
+    """
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        try:
+            result = genai.embed_content(
+                model=model,
+                content=[text[:GEMINI_MAX_TEXT_LENGTH] for text in texts],
+                task_type=task_type
+            )
+            return np.array(result['embedding'], dtype=np.float32)
+        except google_exceptions.ResourceExhausted:
+            if attempt == GEMINI_MAX_RETRIES:
+                raise
+            delay = 2 ** attempt
+            logger.warning(f"Gemini embedding rate limited, retrying in {delay}s")
+            time.sleep(delay)
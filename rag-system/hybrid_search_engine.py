@@ -8,20 +8,57 @@ import os
 import json
 import logging
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import functools
+import re
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from typing import List, Dict, Any, Tuple, Optional
 from pathlib import Path
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
 
 # Import our custom modules
-from faiss_vector_db import FaissVectorDB
-from bm25_search import BM25Search
+from faiss_vector_db import AUTO_INDEX_THRESHOLD, FaissVectorDB, VectorHit
+from bm25_search import BM25Search, BM25Result
+from score_fusion import fuse_topk, warm_up as warm_up_fusion
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Most recent per-query timings kept for the performance statistics
+STATS_WINDOW = 1024
+
+# Longest wait for the vector leg of a parallel search before continuing with keyword hits only
+VECTOR_SEARCH_TIMEOUT_SECONDS = 30
+
+# Distinct queries whose embedding and adaptive classification are kept in memory
+QUERY_CACHE_SIZE = 1024
+
+MEDICAL_QUERY_TERMS = ('penyakit', 'gejala', 'diagnosis', 'pengobatan', 'terapi')
+# One pass over the query for all terms; substring matches, so 'penyakitnya' counts too
+MEDICAL_TERMS_PATTERN = re.compile('|'.join(map(re.escape, MEDICAL_QUERY_TERMS)))
+
+def _normalize_query(query: str) -> str:
+    """Cache key and classification text of a query; the embedded text keeps its case"""
+    return query.strip().lower()
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _classify_query(query: str) -> Tuple[bool, bool, bool]:
+    """(has_medical_terms, is_short_query, has_exact_phrases) of a normalized query"""
+    has_medical_terms = MEDICAL_TERMS_PATTERN.search(query) is not None
+    is_short_query = len(query.split()) <= 3
+    has_exact_phrases = '"' in query
+    return has_medical_terms, is_short_query, has_exact_phrases
+
+def _min_max_normalize(scores: np.ndarray) -> np.ndarray:
+    """Scale scores to [0, 1]; all zeros when no score is positive or all are equal"""
+    vmin, vmax = scores.min(), scores.max()
+    if vmax <= 0 or vmax == vmin:
+        return np.zeros_like(scores)
+    return (scores - vmin) / (vmax - vmin)
+
 class HybridSearchEngine:
     """
     Hybrid search engine combining vector similarity and keyword search
@@ -38,7 +75,11 @@ class HybridSearchEngine:
                  final_top_k: int = 10,
                  rerank_method: str = "weighted_sum",
                  embedding_model: str = "sentence-transformers",
-                 gemini_api_key: str = None):
+                 gemini_api_key: str = None,
+                 vector_index_type: str = "auto",
+                 hnsw_promote_threshold: int = AUTO_INDEX_THRESHOLD,
+                 embedding_cache_path: str = None,
+                 vector_storage_dtype: str = "fp32"):
         """
         Initialize Hybrid Search Engine
         
@@ -53,6 +94,14 @@ class HybridSearchEngine:
             rerank_method: Method for combining scores ('weighted_sum', 'rrf', 'adaptive')
             embedding_model: Model for vector embeddings
             gemini_api_key: API key for Gemini embeddings
+            vector_index_type: FAISS index type; 'auto' uses exact SQ8 search for small
+                corpora and HNSW (lower latency, slightly lower recall) for large ones
+            hnsw_promote_threshold: Corpus size at which an 'auto' vector index becomes HNSW
+            embedding_cache_path: SQLite file persisting document and query embeddings across
+                runs (FaissVectorDB's default location if None)
+            vector_storage_dtype: Vector storage of Flat/IVF/HNSW indexes ('fp32', 'fp16' or 'int8');
+                'int8' moves 4x fewer bytes per distance for roughly 1-3% lower recall. The
+                small-corpus 'auto' index is int8 (SQ8) regardless
         """
         self.vector_weight = vector_weight
         self.keyword_weight = keyword_weight
@@ -67,7 +116,10 @@ class HybridSearchEngine:
         self.vector_db = FaissVectorDB(
             embedding_model=embedding_model,
             gemini_api_key=gemini_api_key,
-            index_type="Flat"  # Use Flat for small datasets
+            index_type=vector_index_type,
+            auto_index_threshold=hnsw_promote_threshold,
+            embedding_cache_path=embedding_cache_path,
+            storage_dtype=vector_storage_dtype
         )
         
         self.bm25_search = BM25Search(
@@ -76,14 +128,24 @@ class HybridSearchEngine:
             remove_stopwords=True
         )
         
-        # Performance tracking
-        self.search_stats = {
-            'total_searches': 0,
-            'avg_vector_time': 0.0,
-            'avg_keyword_time': 0.0,
-            'avg_rerank_time': 0.0,
-            'avg_total_time': 0.0
-        }
+        # Performance tracking: raw timings of the last STATS_WINDOW searches per stage
+        self.total_searches = 0
+        self._timings = {stage: deque(maxlen=STATS_WINDOW) for stage in ('vector', 'keyword', 'rerank', 'total')}
+        
+        # LRU of recent query embeddings, keyed by normalized query text; misses fall
+        # through to the vector DB's persistent (content-hashed SQLite) embedding cache
+        self._query_embeddings = OrderedDict()
+        self._query_embeddings_lock = threading.Lock()  # Vector searches run on pool threads
+        self._query_cache_hits = 0
+        self._query_cache_misses = 0
+        
+        # Long-lived worker threads for the vector search leg of parallel searches
+        self._executor = None
+        if use_parallel_search:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hybrid")
+        
+        # JIT-compile the score fusion kernel outside the request path
+        warm_up_fusion()
         
         logger.info(f"Initialized HybridSearchEngine with {rerank_method} re-ranking")
     
@@ -130,90 +192,206 @@ class HybridSearchEngine:
         
         start_time = time.time()
         
+        # Gemini embeddings are case-sensitive, so only the cache key and the
+        # re-ranking's query classification use the normalized query
+        stripped_query = query.strip()
+        
         # Perform searches
-        if self.use_parallel_search:
-            vector_results, keyword_results = self._parallel_search(query)
+        if self.use_parallel_search and self._executor is not None:
+            vector_results, keyword_results = self._parallel_search(stripped_query)
         else:
-            vector_results, keyword_results = self._sequential_search(query)
+            vector_results, keyword_results = self._sequential_search(stripped_query)
         
         # Re-rank and combine results
         rerank_start = time.time()
-        final_results = self._rerank_results(query, vector_results, keyword_results, top_k)
+        final_results = self._rerank_results(_normalize_query(query), vector_results, keyword_results, top_k)
         rerank_time = time.time() - rerank_start
         
         # Update performance statistics
         total_time = time.time() - start_time
         self._update_stats(total_time, rerank_time)
         
-        # Add metadata to results
-        for i, result in enumerate(final_results):
-            result['final_rank'] = i + 1
-            result['search_engine'] = 'hybrid'
-            result['query'] = query
+        self._add_result_metadata(final_results, query)
         
         logger.info(f"Hybrid search completed in {total_time:.3f}s, returned {len(final_results)} results")
         
         return final_results
     
+    def search_batch(self, queries: List[str], top_k: int = None) -> List[List[Dict[str, Any]]]:
+        """
+        Hybrid search for several queries at once
+        
+        All queries are embedded in one encoder call and searched with one FAISS
+        and one BM25 batch search; only the re-ranking runs per query.
+        
+        Args:
+            queries: Search query texts
+            top_k: Number of final results per query (defaults to final_top_k)
+            
+        Returns:
+            One list of ranked documents per query, in query order
+        """
+        if top_k is None:
+            top_k = self.final_top_k
+        if not queries:
+            return []
+        
+        start_time = time.time()
+        stripped_queries = [query.strip() for query in queries]
+        
+        if self.use_parallel_search and self._executor is not None:
+            vector_future = self._executor.submit(self._vector_search_batch, stripped_queries)
+            keyword_batches = self._keyword_search_batch(stripped_queries)
+            vector_batches = vector_future.result()
+        else:
+            vector_batches = self._vector_search_batch(stripped_queries)
+            keyword_batches = self._keyword_search_batch(stripped_queries)
+        
+        rerank_start = time.time()
+        all_results = [
+            self._rerank_results(_normalize_query(query), vector_results, keyword_results, top_k)
+            for query, vector_results, keyword_results
+            in zip(queries, vector_batches, keyword_batches)
+        ]
+        rerank_time = time.time() - rerank_start
+        total_time = time.time() - start_time
+        
+        # Statistics are per query, so the batch time is split evenly
+        for query, results in zip(queries, all_results):
+            self._update_stats(total_time / len(queries), rerank_time / len(queries))
+            self._add_result_metadata(results, query)
+        
+        logger.info(f"Hybrid batch search of {len(queries)} queries completed in {total_time:.3f}s")
+        
+        return all_results
+    
+    @staticmethod
+    def _add_result_metadata(results: List[Dict[str, Any]], query: str):
+        """Stamp final rank and query information on re-ranked results"""
+        for i, result in enumerate(results):
+            result['final_rank'] = i + 1
+            result['search_engine'] = 'hybrid'
+            result['query'] = query
+    
     def _parallel_search(self, query: str) -> Tuple[List[Dict], List[Dict]]:
         """Perform vector and keyword searches in parallel"""
-        vector_results = []
-        keyword_results = []
+        # The keyword search runs on the calling thread while a pool worker does the vector search
+        vector_future = self._executor.submit(self._vector_search, query)
+        keyword_results = self._keyword_search(query)
         
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Submit search tasks
-            vector_future = executor.submit(self._vector_search, query)
-            keyword_future = executor.submit(self._keyword_search, query)
-            
-            # Collect results
-            for future in as_completed([vector_future, keyword_future]):
-                try:
-                    if future == vector_future:
-                        vector_results = future.result()
-                    elif future == keyword_future:
-                        keyword_results = future.result()
-                except Exception as e:
-                    logger.error(f"Error in parallel search: {e}")
+        try:
+            vector_results = vector_future.result(timeout=VECTOR_SEARCH_TIMEOUT_SECONDS)
+        except FuturesTimeoutError:
+            logger.error(f"Vector search timed out after {VECTOR_SEARCH_TIMEOUT_SECONDS}s, using keyword results only")
+            vector_results = []
+        except Exception as e:
+            logger.error(f"Error in parallel search: {e}")
+            vector_results = []
         
         return vector_results, keyword_results
     
+    def close(self):
+        """Shut down the search worker threads"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
     def _sequential_search(self, query: str) -> Tuple[List[Dict], List[Dict]]:
         """Perform vector and keyword searches sequentially"""
         vector_results = self._vector_search(query)
         keyword_results = self._keyword_search(query)
         return vector_results, keyword_results
     
-    def _vector_search(self, query: str) -> List[Dict[str, Any]]:
+    def _vector_search(self, query: str) -> List[VectorHit]:
         """Perform vector similarity search"""
         start_time = time.time()
         try:
-            results = self.vector_db.search(query, self.vector_top_k)
+            query_embedding = self.query_embedding(query)
+            results = self.vector_db.search_by_vectors(query_embedding, self.vector_top_k)[0]
             search_time = time.time() - start_time
+            self._timings['vector'].append(search_time)
             logger.debug(f"Vector search completed in {search_time:.3f}s, found {len(results)} results")
             return results
         except Exception as e:
             logger.error(f"Error in vector search: {e}")
             return []
     
-    def _keyword_search(self, query: str) -> List[Dict[str, Any]]:
+    def _vector_search_batch(self, queries: List[str]) -> List[List[VectorHit]]:
+        """Perform vector similarity search for several queries"""
+        start_time = time.time()
+        try:
+            results = self.vector_db.search_batch(queries, self.vector_top_k)
+            self._timings['vector'].extend([(time.time() - start_time) / len(queries)] * len(queries))
+            return results
+        except Exception as e:
+            logger.error(f"Error in batch vector search: {e}")
+            return [[] for _ in queries]
+    
+    def query_embedding(self, query: str) -> np.ndarray:
+        """
+        Embedding of a query, reused for repeated queries (read-only array)
+        
+        Queries that differ only in case or surrounding whitespace share one
+        cache entry, holding the embedding of the first spelling seen.
+        """
+        key = _normalize_query(query)
+        with self._query_embeddings_lock:
+            embedding = self._query_embeddings.get(key)
+            if embedding is not None:
+                self._query_embeddings.move_to_end(key)
+                self._query_cache_hits += 1
+                return embedding
+            self._query_cache_misses += 1
+        
+        embedding = self.vector_db.create_query_embedding(query.strip())
+        if not np.any(embedding):
+            # Raising keeps the failed embedding out of the cache
+            raise ValueError("Failed to create query embedding")
+        embedding.setflags(write=False)
+        
+        with self._query_embeddings_lock:
+            self._query_embeddings[key] = embedding
+            if len(self._query_embeddings) > QUERY_CACHE_SIZE:
+                self._query_embeddings.popitem(last=False)
+        return embedding
+    
+    def _keyword_search(self, query: str) -> List[BM25Result]:
         """Perform BM25 keyword search"""
         start_time = time.time()
         try:
             results = self.bm25_search.search(query, self.keyword_top_k)
             search_time = time.time() - start_time
+            self._timings['keyword'].append(search_time)
             logger.debug(f"Keyword search completed in {search_time:.3f}s, found {len(results)} results")
             return results
         except Exception as e:
             logger.error(f"Error in keyword search: {e}")
             return []
     
-    def _rerank_results(self, query: str, vector_results: List[Dict], 
-                       keyword_results: List[Dict], top_k: int) -> List[Dict[str, Any]]:
+    def _keyword_search_batch(self, queries: List[str]) -> List[List[BM25Result]]:
+        """Perform BM25 keyword search for several queries"""
+        start_time = time.time()
+        try:
+            results = self.bm25_search.search_batch(queries, self.keyword_top_k)
+            self._timings['keyword'].extend([(time.time() - start_time) / len(queries)] * len(queries))
+            return results
+        except Exception as e:
+            logger.error(f"Error in batch keyword search: {e}")
+            return [[] for _ in queries]
+    
+    def _rerank_results(self, query: str, vector_results: List[VectorHit], 
+                       keyword_results: List[BM25Result], top_k: int) -> List[Dict[str, Any]]:
         """
         Re-rank and combine results from vector and keyword searches
         
         Args:
-            query: Original search query
+            query: Normalized search query
             vector_results: Results from vector search
             keyword_results: Results from keyword search
             top_k: Number of final results to return
@@ -224,117 +402,124 @@ class HybridSearchEngine:
         if not vector_results and not keyword_results:
             return []
         
-        # Create document lookup by ID for merging
-        all_docs = {}
-        
-        # Process vector results
-        for result in vector_results:
-            doc_id = result.get('id', result.get('title', ''))
-            if doc_id not in all_docs:
-                all_docs[doc_id] = result.copy()
-                all_docs[doc_id]['vector_score'] = result.get('similarity_score', 0.0)
-                all_docs[doc_id]['vector_rank'] = result.get('rank', len(vector_results))
-                all_docs[doc_id]['has_vector'] = True
-                all_docs[doc_id]['has_keyword'] = False
-            else:
-                all_docs[doc_id]['vector_score'] = result.get('similarity_score', 0.0)
-                all_docs[doc_id]['vector_rank'] = result.get('rank', len(vector_results))
-                all_docs[doc_id]['has_vector'] = True
-        
-        # Process keyword results
+        # Merge both result lists into [vector hit, keyword result] pairs keyed by doc id;
+        # result documents are only built for the final top-k
+        merged: Dict[str, list] = {}
+        for hit in vector_results:
+            merged.setdefault(hit.doc_id, [None, None])[0] = hit
         for result in keyword_results:
-            doc_id = result.get('id', result.get('title', ''))
-            if doc_id not in all_docs:
-                all_docs[doc_id] = result.copy()
-                all_docs[doc_id]['keyword_score'] = result.get('bm25_score', 0.0)
-                all_docs[doc_id]['keyword_rank'] = result.get('rank', len(keyword_results))
-                all_docs[doc_id]['has_vector'] = False
-                all_docs[doc_id]['has_keyword'] = True
-            else:
-                all_docs[doc_id]['keyword_score'] = result.get('bm25_score', 0.0)
-                all_docs[doc_id]['keyword_rank'] = result.get('rank', len(keyword_results))
-                all_docs[doc_id]['has_keyword'] = True
-        
-        # Calculate combined scores
-        combined_docs = list(all_docs.values())
-        
-        if self.rerank_method == "weighted_sum":
-            combined_docs = self._weighted_sum_rerank(combined_docs)
+            merged.setdefault(result.document.get('id', result.title), [None, None])[1] = result
+        candidates = list(merged.values())
+        
+        # Each method returns (candidate index, score fields) for its top-k, best first.
+        # When only one engine returned hits, its own ranking and scores stand as they are
+        if not keyword_results:
+            ranked = [(i, {'combined_score': hit.similarity_score, 'rerank_method': 'vector_only'})
+                      for i, (hit, _) in enumerate(candidates[:top_k])]
+        elif not vector_results:
+            ranked = [(i, {'combined_score': result.bm25_score, 'rerank_method': 'keyword_only'})
+                      for i, (_, result) in enumerate(candidates[:top_k])]
+        elif self.rerank_method == "weighted_sum":
+            ranked = self._weighted_sum_rerank(candidates, top_k)
         elif self.rerank_method == "rrf":
-            combined_docs = self._reciprocal_rank_fusion(combined_docs)
+            ranked = self._reciprocal_rank_fusion(candidates, top_k)
         elif self.rerank_method == "adaptive":
-            combined_docs = self._adaptive_rerank(combined_docs, query)
+            ranked = self._adaptive_rerank(candidates, query, top_k)
         else:
             logger.warning(f"Unknown rerank method: {self.rerank_method}, using weighted_sum")
-            combined_docs = self._weighted_sum_rerank(combined_docs)
-        
-        # Sort by combined score and return top-k
-        combined_docs.sort(key=lambda x: x['combined_score'], reverse=True)
-        return combined_docs[:top_k]
+            ranked = self._weighted_sum_rerank(candidates, top_k)
+        
+        winners = [candidates[i] for i, _ in ranked]
+        vector_docs = iter(self.vector_db.get_documents([hit for hit, _ in winners if hit is not None]))
+        
+        results = []
+        for (hit, keyword_result), (_, fields) in zip(winners, ranked):
+            if hit is not None:
+                doc = next(vector_docs)
+                doc['vector_score'] = hit.similarity_score
+                doc['vector_rank'] = hit.rank
+                doc['has_vector'] = True
+                doc['has_keyword'] = keyword_result is not None
+                if keyword_result is not None:
+                    doc['keyword_score'] = keyword_result.bm25_score
+                    doc['keyword_rank'] = keyword_result.rank
+            else:
+                doc = keyword_result.to_dict()
+                doc['keyword_score'] = keyword_result.bm25_score
+                doc['keyword_rank'] = keyword_result.rank
+                doc['has_vector'] = False
+                doc['has_keyword'] = True
+            doc.update(fields)
+            results.append(doc)
+        
+        return results
     
-    def _weighted_sum_rerank(self, documents: List[Dict]) -> List[Dict]:
+    def _weighted_sum_rerank(self, candidates: List[list], top_k: int,
+                             vector_weight: float = None,
+                             keyword_weight: float = None) -> List[Tuple[int, Dict[str, Any]]]:
         """Re-rank using weighted sum of normalized scores"""
-        # Normalize scores
-        vector_scores = [doc.get('vector_score', 0.0) for doc in documents]
-        keyword_scores = [doc.get('keyword_score', 0.0) for doc in documents]
-        
-        # Handle case where all scores are zero
-        if max(vector_scores) > 0:
-            scaler = MinMaxScaler()
-            vector_scores_norm = scaler.fit_transform(np.array(vector_scores).reshape(-1, 1)).flatten()
-        else:
-            vector_scores_norm = np.zeros(len(vector_scores))
-        
-        if max(keyword_scores) > 0:
-            scaler = MinMaxScaler()
-            keyword_scores_norm = scaler.fit_transform(np.array(keyword_scores).reshape(-1, 1)).flatten()
-        else:
-            keyword_scores_norm = np.zeros(len(keyword_scores))
-        
-        # Calculate combined scores
-        for i, doc in enumerate(documents):
-            vector_score = vector_scores_norm[i] if doc.get('has_vector', False) else 0.0
-            keyword_score = keyword_scores_norm[i] if doc.get('has_keyword', False) else 0.0
-            
-            combined_score = (self.vector_weight * vector_score + 
-                            self.keyword_weight * keyword_score)
-            
-            doc['combined_score'] = combined_score
-            doc['normalized_vector_score'] = vector_score
-            doc['normalized_keyword_score'] = keyword_score
-            doc['rerank_method'] = 'weighted_sum'
-        
-        return documents
+        if vector_weight is None:
+            vector_weight = self.vector_weight
+        if keyword_weight is None:
+            keyword_weight = self.keyword_weight
+        
+        n = len(candidates)
+        vector_scores = np.fromiter((hit.similarity_score if hit is not None else 0.0 for hit, _ in candidates),
+                                    dtype=np.float64, count=n)
+        keyword_scores = np.fromiter((result.bm25_score if result is not None else 0.0 for _, result in candidates),
+                                     dtype=np.float64, count=n)
+        has_vector = np.fromiter((hit is not None for hit, _ in candidates), dtype=bool, count=n)
+        has_keyword = np.fromiter((result is not None for _, result in candidates), dtype=bool, count=n)
+        
+        # Normalize scores, masking out engines that did not return the document
+        vector_scores_norm = _min_max_normalize(vector_scores) * has_vector
+        keyword_scores_norm = _min_max_normalize(keyword_scores) * has_keyword
+        
+        # Fuse scores and select the top-k in one kernel
+        top_indices = fuse_topk(vector_scores_norm, keyword_scores_norm,
+                                float(vector_weight), float(keyword_weight), top_k)
+        
+        results = []
+        for i in top_indices:
+            vector_score = vector_scores_norm[i]
+            keyword_score = keyword_scores_norm[i]
+            results.append((i, {
+                'combined_score': vector_weight * vector_score + keyword_weight * keyword_score,
+                'normalized_vector_score': vector_score,
+                'normalized_keyword_score': keyword_score,
+                'rerank_method': 'weighted_sum'
+            }))
+        
+        return results
     
-    def _reciprocal_rank_fusion(self, documents: List[Dict], k: int = 60) -> List[Dict]:
+    def _reciprocal_rank_fusion(self, candidates: List[list], top_k: int,
+                                k: int = 60) -> List[Tuple[int, Dict[str, Any]]]:
         """Re-rank using Reciprocal Rank Fusion (RRF)"""
-        for doc in documents:
-            vector_rank = doc.get('vector_rank', float('inf'))
-            keyword_rank = doc.get('keyword_rank', float('inf'))
-            
-            # RRF formula: 1/(k + rank)
-            vector_rrf = 1.0 / (k + vector_rank) if doc.get('has_vector', False) else 0.0
-            keyword_rrf = 1.0 / (k + keyword_rank) if doc.get('has_keyword', False) else 0.0
-            
-            combined_score = vector_rrf + keyword_rrf
-            
-            doc['combined_score'] = combined_score
-            doc['vector_rrf'] = vector_rrf
-            doc['keyword_rrf'] = keyword_rrf
-            doc['rerank_method'] = 'rrf'
-        
-        return documents
+        # RRF formula: 1/(k + rank)
+        n = len(candidates)
+        vector_rrf = np.fromiter((1.0 / (k + hit.rank) if hit is not None else 0.0 for hit, _ in candidates),
+                                 dtype=np.float64, count=n)
+        keyword_rrf = np.fromiter((1.0 / (k + result.rank) if result is not None else 0.0 for _, result in candidates),
+                                  dtype=np.float64, count=n)
+        
+        top_indices = fuse_topk(vector_rrf, keyword_rrf, 1.0, 1.0, top_k)
+        
+        results = []
+        for i in top_indices:
+            results.append((i, {
+                'combined_score': vector_rrf[i] + keyword_rrf[i],
+                'vector_rrf': vector_rrf[i],
+                'keyword_rrf': keyword_rrf[i],
+                'rerank_method': 'rrf'
+            }))
+        
+        return results
     
-    def _adaptive_rerank(self, documents: List[Dict], query: str) -> List[Dict]:
-        """Adaptive re-ranking based on query characteristics"""
+    def _adaptive_rerank(self, candidates: List[list], query: str,
+                         top_k: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """Adaptive re-ranking based on characteristics of the normalized query"""
         # Analyze query to determine optimal weighting
-        query_tokens = query.lower().split()
-        
-        # Heuristics for adaptive weighting
-        has_medical_terms = any(term in query.lower() for term in 
-                              ['penyakit', 'gejala', 'diagnosis', 'pengobatan', 'terapi'])
-        is_short_query = len(query_tokens) <= 3
-        has_exact_phrases = '"' in query
+        has_medical_terms, is_short_query, has_exact_phrases = _classify_query(query)
         
         # Adjust weights based on query characteristics
         if has_exact_phrases or is_short_query:
@@ -351,35 +536,40 @@ class HybridSearchEngine:
             adaptive_keyword_weight = self.keyword_weight
         
         # Apply weighted sum with adaptive weights
-        original_weights = (self.vector_weight, self.keyword_weight)
-        self.vector_weight = adaptive_vector_weight
-        self.keyword_weight = adaptive_keyword_weight
-        
-        documents = self._weighted_sum_rerank(documents)
-        
-        # Restore original weights
-        self.vector_weight, self.keyword_weight = original_weights
+        results = self._weighted_sum_rerank(candidates, top_k, adaptive_vector_weight, adaptive_keyword_weight)
         
         # Add adaptive metadata
-        for doc in documents:
-            doc['rerank_method'] = 'adaptive'
-            doc['adaptive_vector_weight'] = adaptive_vector_weight
-            doc['adaptive_keyword_weight'] = adaptive_keyword_weight
+        for _, fields in results:
+            fields['rerank_method'] = 'adaptive'
+            fields['adaptive_vector_weight'] = adaptive_vector_weight
+            fields['adaptive_keyword_weight'] = adaptive_keyword_weight
         
-        return documents
+        return results
     
     def _update_stats(self, total_time: float, rerank_time: float):
         """Update performance statistics"""
-        self.search_stats['total_searches'] += 1
-        n = self.search_stats['total_searches']
-        
-        # Update running averages
-        self.search_stats['avg_total_time'] = (
-            (self.search_stats['avg_total_time'] * (n - 1) + total_time) / n
-        )
-        self.search_stats['avg_rerank_time'] = (
-            (self.search_stats['avg_rerank_time'] * (n - 1) + rerank_time) / n
-        )
+        self.total_searches += 1
+        self._timings['total'].append(total_time)
+        self._timings['rerank'].append(rerank_time)
+    
+    def _performance_stats(self) -> Dict[str, Any]:
+        """Mean and p50/p95/p99 of each stage's timings over the recent searches"""
+        stats = {'total_searches': self.total_searches}
+        for stage, timings in self._timings.items():
+            values = np.array(timings.copy(), dtype=np.float64)  # copy() is atomic under concurrent appends
+            if len(values):
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                mean = values.mean()
+            else:
+                mean = p50 = p95 = p99 = 0.0
+            stats[f'avg_{stage}_time'] = float(mean)
+            stats[f'p50_{stage}_time'] = float(p50)
+            stats[f'p95_{stage}_time'] = float(p95)
+            stats[f'p99_{stage}_time'] = float(p99)
+        
+        stats['query_cache_hits'] = self._query_cache_hits
+        stats['query_cache_misses'] = self._query_cache_misses
+        return stats
     
     def save_indexes(self, vector_index_path: str, vector_metadata_path: str, 
                     bm25_index_path: str):
@@ -414,7 +604,7 @@ class HybridSearchEngine:
             },
             'vector_search': vector_stats,
             'keyword_search': bm25_stats,
-            'performance': self.search_stats
+            'performance': self._performance_stats()
         }
 
 
@@ -460,13 +650,11 @@ def main():
         "penyakit metabolik"
     ]
     
-    for query in test_queries:
+    for query, results in zip(test_queries, hybrid_engine.search_batch(test_queries, top_k=3)):
         print(f"\n{'='*50}")
         print(f"Query: '{query}'")
         print('='*50)
         
-        results = hybrid_engine.search(query, top_k=3)
-        
         for i, result in enumerate(results, 1):
             print(f"\n{i}. {result['title']}")
             print(f"   Combined Score: {result['combined_score']:.3f}")
@@ -486,6 +674,8 @@ def main():
     print(f"Keyword Documents: {stats['keyword_search']['total_documents']}")
     print(f"Total Searches: {stats['performance']['total_searches']}")
     print(f"Avg Total Time: {stats['performance']['avg_total_time']:.3f}s")
+    
+    hybrid_engine.close()
 
 
 if __name__ == "__main__":
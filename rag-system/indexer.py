@@ -7,11 +7,18 @@ Mengekstrak, chunk, dan embed dokumen dari Google Drive untuk sistem RAG Anamnes
 import os
 import json
 import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
 import tempfile
 import mimetypes
 
+import orjson
+
 # Google APIs
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -20,9 +27,16 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import io
 from googleapiclient.http import MediaIoBaseDownload
+from google.api_core import exceptions as google_exceptions
 
 # Document processing
 import PyPDF2
+try:
+    import pymupdf  # C-backed MuPDF, much faster per page than PyPDF2
+    from pdf_extraction import extract_pdf_page_range
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
 from docx import Document
 import pandas as pd
 from PIL import Image
@@ -31,13 +45,47 @@ from PIL import Image
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 import google.generativeai as genai
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+
+from embedding_cache import EmbeddingCache, encode_embedding
+from gemini_embedding import GEMINI_MAX_BATCH_SIZE, embed_batch
 
 # Configuration
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 CREDENTIALS_FILE = 'credentials.json'  # Changed from './rag-system/credentials.json'
 TOKEN_FILE = 'token.json'  # Changed from './rag-system/token.json'
 
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+FILE_TYPE_MIME_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'txt': 'text/plain',
+    'csv': 'text/csv',
+}
+
+# Drive executes up to 100 calls per batch HTTP request; one page lists up to 1000 children
+DRIVE_BATCH_SIZE = 100
+DRIVE_PAGE_SIZE = 1000
+DRIVE_FILE_FIELDS = "nextPageToken, files(id, name, mimeType, size, md5Checksum, modifiedTime)"
+
+EMBEDDING_DIMENSION = 768
+
+# Files downloaded concurrently while earlier ones are extracted and embedded. Downloads
+# wait on the network rather than the CPU; the cap respects Drive's per-user quota
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_PREFETCH = 2 * DOWNLOAD_WORKERS
+
+# Chunk embeddings are cached by content hash in the same store (and namespace) that
+# FaissVectorDB uses for Gemini, so unchanged chunks are never sent to the API twice
+EMBEDDING_CACHE_FILE = Path(__file__).parent / 'data' / 'embedding_cache.sqlite'
+
+# Large PDFs are split into contiguous page ranges extracted in worker processes (one range
+# per core). The pool is started by the first PDF of PDF_PARALLEL_MIN_PAGES pages, which has
+# to repay the ~0.5s worker start-up (text pages take ~1.3ms each); once it runs for a
+# process_files call, PDFs of PDF_PARALLEL_WARM_MIN_PAGES pages repay the ~8ms hand-off
+PDF_WORKERS = os.cpu_count() or 1
+PDF_PARALLEL_MIN_PAGES = 512
+PDF_PARALLEL_WARM_MIN_PAGES = 32
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -49,6 +97,8 @@ class GoogleDriveIndexer:
         self.credentials_file = credentials_file
         self.token_file = TOKEN_FILE
         self.service = None
+        self.credentials = None
+        self._thread_local = threading.local()  # Per-thread Drive clients (httplib2 is not thread-safe)
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
@@ -59,6 +109,16 @@ class GoogleDriveIndexer:
         genai.configure(api_key=gemini_api_key)
         self.embedding_model = "models/text-embedding-004"
         
+        self.embedding_cache = None
+        try:
+            self.embedding_cache = EmbeddingCache(EMBEDDING_CACHE_FILE, f"gemini:{self.embedding_model}")
+        except Exception as e:
+            logger.warning(f"Embedding cache unavailable ({e}), embeddings will not be cached")
+        
+        # Page range workers for large PDFs, only available during process_files
+        self._pdf_executor = None
+        self._pdf_pool_started = False
+        
         # File processing cache to avoid duplicates
         self.processed_files = set()
         self.cache_file = Path(__file__).parent / 'data' / 'indexer_cache.json'
@@ -73,8 +133,8 @@ class GoogleDriveIndexer:
         """Load cache of previously processed files"""
         try:
             if self.cache_file.exists():
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
+                with open(self.cache_file, 'rb') as f:
+                    cache_data = orjson.loads(f.read())
                     self.processed_files = set(cache_data.get('processed_files', []))
                 logger.info(f"Loaded cache: {len(self.processed_files)} previously processed files")
             else:
@@ -91,8 +151,8 @@ class GoogleDriveIndexer:
                 'processed_files': list(self.processed_files),
                 'last_updated': str(Path(__file__).parent)
             }
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
+            with open(self.cache_file, 'wb') as f:
+                f.write(orjson.dumps(cache_data, option=orjson.OPT_INDENT_2))
             logger.info(f"Cache saved: {len(self.processed_files)} processed files")
         except Exception as e:
             logger.error(f"Error saving cache: {e}")
@@ -127,6 +187,7 @@ class GoogleDriveIndexer:
                 token.write(creds.to_json())
         
         try:
+            self.credentials = creds
             self.service = build('drive', 'v3', credentials=creds)
             logger.info("Successfully authenticated with Google Drive API")
         except HttpError as error:
@@ -154,28 +215,28 @@ class GoogleDriveIndexer:
                     query_parts.append(f"'{folder_id}' in parents")
             
             if file_types:
-                mime_queries = []
-                for file_type in file_types:
-                    if file_type == 'pdf':
-                        mime_queries.append("mimeType='application/pdf'")
-                    elif file_type == 'docx':
-                        mime_queries.append("mimeType='application/vnd.openxmlformats-officedocument.wordprocessingml.document'")
-                    elif file_type == 'txt':
-                        mime_queries.append("mimeType='text/plain'")
-                    elif file_type == 'csv':
-                        mime_queries.append("mimeType='text/csv'")
+                mime_queries = [f"mimeType='{FILE_TYPE_MIME_TYPES[t]}'" for t in file_types if t in FILE_TYPE_MIME_TYPES]
                 
                 if mime_queries:
                     query_parts.append(f"({' or '.join(mime_queries)})")
             
             query = ' and '.join(query_parts) if query_parts else None
             
-            results = self.service.files().list(
-                q=query,
-                fields="nextPageToken, files(id, name, mimeType, size)"
-            ).execute()
+            # Follow nextPageToken so large drives are not cut off after the first page
+            files = []
+            page_token = None
+            while True:
+                results = self.service.files().list(
+                    q=query,
+                    fields=DRIVE_FILE_FIELDS,
+                    pageSize=DRIVE_PAGE_SIZE,
+                    pageToken=page_token
+                ).execute()
+                files.extend(results.get('files', []))
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
             
-            files = results.get('files', [])
             logger.info(f"Found {len(files)} files in Google Drive")
             return files
             
@@ -184,52 +245,32 @@ class GoogleDriveIndexer:
             return []
     
     def _get_files_recursive(self, folder_id: str, file_types: List[str] = None) -> List[Dict]:
-        """Recursively get all files from folder and subfolders"""
+        """
+        Get all files from folder and subfolders
+        
+        The tree is walked breadth-first: one query per folder lists files and
+        subfolders together, and the queries of a whole level (plus follow-up
+        pages) go out in batch HTTP requests of up to DRIVE_BATCH_SIZE calls.
+        """
+        mime_types = {FILE_TYPE_MIME_TYPES[t] for t in file_types or [] if t in FILE_TYPE_MIME_TYPES}
         all_files = []
         
+        # (folder id, page token) listings still to request
+        pending = [(folder_id, None)]
         try:
-            # Get files in current folder
-            query_parts = [f"'{folder_id}' in parents"]
-            
-            if file_types:
-                mime_queries = []
-                for file_type in file_types:
-                    if file_type == 'pdf':
-                        mime_queries.append("mimeType='application/pdf'")
-                    elif file_type == 'docx':
-                        mime_queries.append("mimeType='application/vnd.openxmlformats-officedocument.wordprocessingml.document'")
-                    elif file_type == 'txt':
-                        mime_queries.append("mimeType='text/plain'")
-                    elif file_type == 'csv':
-                        mime_queries.append("mimeType='text/csv'")
-                
-                if mime_queries:
-                    query_parts.append(f"({' or '.join(mime_queries)})")
-            
-            # Get files
-            file_query = ' and '.join(query_parts)
-            results = self.service.files().list(
-                q=file_query,
-                fields="files(id, name, mimeType, size)"
-            ).execute()
-            
-            files = results.get('files', [])
-            all_files.extend(files)
-            
-            # Get subfolders
-            folder_query = f"'{folder_id}' in parents and mimeType='application/vnd.google-apps.folder'"
-            folder_results = self.service.files().list(
-                q=folder_query,
-                fields="files(id, name)"
-            ).execute()
-            
-            subfolders = folder_results.get('files', [])
-            
-            # Recursively process subfolders
-            for subfolder in subfolders:
-                logger.info(f"Processing subfolder: {subfolder['name']}")
-                subfolder_files = self._get_files_recursive(subfolder['id'], file_types)
-                all_files.extend(subfolder_files)
+            while pending:
+                requests, pending = pending, []
+                for start in range(0, len(requests), DRIVE_BATCH_SIZE):
+                    responses = self._list_children_batch(requests[start:start + DRIVE_BATCH_SIZE])
+                    for parent_id, response in responses:
+                        for item in response.get('files', []):
+                            if item.get('mimeType') == FOLDER_MIME_TYPE:
+                                logger.info(f"Processing subfolder: {item['name']}")
+                                pending.append((item['id'], None))
+                            elif not mime_types or item.get('mimeType') in mime_types:
+                                all_files.append(item)
+                        if response.get('nextPageToken'):
+                            pending.append((parent_id, response['nextPageToken']))
             
             return all_files
             
@@ -237,6 +278,39 @@ class GoogleDriveIndexer:
             logger.error(f"Error in recursive file search: {error}")
             return []
     
+    def _list_children_batch(self, requests: List[Tuple[str, str]]) -> List[Tuple[str, Dict]]:
+        """List one page of children for each (folder id, page token) in a single batch HTTP request"""
+        responses = []
+        
+        def collect(request_id, response, exception):
+            parent_id = requests[int(request_id)][0]
+            if exception is not None:
+                logger.error(f"Error listing folder {parent_id}: {exception}")
+            else:
+                responses.append((parent_id, response))
+        
+        batch = self.service.new_batch_http_request(callback=collect)
+        for i, (parent_id, page_token) in enumerate(requests):
+            batch.add(self.service.files().list(
+                q=f"'{parent_id}' in parents",
+                fields=DRIVE_FILE_FIELDS,
+                pageSize=DRIVE_PAGE_SIZE,
+                pageToken=page_token
+            ), request_id=str(i))
+        batch.execute()
+        
+        return responses
+    
+    def _drive_service(self):
+        """Drive client of the calling thread; worker threads each build their own"""
+        if threading.current_thread() is threading.main_thread() or self.credentials is None:
+            return self.service
+        service = getattr(self._thread_local, 'service', None)
+        if service is None:
+            service = build('drive', 'v3', credentials=self.credentials, cache_discovery=False)
+            self._thread_local.service = service
+        return service
+    
     def download_file(self, file_id: str, file_name: str) -> str:
         """Download file from Google Drive and return content"""
         if not self.service:
@@ -244,7 +318,7 @@ class GoogleDriveIndexer:
             return ""
         
         try:
-            request = self.service.files().get_media(fileId=file_id)
+            request = self._drive_service().files().get_media(fileId=file_id)
             file_content = io.BytesIO()
             downloader = MediaIoBaseDownload(file_content, request)
             
@@ -259,33 +333,83 @@ class GoogleDriveIndexer:
             logger.error(f"An error occurred while downloading file {file_name}: {error}")
             return None
     
+    def _iter_downloads(self, files: List[Dict]) -> Iterator[Tuple[Dict, bytes]]:
+        """Yield (file_data, content) in order while the next files download in the background"""
+        files = iter(files)
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS, thread_name_prefix='drive-download') as executor:
+            in_flight = deque()
+            
+            def submit_next():
+                file_data = next(files, None)
+                if file_data is not None:
+                    in_flight.append((file_data, executor.submit(self.download_file, file_data['id'], file_data['name'])))
+            
+            for _ in range(DOWNLOAD_PREFETCH):
+                submit_next()
+            while in_flight:
+                file_data, future = in_flight.popleft()
+                submit_next()
+                yield file_data, future.result()
+    
     def extract_text_from_pdf(self, content: bytes, file_name: str = "unknown") -> str:
-        """Extract text from PDF content with progress tracking"""
+        """Extract text from PDF content with PyMuPDF, falling back to PyPDF2 for files it cannot parse"""
+        if PYMUPDF_AVAILABLE:
+            try:
+                with pymupdf.open(stream=content, filetype="pdf") as pdf_document:
+                    total_pages = pdf_document.page_count
+                    min_pages = PDF_PARALLEL_WARM_MIN_PAGES if self._pdf_pool_started else PDF_PARALLEL_MIN_PAGES
+                    if self._pdf_executor is not None and total_pages >= min_pages:
+                        return self._extract_pdf_parallel(content, total_pages, file_name)
+                    page_texts = (page.get_text() for page in pdf_document)
+                    return self._join_pdf_pages(page_texts, total_pages, file_name)
+            except Exception as e:
+                logger.warning(f"[{file_name}] PyMuPDF extraction failed, retrying with PyPDF2: {e}")
+        
         try:
             pdf_file = io.BytesIO(content)
             pdf_reader = PyPDF2.PdfReader(pdf_file)
-            total_pages = len(pdf_reader.pages)
-            
-            logger.info(f"[{file_name}] Starting PDF extraction: {total_pages} pages")
-            
-            text = ""
-            for page_num in range(total_pages):
-                page = pdf_reader.pages[page_num]
-                page_text = page.extract_text()
-                text += page_text + "\n"
-                
-                # Progress indicator every 10 pages or at the end
-                if (page_num + 1) % 10 == 0 or page_num == total_pages - 1:
-                    progress_pct = ((page_num + 1) / total_pages) * 100
-                    chars_extracted = len(text)
-                    logger.info(f"[{file_name}] PDF progress: {page_num + 1}/{total_pages} pages ({progress_pct:.1f}%) - {chars_extracted:,} characters")
-            
-            logger.info(f"[{file_name}] PDF extraction completed: {len(text):,} total characters")
-            return text
+            page_texts = (page.extract_text() for page in pdf_reader.pages)
+            return self._join_pdf_pages(page_texts, len(pdf_reader.pages), file_name)
         except Exception as e:
             logger.error(f"[{file_name}] Error extracting text from PDF: {e}")
             return ""
     
+    def _extract_pdf_parallel(self, content: bytes, total_pages: int, file_name: str) -> str:
+        """Extract contiguous page ranges of a large PDF in worker processes, keeping page order"""
+        pages_per_worker = -(-total_pages // PDF_WORKERS)
+        starts = range(0, total_pages, pages_per_worker)
+        stops = [min(start + pages_per_worker, total_pages) for start in starts]
+        
+        # Workers open the PDF from a temporary file rather than each receiving its bytes
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as pdf_file:
+            pdf_file.write(content)
+        try:
+            self._pdf_pool_started = True
+            page_ranges = self._pdf_executor.map(extract_pdf_page_range, [pdf_file.name] * len(starts), starts, stops)
+            return self._join_pdf_pages(chain.from_iterable(page_ranges), total_pages, file_name)
+        finally:
+            os.unlink(pdf_file.name)
+    
+    def _join_pdf_pages(self, page_texts: Iterator[str], total_pages: int, file_name: str) -> str:
+        """Join extracted page texts with progress tracking"""
+        logger.info(f"[{file_name}] Starting PDF extraction: {total_pages} pages")
+        
+        parts = []
+        chars_extracted = 0
+        for page_num, page_text in enumerate(page_texts):
+            page_text += "\n"
+            parts.append(page_text)
+            chars_extracted += len(page_text)
+            
+            # Progress indicator every 10 pages or at the end
+            if (page_num + 1) % 10 == 0 or page_num == total_pages - 1:
+                progress_pct = ((page_num + 1) / total_pages) * 100
+                logger.info(f"[{file_name}] PDF progress: {page_num + 1}/{total_pages} pages ({progress_pct:.1f}%) - {chars_extracted:,} characters")
+        
+        text = "".join(parts)
+        logger.info(f"[{file_name}] PDF extraction completed: {len(text):,} total characters")
+        return text
+    
     def extract_text_from_docx(self, content: bytes, file_name: str = "unknown") -> str:
         """Extract text from DOCX content with progress tracking"""
         try:
@@ -295,16 +419,19 @@ class GoogleDriveIndexer:
             
             logger.info(f"[{file_name}] Starting DOCX extraction: {total_paragraphs} paragraphs")
             
-            text = ""
+            parts = []
+            chars_extracted = 0
             for i, paragraph in enumerate(doc.paragraphs):
-                text += paragraph.text + "\n"
+                paragraph_text = paragraph.text + "\n"
+                parts.append(paragraph_text)
+                chars_extracted += len(paragraph_text)
                 
                 # Progress indicator every 100 paragraphs or at the end
                 if (i + 1) % 100 == 0 or i == total_paragraphs - 1:
                     progress_pct = ((i + 1) / total_paragraphs) * 100
-                    chars_extracted = len(text)
                     logger.info(f"[{file_name}] DOCX progress: {i + 1}/{total_paragraphs} paragraphs ({progress_pct:.1f}%) - {chars_extracted:,} characters")
             
+            text = "".join(parts)
             logger.info(f"[{file_name}] DOCX extraction completed: {len(text):,} total characters")
             return text
         except Exception as e:
@@ -329,18 +456,17 @@ class GoogleDriveIndexer:
             logger.info(f"[{file_name}] Starting CSV extraction: {total_rows:,} rows, {len(df.columns)} columns")
             
             # Convert dataframe to text format
-            text = f"CSV Data ({total_rows:,} rows):\n"
-            text += f"Columns: {', '.join(df.columns.tolist())}\n\n"
-            
-            # Add each row as text with progress indication
-            for index, row in df.iterrows():
-                if (index + 1) % 1000 == 0:  # Progress indicator every 1000 rows
-                    progress_pct = ((index + 1) / total_rows) * 100
-                    chars_extracted = len(text)
-                    logger.info(f"[{file_name}] CSV progress: {index + 1:,}/{total_rows:,} rows ({progress_pct:.1f}%) - {chars_extracted:,} characters")
-                
-                row_text = ", ".join([f"{col}: {val}" for col, val in row.items() if pd.notna(val)])
-                text += f"Row {index + 1}: {row_text}\n"
+            header = f"CSV Data ({total_rows:,} rows):\nColumns: {', '.join(map(str, df.columns))}\n\n"
+            
+            # Format all cells column-wise as strings once, then join each row's present cells
+            labels = [f"{col}: " for col in df.columns]
+            values = df.astype(str).to_numpy()
+            present = df.notna().to_numpy()
+            rows = [
+                f"Row {i}: " + ", ".join([label + value for label, value, keep in zip(labels, row, row_present) if keep])
+                for i, (row, row_present) in enumerate(zip(values, present), 1)
+            ]
+            text = header + "\n".join(rows) + ("\n" if rows else "")
             
             logger.info(f"[{file_name}] CSV extraction completed: {total_rows:,} rows, {len(text):,} characters")
             return text
@@ -354,27 +480,24 @@ class GoogleDriveIndexer:
             json_text = content.decode('utf-8')
             data = json.loads(json_text)
             
-            def json_to_text(obj, prefix=""):
-                """Recursively convert JSON object to readable text"""
-                text = ""
+            def json_to_text(obj, parts, prefix=""):
+                """Recursively append readable lines of a JSON object to parts"""
                 if isinstance(obj, dict):
                     for key, value in obj.items():
                         if isinstance(value, (dict, list)):
-                            text += f"{prefix}{key}:\n"
-                            text += json_to_text(value, prefix + "  ")
+                            parts.append(f"{prefix}{key}:\n")
+                            json_to_text(value, parts, prefix + "  ")
                         else:
-                            text += f"{prefix}{key}: {value}\n"
+                            parts.append(f"{prefix}{key}: {value}\n")
                 elif isinstance(obj, list):
                     for i, item in enumerate(obj):
-                        text += f"{prefix}Item {i + 1}:\n"
-                        text += json_to_text(item, prefix + "  ")
+                        parts.append(f"{prefix}Item {i + 1}:\n")
+                        json_to_text(item, parts, prefix + "  ")
                 else:
-                    text += f"{prefix}{obj}\n"
-                return text
+                    parts.append(f"{prefix}{obj}\n")
+                return parts
             
-            text = "JSON Data:\n"
-            text += json_to_text(data)
-            return text
+            return "".join(json_to_text(data, ["JSON Data:\n"]))
             
         except Exception as e:
             logger.error(f"Error extracting text from JSON: {e}")
@@ -406,34 +529,48 @@ class GoogleDriveIndexer:
             return ""
     
     def create_embeddings(self, texts: List[str], file_name: str = "unknown") -> List[List[float]]:
-        """Create embeddings using Gemini API with progress tracking"""
-        embeddings = []
+        """Create embeddings using Gemini API with progress tracking, reusing cached embeddings of unchanged chunks"""
         total_texts = len(texts)
+        embeddings = self.embedding_cache.get_many(texts) if self.embedding_cache else [None] * total_texts
+        misses = [pos for pos, embedding in enumerate(embeddings) if embedding is None]
         
-        logger.info(f"🧠 [{file_name}] Creating embeddings for {total_texts} text chunks...")
+        logger.info(f"🧠 [{file_name}] Creating embeddings for {len(misses)} text chunks ({total_texts - len(misses)} cached)...")
         
-        for i, text in enumerate(texts):
+        for start in range(0, len(misses), GEMINI_MAX_BATCH_SIZE):
+            positions = misses[start:start + GEMINI_MAX_BATCH_SIZE]
+            batch = [texts[pos] for pos in positions]
             try:
-                result = genai.embed_content(
-                    model=self.embedding_model,
-                    content=text,
-                    task_type="retrieval_document"
-                )
-                embeddings.append(result['embedding'])
-                
-                # Progress indicator every 10 embeddings or at the end
-                if (i + 1) % 10 == 0 or i == total_texts - 1:
-                    progress_pct = ((i + 1) / total_texts) * 100
-                    logger.info(f"🧠 [{file_name}] Embedding progress: {i + 1}/{total_texts} ({progress_pct:.1f}%)")
-                    
+                batch_embeddings = embed_batch(self.embedding_model, batch, "retrieval_document")
+            except google_exceptions.ResourceExhausted as e:
+                logger.error(f"🧠 [{file_name}] Still rate limited for chunks {start + 1}-{start + len(batch)}: {e}")
+                batch_embeddings = np.zeros((len(batch), EMBEDDING_DIMENSION), dtype=np.float32)
             except Exception as e:
-                logger.error(f"🧠 [{file_name}] Error creating embedding for chunk {i + 1}: {e}")
-                # Create zero embedding as fallback
-                embeddings.append([0.0] * 768)  # Assuming 768 dimensions
+                # Other failures may come from a single chunk, so the others are retried one by one
+                logger.warning(f"🧠 [{file_name}] Batch failed for chunks {start + 1}-{start + len(batch)} ({e}), retrying chunk by chunk")
+                batch_embeddings = np.stack([self._embed_single(text, file_name) for text in batch])
+            
+            # Zero rows (failed chunks) are not cached
+            if self.embedding_cache:
+                self.embedding_cache.put_many(batch, batch_embeddings)
+            
+            for pos, embedding in zip(positions, batch_embeddings):
+                embeddings[pos] = embedding
+            
+            done = start + len(batch)
+            progress_pct = (done / len(misses)) * 100
+            logger.info(f"🧠 [{file_name}] Embedding progress: {done}/{len(misses)} ({progress_pct:.1f}%)")
         
         logger.info(f"✅ [{file_name}] Embeddings completed: {len(embeddings)} embeddings created")
         return embeddings
     
+    def _embed_single(self, text: str, file_name: str) -> np.ndarray:
+        """Embed one chunk, returning a zero vector if it fails"""
+        try:
+            return embed_batch(self.embedding_model, [text], "retrieval_document")[0]
+        except Exception as e:
+            logger.error(f"🧠 [{file_name}] Error creating embedding for chunk: {e}")
+            return np.zeros(EMBEDDING_DIMENSION, dtype=np.float32)
+    
     def process_files(self, folder_id: str = None) -> List[Dict]:
         """Process all files and create embeddings with detailed progress tracking and deduplication"""
         # Supported file types - now includes JSON
@@ -451,78 +588,95 @@ class GoogleDriveIndexer:
         total_chunks = 0
         total_characters = 0
         
+        # Skip files processed in earlier runs before any download starts
+        pending = []
         for file_index, file_data in enumerate(files, 1):
-            file_name = file_data['name']
-            file_size = file_data.get('size', 0)
-            file_hash = self._get_file_hash(file_data)
-            
-            # Check if file already processed
-            if file_hash in self.processed_files:
-                logger.info(f"⏭️  Skipping already processed file {file_index}/{total_files}: {file_name}")
+            if self._get_file_hash(file_data) in self.processed_files:
+                logger.info(f"⏭️  Skipping already processed file {file_index}/{total_files}: {file_data['name']}")
                 skipped_files += 1
-                continue
-            
-            logger.info(f"📄 Processing file {file_index}/{total_files}: {file_name} ({file_size} bytes)")
-            
-            # Download file content
-            content = self.download_file(file_data['id'], file_data['name'])
-            if not content:
-                logger.warning(f"❌ Failed to download: {file_name}")
-                continue
-            
-            # Extract text
-            text = self.extract_text_from_file(file_data, content)
-            if not text.strip():
-                logger.warning(f"⚠️  No text extracted from file: {file_name}")
-                # Still mark as processed to avoid retrying
-                self.processed_files.add(file_hash)
-                continue
-            
-            file_characters = len(text)
-            total_characters += file_characters
-            
-            logger.info(f"📝 [{file_name}] Text extraction summary: {file_characters} characters")
-            
-            # Split text into chunks
-            logger.info(f"🔧 [{file_name}] Splitting text into chunks...")
-            chunks = self.text_splitter.split_text(text)
-            file_chunks = len(chunks)
-            total_chunks += file_chunks
-            
-            logger.info(f"✂️  [{file_name}] Created {file_chunks} chunks")
-            
-            # Create embeddings for chunks
-            logger.info(f"🧠 [{file_name}] Creating embeddings for {file_chunks} chunks...")
-            embeddings = self.create_embeddings(chunks, file_name)
-            
-            # Store document data
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                doc = {
-                    'id': f"{file_data['id']}_{i}",
-                    'file_id': file_data['id'],
-                    'file_name': file_data['name'],
-                    'file_type': file_data['mimeType'],
-                    'chunk_index': i,
-                    'content': chunk,
-                    'embedding': embedding,
-                    'metadata': {
-                        'file_size': file_data.get('size', 0),
-                        'chunk_length': len(chunk),
-                        'parent_folders': file_data.get('parents', []),
-                        'file_hash': file_hash
+            else:
+                pending.append((file_index, file_data))
+        
+        # Spawned rather than forked: the download threads are running while PDFs are extracted.
+        # Workers start with the first large PDF and serve every PDF of this run
+        if PYMUPDF_AVAILABLE and PDF_WORKERS > 1:
+            self._pdf_executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            # Downloads run ahead on worker threads; extraction, embedding and the cache stay on this thread
+            downloads = self._iter_downloads([file_data for _, file_data in pending])
+            for (file_index, file_data), (_, content) in zip(pending, downloads):
+                file_name = file_data['name']
+                file_size = file_data.get('size', 0)
+                file_hash = self._get_file_hash(file_data)
+                
+                logger.info(f"📄 Processing file {file_index}/{total_files}: {file_name} ({file_size} bytes)")
+                
+                if not content:
+                    logger.warning(f"❌ Failed to download: {file_name}")
+                    continue
+                
+                # Extract text
+                text = self.extract_text_from_file(file_data, content)
+                if not text.strip():
+                    logger.warning(f"⚠️  No text extracted from file: {file_name}")
+                    # Still mark as processed to avoid retrying
+                    self.processed_files.add(file_hash)
+                    continue
+                
+                file_characters = len(text)
+                total_characters += file_characters
+                
+                logger.info(f"📝 [{file_name}] Text extraction summary: {file_characters} characters")
+                
+                # Split text into chunks
+                logger.info(f"🔧 [{file_name}] Splitting text into chunks...")
+                chunks = self.text_splitter.split_text(text)
+                file_chunks = len(chunks)
+                total_chunks += file_chunks
+                
+                logger.info(f"✂️  [{file_name}] Created {file_chunks} chunks")
+                
+                # Create embeddings for chunks
+                logger.info(f"🧠 [{file_name}] Creating embeddings for {file_chunks} chunks...")
+                embeddings = self.create_embeddings(chunks, file_name)
+                
+                # Store document data
+                for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+                    doc = {
+                        'id': f"{file_data['id']}_{i}",
+                        'file_id': file_data['id'],
+                        'file_name': file_data['name'],
+                        'file_type': file_data['mimeType'],
+                        'chunk_index': i,
+                        'content': chunk,
+                        'embedding': encode_embedding(embedding),
+                        'metadata': {
+                            'file_size': file_data.get('size', 0),
+                            'chunk_length': len(chunk),
+                            'parent_folders': file_data.get('parents', []),
+                            'file_hash': file_hash
+                        }
                     }
-                }
-                documents.append(doc)
-            
-            # Mark file as processed
-            self.processed_files.add(file_hash)
-            processed_files += 1
-            
-            # Progress summary
-            progress_pct = (file_index / total_files) * 100
-            logger.info(f"✅ [{file_name}] Completed - {file_chunks} chunks, {file_characters} characters")
-            logger.info(f"📊 Overall progress: {file_index}/{total_files} files ({progress_pct:.1f}%) - {total_chunks} total chunks, {total_characters} total characters")
-            logger.info("-" * 80)
+                    documents.append(doc)
+                
+                # Mark file as processed, unless some chunks got zero embeddings and must be redone
+                failed_chunks = sum(1 for embedding in embeddings if not np.any(embedding))
+                if failed_chunks:
+                    logger.warning(f"⚠️  [{file_name}] {failed_chunks} chunks could not be embedded; file will be retried next run")
+                else:
+                    self.processed_files.add(file_hash)
+                processed_files += 1
+                
+                # Progress summary
+                progress_pct = (file_index / total_files) * 100
+                logger.info(f"✅ [{file_name}] Completed - {file_chunks} chunks, {file_characters} characters")
+                logger.info(f"📊 Overall progress: {file_index}/{total_files} files ({progress_pct:.1f}%) - {total_chunks} total chunks, {total_characters} total characters")
+                logger.info("-" * 80)
+        finally:
+            if self._pdf_executor is not None:
+                self._pdf_executor.shutdown(wait=True)
+                self._pdf_executor = None
+                self._pdf_pool_started = False
         
         # Save cache
         self._save_cache()
@@ -563,8 +717,9 @@ class GoogleDriveIndexer:
             output_path = Path(output_file)
             output_path.parent.mkdir(parents=True, exist_ok=True)
             
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(documents, f, ensure_ascii=False, indent=2)
+            # Compact output; the document list is only read back by loaders
+            with open(output_file, 'wb') as f:
+                f.write(orjson.dumps(documents, option=orjson.OPT_SERIALIZE_NUMPY))
             
             logger.info(f"Saved {len(documents)} documents to {output_file}")
         except Exception as e:
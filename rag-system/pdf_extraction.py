@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+PDF Page Extraction for RAG System
+Ekstraksi teks per rentang halaman PDF yang ringan sehingga aman dijalankan di worker process
+"""
+
+from typing import List
+
+import pymupdf
+
+
+def extract_pdf_page_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    """
+    Extract the text of pages [start, stop) of a PDF file with PyMuPDF
+    
+    Args:
+        pdf_path: Path to the PDF, shared by every worker instead of pickling its bytes
+        start: First page number
+        stop: Page number after the last one
+    
+    Returns:
+        Text of each page in order
+    """
+    with pymupdf.open(pdf_path) as pdf_document:
+        return [pdf_document[page_num].get_text() for page_num in range(start, stop)]
@@ -15,10 +15,19 @@ from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.feature_extraction.text import TfidfVectorizer
 import google.generativeai as genai
 
+from embedding_cache import decode_embedding
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length as float32 so cosine similarity becomes a dot product"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0  # Zero vectors keep similarity 0, as with sklearn
+    return vectors / norms
+
 class RAGRetriever:
     """Kelas untuk retrieval dan generation menggunakan RAG dengan multiple data sources dan hybrid search"""
     
@@ -53,6 +62,7 @@ class RAGRetriever:
         genai.configure(api_key=gemini_api_key)
         self.embedding_model = "models/text-embedding-004"
         self.generation_model = "gemini-1.5-flash"
+        self._gen_model = genai.GenerativeModel(self.generation_model)
         
         # Load all data sources
         self.load_all_data_sources()
@@ -140,13 +150,13 @@ class RAGRetriever:
         for doc in self.documents:
             if 'embedding' in doc and doc['embedding'] is not None:
                 documents_with_embeddings.append(doc)
-                embeddings.append(doc['embedding'])
+                embeddings.append(decode_embedding(doc['embedding']))
             else:
                 documents_without_embeddings.append(doc)
         
         self.documents_with_embeddings = documents_with_embeddings
         self.documents_without_embeddings = documents_without_embeddings
-        self.embeddings = np.array(embeddings) if embeddings else np.array([])
+        self.embeddings = _unit_rows(embeddings) if embeddings else np.array([])
         
         # Setup TF-IDF for documents without embeddings
         if documents_without_embeddings:
@@ -251,8 +261,7 @@ class RAGRetriever:
             return []
         
         # Calculate similarities
-        query_embedding = np.array(query_embedding).reshape(1, -1)
-        similarities = cosine_similarity(query_embedding, self.embeddings)[0]
+        similarities = self.embeddings @ _unit_rows(query_embedding)
         
         # Get top results
         top_indices = np.argsort(similarities)[::-1][:top_k]
@@ -340,8 +349,7 @@ Berikan jawaban yang akurat berdasarkan konteks di atas. Pastikan untuk menyebut
 """
         
         try:
-            model = genai.GenerativeModel(self.generation_model)
-            response = model.generate_content(full_prompt)
+            response = self._gen_model.generate_content(full_prompt)
             return response.text
         except Exception as e:
             logger.error(f"Error generating response: {e}")
@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+
+from bm25_search import BM25Search
+
+WORDS = ['demam', 'batuk', 'pilek', 'nyeri', 'kepala', 'mual', 'diare', 'ruam', 'sesak', 'lemas']
+
+
+def _tied_corpus(num_docs=200, seed=7):
+    """Documents drawn from a few word patterns, so many of them share a BM25 score"""
+    rng = random.Random(seed)
+    patterns = [' '.join(rng.sample(WORDS, 3)) for _ in range(12)]
+    return [
+        {'id': f'd{i}', 'title': f'Doc {i}', 'content': rng.choice(patterns)}
+        for i in range(num_docs)
+    ]
+
+
+def test_search_and_search_batch_agree_on_ties():
+    bm25 = BM25Search(use_stemming=False)
+    bm25.add_documents(_tied_corpus())
+    queries = ['demam', 'batuk pilek', 'nyeri kepala mual', 'sesak lemas demam', 'ruam diare']
+
+    for top_k in (1, 3, 20):
+        batch = bm25.search_batch(queries, top_k)
+        for query, batch_results in zip(queries, batch):
+            single = bm25.search(query, top_k)
+            assert [r.doc_id for r in single] == [r.doc_id for r in batch_results]
+            assert [r.bm25_score for r in single] == [r.bm25_score for r in batch_results]
+
+
+def test_ties_prefer_higher_document_index():
+    bm25 = BM25Search(use_stemming=False)
+    bm25.add_documents([{'id': f'd{i}', 'content': 'demam tinggi'} for i in range(10)])
+
+    assert [r.doc_id for r in bm25.search('demam', 3)] == ['d9', 'd8', 'd7']
+
+
+def test_maxscore_keeps_scoring_terms_that_can_tie():
+    bm25 = BM25Search(use_stemming=False)
+    bm25.add_documents([{'id': 'd0', 'content': 'diabetes'}, {'id': 'd1', 'content': 'hipertensi'}])
+
+    assert [r.doc_id for r in bm25.search('diabetes hipertensi', 1)] == ['d1']
+    assert [r.doc_id for r in bm25.search_batch(['diabetes hipertensi'], 1)[0]] == ['d1']
+
+
+def test_saved_index_loads_memory_mapped(tmp_path):
+    bm25 = BM25Search(use_stemming=False)
+    bm25.add_documents(_tied_corpus(num_docs=50))
+    bm25.add_documents([{'id': 'extra', 'content': 'demam berdarah'}])
+    index_path = tmp_path / 'bm25_index.npz'
+    bm25.save_index(str(index_path))
+
+    loaded = BM25Search(use_stemming=False)
+    loaded.load_index(str(index_path))
+
+    assert isinstance(loaded.token_ids, np.memmap)
+    assert all(path.exists() for path in BM25Search.index_files(str(index_path)))
+    assert loaded.get_document_tokens(50) == bm25.get_document_tokens(50) == ['demam', 'berdarah']
+    for query in ('demam', 'batuk pilek', 'nyeri kepala mual'):
+        assert [r.doc_id for r in loaded.search(query, 5)] == [r.doc_id for r in bm25.search(query, 5)]